@@ -0,0 +1,122 @@
+"""
+Throughput of concurrent tool calls on one event loop
+
+Calls get_latest_bc at 1, 10 and 50 concurrent calls and compares the async
+tools (aapi over the asyncio HTTP engine) with the previous behaviour, where
+a blocking HTTP call ran on the event loop. By default the upstream is
+simulated with a fixed latency so the numbers are reproducible offline.
+Both the simulation and --live disable the response cache and ask for a
+different concept on every call, the same concepts in the same order for the
+blocking and the async side, so each call is a full round-trip that is
+neither answered from the cache nor coalesced with a concurrent call. Live
+concepts are taken from the latest Biomedical Concept list, and reused only
+when a measurement makes more calls than the list has concepts.
+
+Usage:
+    python benchmarks/bench_async_tools.py
+    python benchmarks/bench_async_tools.py --latency 0.2 --calls 200
+    python benchmarks/bench_async_tools.py --live
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+
+import httpx
+
+from shiranui import server
+from shiranui.cache import response_cache
+from shiranui.client import async_http_pool
+
+BC_LIST_URL = "https://api.library.cdisc.org/api/cosmos/v2/mdr/bc/biomedicalconcepts"
+BODY = json.dumps({"conceptId": "C105585", "shortName": "Glucose Measurement"}).encode()
+
+
+# Blocking client of the baseline, sending the same request as get_latest_bc
+blocking_client = httpx.Client(timeout=60.0)
+
+# Concept ids of the calls, a new one per call; every measurement starts from the first
+concept_id_list = [f"C{number}" for number in range(100000, 200000)]
+concept_ids = iter(concept_id_list)
+
+
+def request_headers() -> dict:
+    return {key: value for key, value in server.headers.items() if value is not None}
+
+
+def simulate(latency: float):
+    global blocking_client
+
+    async def handler(request):
+        await asyncio.sleep(latency)
+        return httpx.Response(200, content=BODY, request=request)
+
+    def blocking_handler(request):
+        time.sleep(latency)
+        return httpx.Response(200, content=BODY, request=request)
+
+    async_http_pool.configure(transport=httpx.MockTransport(handler))
+    blocking_client = httpx.Client(transport=httpx.MockTransport(blocking_handler))
+
+
+def live():
+    global concept_id_list
+    response = blocking_client.get(BC_LIST_URL, headers=request_headers())
+    response.raise_for_status()
+    listing = response.json()
+    concept_id_list = [
+        link["href"].rstrip("/").split("/")[-1]
+        for link in listing.get("_links", {}).get("biomedicalConcepts", [])
+        if link.get("href")
+    ]
+    if not concept_id_list:
+        raise SystemExit("The Biomedical Concept list is empty")
+
+
+async def blocking_call():
+    url = f"{BC_LIST_URL}/{next(concept_ids)}"
+    return blocking_client.get(url, headers=request_headers()).json()
+
+
+async def async_call():
+    return await server.get_latest_bc(next(concept_ids))
+
+
+async def run(call, concurrency: int, calls: int) -> float:
+    global concept_ids
+    concept_ids = itertools.cycle(concept_id_list)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await call()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    return calls / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.1, help="Simulated upstream latency in seconds.")
+    parser.add_argument("--calls", type=int, default=100, help="Tool calls per measurement.")
+    parser.add_argument("--live", action="store_true", help="Call the CDISC Library instead of the simulation.")
+    args = parser.parse_args()
+
+    # Measure the round-trips, not the on-disk cache (which would also be written to ~/.cache)
+    response_cache.configure(enabled=False)
+    if args.live:
+        live()
+    else:
+        simulate(args.latency)
+
+    print(f"{'concurrency':>11} {'blocking calls/s':>17} {'async calls/s':>14}")
+    for concurrency in (1, 10, 50):
+        blocking = await run(blocking_call, concurrency, args.calls)
+        asynchronous = await run(async_call, concurrency, args.calls)
+        print(f"{concurrency:>11} {blocking:>17.1f} {asynchronous:>14.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
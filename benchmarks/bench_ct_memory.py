@@ -0,0 +1,97 @@
+"""
+Memory used by a full SDTM CT package: raw JSON versus the compact CTPackage
+
+Measures with tracemalloc the memory held by the parsed JSON of a CT package
+(what response.json() returns) and by the CTPackage built from it, including
+its lookup indexes. By default a synthetic package with the size and shape of
+a recent SDTM CT package is generated, so the benchmark runs offline.
+
+Usage:
+    python benchmarks/bench_ct_memory.py
+    python benchmarks/bench_ct_memory.py --file sdtmct-2024-12-20.json
+    python benchmarks/bench_ct_memory.py --live 2024-12-20
+"""
+import argparse
+import asyncio
+import gc
+import json
+import random
+import tracemalloc
+
+from shiranui.ct_store import CTPackage
+
+
+def synthetic_package(codelists: int = 1100, terms: int = 42000) -> bytes:
+    """JSON of a package shaped like SDTM CT: few large codelists, many small ones."""
+    rng = random.Random(0)
+    words = [f"word{index}" for index in range(3000)]
+    shared = ["Yes", "No", "Unknown", "Not Applicable", "Other"]
+    sizes = [max(1, int(rng.paretovariate(1.2))) for _ in range(codelists)]
+    scale = terms / sum(sizes)
+    package = {"name": "SDTM CT", "version": "2024-12-20", "codelists": []}
+    code = 100000
+    for index, size in enumerate(sizes):
+        term_list = []
+        for _ in range(max(1, round(size * scale))):
+            code += 1
+            preferred = rng.choice(shared) if rng.random() < 0.1 else " ".join(rng.choices(words, k=3))
+            term_list.append({
+                "conceptId": f"C{code}",
+                "submissionValue": preferred.upper()[:20],
+                "preferredTerm": preferred,
+                "definition": " ".join(rng.choices(words, k=25)),
+                "synonyms": [" ".join(rng.choices(words, k=2))],
+                "_links": {"self": {"href": f"/mdr/ct/packages/sdtmct-2024-12-20/codelists/C{index}/terms/C{code}"}}
+            })
+        package["codelists"].append({
+            "conceptId": f"C{index}",
+            "submissionValue": f"CL{index}",
+            "name": " ".join(rng.choices(words, k=3)),
+            "extensible": rng.choice(["Yes", "No"]),
+            "definition": " ".join(rng.choices(words, k=30)),
+            "preferredTerm": " ".join(rng.choices(words, k=3)),
+            "synonyms": [" ".join(rng.choices(words, k=2))],
+            "terms": term_list
+        })
+    return json.dumps(package).encode()
+
+
+def measure(build) -> tuple:
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--file", help="CT package JSON file to measure.")
+    parser.add_argument("--live", metavar="VERSION", help="Download the SDTM CT package of this version.")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "rb") as file:
+            raw = file.read()
+    elif args.live:
+        from shiranui.server import aapi
+        raw = asyncio.run(aapi(f"https://api.library.cdisc.org/api/mdr/ct/packages/sdtmct-{args.live}")).content
+    else:
+        raw = synthetic_package()
+
+    parsed, json_size = measure(lambda: json.loads(raw))
+    codelists = parsed["codelists"]
+    term_count = sum(len(codelist.get("terms", [])) for codelist in codelists)
+
+    _, compact_size = measure(lambda: CTPackage("SDTM", "benchmark", json.loads(raw)["codelists"]))
+
+    print(f"codelists: {len(codelists)}, terms: {term_count}, payload: {len(raw) / 2**20:.1f} MiB")
+    print(f"raw JSON (response.json()): {json_size / 2**20:8.1f} MiB")
+    print(f"CTPackage with indexes:     {compact_size / 2**20:8.1f} MiB")
+    print(f"reduction:                  {json_size / max(compact_size, 1):8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,30 @@
 import argparse
-from .server import mcp
+import asyncio
+import json
+import os
+
+from .cache import response_cache
+from .client import async_http_pool
+from .server import ct_store, headers, mcp, search_index
+from .snapshot import Mirror, Snapshot, default_snapshot_path, snapshot
+
+
+def take_snapshot(path: str, versions: int, incremental: bool = False):
+    """Mirror the CDISC Library resources used by the tools into a snapshot database."""
+    async def run():
+        target = Snapshot(path, readonly=False)
+        mirror_versions = versions
+        if mirror_versions is None:
+            # Sync as many versions as the snapshot was taken with
+            mirror_versions = int(target.get_meta("versions") or 1)
+        mirror = Mirror(target, async_http_pool, headers, versions=mirror_versions, incremental=incremental)
+        try:
+            return await mirror.run()
+        finally:
+            mirror.snapshot.close()
+            await async_http_pool.close()
+
+    print(json.dumps(asyncio.run(run()), indent=2))
 
 
 def main():
@@ -7,7 +32,78 @@ def main():
     parser = argparse.ArgumentParser(
         description="Give you the ability to retrieve the metadata from the CDISC Library.",
     )
-    parser.parse_args()
+    parser.add_argument(
+        "--pool-size", type=int, default=None,
+        help="Maximum number of keep-alive connections per CDISC Library host."
+    )
+    parser.add_argument(
+        "--no-prewarm", action="store_true",
+        help="Do not open connections to the CDISC Library at startup."
+    )
+    parser.add_argument(
+        "--cache-dir", default=None,
+        help="Directory of the on-disk response cache."
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Do not cache CDISC Library responses on disk."
+    )
+    parser.add_argument(
+        "--snapshot", nargs="?", const=str(default_snapshot_path()), default=None,
+        help="Answer all requests from a snapshot database instead of the CDISC Library "
+             f"(default path: {default_snapshot_path()})."
+    )
+    commands = parser.add_subparsers(dest="command")
+    snapshot_command = commands.add_parser(
+        "snapshot",
+        help="Mirror the CDISC Library resources used by the tools into a snapshot database."
+    )
+    snapshot_command.add_argument(
+        "--output", default=str(default_snapshot_path()),
+        help=f"Path of the snapshot database (default: {default_snapshot_path()})."
+    )
+    snapshot_command.add_argument(
+        "--versions", type=int, default=1,
+        help="Number of latest versions mirrored per standard and package series (default: 1)."
+    )
+    sync_command = commands.add_parser(
+        "sync",
+        help="Update a snapshot database, downloading only new packages and versions "
+             "and revalidating the latest resources."
+    )
+    sync_command.add_argument(
+        "--output", default=str(default_snapshot_path()),
+        help=f"Path of the snapshot database (default: {default_snapshot_path()})."
+    )
+    sync_command.add_argument(
+        "--versions", type=int, default=None,
+        help="Number of latest versions mirrored per standard and package series "
+             "(default: as many as the snapshot was taken with)."
+    )
+    args = parser.parse_args()
+
+    if args.pool_size is not None:
+        async_http_pool.configure(pool_size=args.pool_size)
+
+    if args.command == "snapshot":
+        take_snapshot(args.output, args.versions)
+        return
+    if args.command == "sync":
+        take_snapshot(args.output, args.versions, incremental=True)
+        return
+
+    if args.cache_dir is not None or args.no_cache:
+        response_cache.configure(directory=args.cache_dir, enabled=not args.no_cache)
+        search_index.configure()
+    if args.snapshot is not None:
+        if not os.path.exists(args.snapshot):
+            parser.error(f"snapshot database {args.snapshot} does not exist, create it with 'shiranui snapshot'")
+        snapshot.configure(args.snapshot)
+        # Codelists are served from the mirrored CT packages
+        ct_store.full_package_after = 0
+    elif not args.no_prewarm:
+        async_http_pool.prewarm_on_start = True
+
     mcp.run()
 
 
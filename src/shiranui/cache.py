@@ -0,0 +1,343 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import httpx
+
+
+def default_cache_dir() -> Path:
+    """Directory of the on-disk cache, overridable with SHIRANUI_CACHE_DIR."""
+    if os.getenv("SHIRANUI_CACHE_DIR"):
+        return Path(os.getenv("SHIRANUI_CACHE_DIR"))
+    if os.name == "nt" and os.getenv("LOCALAPPDATA"):
+        return Path(os.getenv("LOCALAPPDATA")) / "shiranui" / "cache"
+    return Path.home() / ".cache" / "shiranui"
+
+
+def credential(request_headers: dict) -> str:
+    """
+    Hash of the api key of a request, stored with the responses downloaded with it
+
+    Returns:
+        Hex digest of the api-key header, or None without an api key
+    """
+    for name, value in (request_headers or {}).items():
+        if name.lower() == "api-key" and value:
+            return hashlib.sha256(value.encode()).hexdigest()
+    return None
+
+
+class CacheEntry:
+    """A cached response body with the validators needed to revalidate it."""
+
+    def __init__(self, url: str, body: bytes, etag: str = None, last_modified: str = None, stored_at: float = 0.0):
+        self.url = url
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+
+    def conditional_headers(self) -> dict:
+        """Headers that turn a GET into a conditional request."""
+        conditional = {}
+        if self.etag:
+            conditional["If-None-Match"] = self.etag
+        if self.last_modified:
+            conditional["If-Modified-Since"] = self.last_modified
+        return conditional
+
+    def to_httpx_response(self) -> httpx.Response:
+        response_headers = {"content-type": "application/json"}
+        if self.etag:
+            response_headers["ETag"] = self.etag
+        if self.last_modified:
+            response_headers["Last-Modified"] = self.last_modified
+        return httpx.Response(
+            200,
+            content=self.body,
+            headers=response_headers,
+            request=httpx.Request("GET", self.url)
+        )
+
+
+class ResponseCache:
+    """
+    Persistent HTTP response cache keyed by url and api key
+
+    Bodies are stored zlib-compressed in a SQLite database together with their
+    ETag and Last-Modified validators, so a cached url is revalidated with a
+    conditional request and only re-downloaded when it changed upstream.
+    Each entry records a hash of the api key it was downloaded with (an empty
+    string without a key) and is only served to requests with the same key, so
+    the cache never answers a request the CDISC Library would have refused. When the stored size
+    exceeds max_bytes, the least recently used entries are evicted.
+
+    Args:
+        directory: Directory of the cache database.
+        max_bytes: Maximum total size of the compressed bodies.
+        enabled: If False, get() always misses and put() stores nothing.
+    """
+
+    def __init__(self, directory: Path = None, max_bytes: int = 512 * 1024 * 1024, enabled: bool = True):
+        self.directory = Path(directory) if directory else default_cache_dir()
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.counters = {"fresh": 0, "stale": 0, "revalidated": 0, "downloaded": 0}
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(
+                self.directory / "responses.sqlite3",
+                check_same_thread=False,
+                isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "url TEXT NOT NULL, body BLOB NOT NULL, size INTEGER NOT NULL, "
+                "etag TEXT, last_modified TEXT, stored_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+                "credential TEXT NOT NULL, PRIMARY KEY (url, credential))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+            self._connection = connection
+        return self._connection
+
+    def configure(self, directory: Path = None, max_bytes: int = None, enabled: bool = None):
+        """Change the cache settings. The database is reopened on next use."""
+        with self._lock:
+            if directory is not None:
+                self.directory = Path(directory)
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if enabled is not None:
+                self.enabled = enabled
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def get(self, url: str, credential: str = None) -> CacheEntry:
+        """
+        Look up a cached response and mark it as recently used
+
+        Args:
+            url: The url of the response.
+            credential: Hash of the api key of the request (see credential()).
+
+        Returns:
+            CacheEntry, or None if the url is not cached for this api key
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._db().execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE url = ? AND credential IS ?",
+                (url, credential or "")
+            ).fetchone()
+            if row is None:
+                return None
+            self._db().execute(
+                "UPDATE responses SET accessed_at = ? WHERE url = ? AND credential IS ?",
+                (time.time(), url, credential or "")
+            )
+        body, etag, last_modified, stored_at = row
+        return CacheEntry(url, zlib.decompress(body), etag, last_modified, stored_at)
+
+    def put(self, url: str, body: bytes, response_headers=None, credential: str = None):
+        """
+        Store a response body with its validators and evict entries over the size cap
+
+        Args:
+            url: The url of the response.
+            body: The response body.
+            response_headers: The response headers holding the ETag and Last-Modified validators.
+            credential: Hash of the api key the response was downloaded with.
+        """
+        if not self.enabled:
+            return
+        response_headers = response_headers or {}
+        compressed = zlib.compress(body, 6)
+        if len(compressed) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(url, body, size, etag, last_modified, stored_at, accessed_at, credential) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, compressed, len(compressed), response_headers.get("ETag"),
+                 response_headers.get("Last-Modified"), now, now, credential or "")
+            )
+            self._evict(db)
+
+    def refresh(self, url: str, credential: str = None):
+        """Record that a cached response was revalidated (304 Not Modified)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._db().execute(
+                "UPDATE responses SET stored_at = ? WHERE url = ? AND credential IS ?",
+                (time.time(), url, credential or "")
+            )
+
+    def count(self, outcome: str):
+        """
+        Count how a request was answered: "fresh" or "stale" from the cache
+        without a request, "revalidated" by a 304, or "downloaded"
+        """
+        self.counters[outcome] = self.counters.get(outcome, 0) + 1
+
+    def _evict(self, db: sqlite3.Connection):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = db.execute("SELECT url, credential, size FROM responses ORDER BY accessed_at").fetchall()
+        for url, entry_credential, size in rows:
+            db.execute("DELETE FROM responses WHERE url = ? AND credential IS ?", (url, entry_credential))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def bodies(self, batch: int = 200):
+        """
+        Iterate over the (url, credential, body) of all cached responses, without marking them as used
+
+        The credential is the hash of the api key the response was downloaded
+        with, or "" for responses downloaded without one.
+        """
+        if not self.enabled:
+            return
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._db().execute(
+                    "SELECT rowid, url, credential, body FROM responses WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last, batch)
+                ).fetchall()
+            if not rows:
+                return
+            for last, url, body_credential, body in rows:
+                yield url, body_credential, zlib.decompress(body)
+
+    def clear(self):
+        """Remove all cached responses."""
+        with self._lock:
+            self._db().execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        """
+        Report cache usage
+
+        Returns:
+            Dictionary with entry count, stored bytes, request outcomes and hit rate
+        """
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock:
+            entries, size = self._db().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {
+            "enabled": True,
+            "directory": str(self.directory),
+            "entries": entries,
+            "stored_bytes": size,
+            "max_bytes": self.max_bytes,
+            **self.counters,
+            "hit_rate": round(
+                (self.counters["fresh"] + self.counters["stale"] + self.counters["revalidated"])
+                / max(sum(self.counters[key] for key in ("fresh", "stale", "revalidated", "downloaded")), 1),
+                3
+            )
+        }
+
+
+FRESH = "fresh"
+STALE = "stale"
+EXPIRED = "expired"
+
+LATEST_TTL = int(os.getenv("SHIRANUI_LATEST_TTL", "600"))
+LATEST_STALE_WHILE_REVALIDATE = int(os.getenv("SHIRANUI_LATEST_STALE", "3600"))
+
+# (url pattern, ttl in seconds or None for never expiring, stale-while-revalidate seconds)
+DEFAULT_RULES = [
+    # Dated CT packages and their codelists never change
+    (r"/mdr/ct/packages/[a-z-]+ct-\d{4}-\d{2}-\d{2}(/|$)", None, 0),
+    # Versioned implementation guides and models
+    (r"/mdr/(sdtmig|sendig|cdashig)/\d[\d-]*(/|$)", None, 0),
+    (r"/mdr/(sdtm|send|cdash)/\d[\d-]*(/|$)", None, 0),
+    (r"/mdr/adam/[a-z0-9-]+-\d+-\d+(/|$)", None, 0),
+    # Biomedical Concept and Dataset Specialization package snapshots
+    (r"/mdr/bc/packages/[^/?]+/", None, 0),
+    (r"/mdr/specializations/sdtm/packages/[^/?]+/", None, 0),
+    # "Latest" pointers and listings change when CDISC publishes
+    (r"/mdr/ct/packages$", LATEST_TTL, LATEST_STALE_WHILE_REVALIDATE),
+    (r"/mdr/(sdtmig|sendig|cdashig)$", LATEST_TTL, LATEST_STALE_WHILE_REVALIDATE),
+    (r"/mdr/products(/|$)", LATEST_TTL, LATEST_STALE_WHILE_REVALIDATE),
+    (r"/mdr/bc/", LATEST_TTL, LATEST_STALE_WHILE_REVALIDATE),
+    (r"/mdr/specializations/", LATEST_TTL, LATEST_STALE_WHILE_REVALIDATE),
+    (r"/mdr/search", LATEST_TTL, 0),
+]
+
+
+class CachePolicy:
+    """
+    Decide from the url whether a cached response may be served without a request
+
+    Each rule maps a url pattern to a time to live and a stale-while-revalidate
+    window. Within the ttl a cached response is fresh; within the following
+    window it is stale and served while it is revalidated in the background;
+    after that it is expired and revalidated before it is served. A ttl of None
+    marks versioned resources that never change. Urls that match no rule are
+    always revalidated.
+
+    Args:
+        rules: List of (pattern, ttl, stale_while_revalidate) tuples, first match wins.
+    """
+
+    def __init__(self, rules: list = None):
+        self.rules = [
+            (re.compile(pattern), ttl, stale)
+            for pattern, ttl, stale in (DEFAULT_RULES if rules is None else rules)
+        ]
+
+    def rule(self, url: str) -> tuple:
+        """Return the (ttl, stale_while_revalidate) applying to a url."""
+        path = url.split("?")[0]
+        for pattern, ttl, stale in self.rules:
+            if pattern.search(path):
+                return ttl, stale
+        return 0, 0
+
+    def freshness(self, url: str, stored_at: float) -> str:
+        """
+        Classify a cached response
+
+        Returns:
+            FRESH, STALE or EXPIRED
+        """
+        ttl, stale = self.rule(url)
+        if ttl is None:
+            return FRESH
+        age = time.time() - stored_at
+        if age < ttl:
+            return FRESH
+        if age < ttl + stale:
+            return STALE
+        return EXPIRED
+
+
+cache_policy = CachePolicy()
+
+response_cache = ResponseCache(
+    max_bytes=int(os.getenv("SHIRANUI_CACHE_MAX_MB", "512")) * 1024 * 1024,
+    enabled=os.getenv("SHIRANUI_CACHE", "1") != "0"
+)
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import os
+from urllib.parse import urlsplit
+
+import httpx
+
+# httpx logs every request at INFO level, which floods the server log
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+CDISC_HOSTS = [
+    "https://api.library.cdisc.org",
+    "https://library.cdisc.org"
+]
+
+
+class AsyncConnectionPool:
+    """
+    Pool of keep-alive httpx.AsyncClient instances, one per upstream host
+
+    TCP and TLS connections are reused across tool calls instead of being
+    re-established on every request. Requests are awaited on the running
+    event loop, so concurrent tool calls overlap their network waits instead
+    of blocking the loop for a whole round-trip.
+
+    Args:
+        pool_size: Maximum number of open connections kept per host.
+        timeout: Timeout in seconds applied to every request.
+        transport: Optional httpx transport, e.g. httpx.MockTransport.
+    """
+
+    def __init__(self, pool_size: int = 10, timeout: float = 60.0, transport=None):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.transport = transport
+        self.prewarm_on_start = False
+        self._clients = {}
+        self._retired = []
+        self._requests = {}
+        self._connections = {}
+
+    def _client(self, base_url: str) -> httpx.AsyncClient:
+        # An AsyncClient is bound to the event loop it was first used on
+        loop = asyncio.get_running_loop()
+        client, client_loop = self._clients.get(base_url, (None, None))
+        if client is None or client_loop is not loop or client.is_closed:
+            if client is not None and not client.is_closed:
+                # Closed by _close_retired() on the next request, on the new loop
+                self._retired.append(client)
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size
+                ),
+                timeout=self.timeout,
+                transport=self.transport,
+                follow_redirects=True
+            )
+            self._clients[base_url] = (client, loop)
+        return client
+
+    async def _close_retired(self):
+        # Clients replaced after a loop change or configure() still hold their connections
+        retired, self._retired = self._retired, []
+        for client in retired:
+            try:
+                await client.aclose()
+            except Exception:
+                pass
+
+    def _trace(self, base_url: str):
+        # httpcore reports every new TCP connection through the "trace" request extension
+        async def trace(event: str, info: dict):
+            if event == "connection.connect_tcp.complete":
+                self._connections[base_url] = self._connections.get(base_url, 0) + 1
+        return {"trace": trace}
+
+    def configure(self, pool_size: int = None, timeout: float = None, transport=None):
+        """
+        Change the pool settings. Clients are recreated on the next request.
+        """
+        if pool_size is not None:
+            self.pool_size = pool_size
+        if timeout is not None:
+            self.timeout = timeout
+        if transport is not None:
+            self.transport = transport
+        self._retired.extend(client for client, _ in self._clients.values())
+        self._clients = {}
+
+    async def get(self, url: str, headers: dict = None) -> httpx.Response:
+        """
+        Send a GET request through the client of the url's host
+        """
+        parts = urlsplit(url)
+        base_url = f"{parts.scheme}://{parts.netloc}"
+        self._requests[base_url] = self._requests.get(base_url, 0) + 1
+        # requests drops headers set to None (e.g. a missing api key), httpx rejects them
+        headers = {key: value for key, value in (headers or {}).items() if value is not None}
+        client = self._client(base_url)
+        if self._retired:
+            await self._close_retired()
+        return await client.get(url, headers=headers, extensions=self._trace(base_url))
+
+    async def prewarm(self, hosts: list = None, connections: int = 1):
+        """
+        Open connections to the upstream hosts ahead of the first tool call
+
+        Args:
+            hosts: Base urls to connect to. Default is the CDISC Library hosts.
+            connections: Number of connections to open per host.
+        """
+        async def warm(base_url):
+            # Counted as a request, so the later requests on its connection count as reused
+            self._requests[base_url] = self._requests.get(base_url, 0) + 1
+            try:
+                await self._client(base_url).head(f"{base_url}/", extensions=self._trace(base_url))
+            except httpx.HTTPError:
+                pass
+
+        await self._close_retired()
+        await asyncio.gather(*(
+            warm(base_url)
+            for base_url in hosts or CDISC_HOSTS
+            for _ in range(min(connections, self.pool_size))
+        ))
+
+    def stats(self) -> dict:
+        """
+        Report connection usage per host
+
+        Returns:
+            Dictionary keyed by host with connections opened, requests sent and
+            requests that reused an already open connection
+        """
+        result = {}
+        for base_url in {**self._requests, **self._connections}:
+            opened = self._connections.get(base_url, 0)
+            sent = self._requests.get(base_url, 0)
+            result[base_url] = {
+                "pool_size": self.pool_size,
+                "connections_opened": opened,
+                "requests": sent,
+                "connections_reused": max(sent - opened, 0)
+            }
+        return result
+
+    async def close(self):
+        """Close all clients and their connections."""
+        self._retired.extend(client for client, _ in self._clients.values())
+        self._clients = {}
+        await self._close_retired()
+
+
+async_http_pool = AsyncConnectionPool(
+    pool_size=int(os.getenv("SHIRANUI_POOL_SIZE", "10")),
+    timeout=float(os.getenv("SHIRANUI_HTTP_TIMEOUT", "60"))
+)
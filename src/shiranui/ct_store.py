@@ -0,0 +1,481 @@
+import asyncio
+import os
+import re
+import sys
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import httpx
+
+from .cache import credential
+from .singleflight import SingleFlight
+from .trigrams import TrigramIndex
+
+
+def package_name(standard: str, version: str) -> str:
+    """Name of a CT package in the CDISC Library, e.g. sdtmct-2024-12-20."""
+    return f"{standard.lower()}ct-{version}"
+
+
+CODELIST_HREF_PATTERN = re.compile(
+    r"/mdr/(?:ct/packages/([a-z-]+)ct-\d{4}-\d{2}-\d{2}|root/ct/([a-z-]+)ct)/codelists/([A-Za-z0-9]+)$"
+)
+
+
+@lru_cache(maxsize=4096)
+def parse_codelist_href(href: str) -> tuple:
+    """
+    Parse a codelist link of IG metadata
+
+    Both package links (/mdr/ct/packages/sdtmct-2024-09-27/codelists/C66731)
+    and root links (/mdr/root/ct/sdtmct/codelists/C66731) are understood.
+
+    Returns:
+        Tuple of (upper case standard, codelist NCI code), or None for other links
+    """
+    match = CODELIST_HREF_PATTERN.search(href.strip())
+    if match is None:
+        return None
+    return sys.intern((match.group(1) or match.group(2)).upper()), sys.intern(match.group(3).upper())
+
+
+def codelist_hrefs(links: dict) -> list:
+    """
+    Codelist hrefs of a metadata item's _links, which hold a link or a list of links
+    """
+    codelist_links = (links or {}).get("codelist") or []
+    if isinstance(codelist_links, dict):
+        codelist_links = [codelist_links]
+    return [link["href"] for link in codelist_links if link.get("href")]
+
+
+class CTTerm:
+    """A codelist term, holding only the fields the tools return."""
+
+    __slots__ = ("code", "submission_value", "preferred_term")
+
+    def __init__(self, code: str, submission_value: str, preferred_term: str):
+        self.code = code
+        self.submission_value = submission_value
+        self.preferred_term = preferred_term
+
+
+class CTCodelist:
+    """A codelist with its terms, holding only the fields the tools return."""
+
+    __slots__ = ("code", "submission_value", "name", "extensible", "terms")
+
+    def __init__(self, code: str, submission_value: str, name: str, extensible: bool, terms: tuple):
+        self.code = code
+        self.submission_value = submission_value
+        self.name = name
+        self.extensible = extensible
+        self.terms = terms
+
+    @classmethod
+    def from_json(cls, codelist: dict) -> "CTCodelist":
+        """
+        Build a compact codelist from its CDISC Library JSON
+
+        NCI codes, submission values and preferred terms repeat across codelists
+        and packages, so they are interned and stored once per process.
+        """
+        terms = tuple(
+            CTTerm(
+                sys.intern(term.get("conceptId", "")),
+                sys.intern(term.get("submissionValue", "")),
+                sys.intern(term.get("preferredTerm", ""))
+            )
+            for term in codelist.get("terms", [])
+        )
+        return cls(
+            sys.intern(codelist.get("conceptId", "")),
+            sys.intern(codelist.get("submissionValue", "")),
+            codelist.get("name", ""),
+            codelist.get("extensible") == "Yes",
+            terms
+        )
+
+
+class CTPackage:
+    """
+    A loaded Controlled Terminology package with lookup indexes
+
+    Args:
+        standard: The CDISC standard in upper case (e.g., SDTM, ADAM).
+        version: CT version in YYYY-MM-DD format.
+        codelists: The "codelists" list of the CT package JSON.
+    """
+
+    def __init__(self, standard: str, version: str, codelists: list):
+        self.standard = standard
+        self.version = version
+        self.codelists = tuple(CTCodelist.from_json(codelist) for codelist in codelists)
+        self.by_submission_value = {}
+        self.by_concept_id = {}
+        # Trigram indexes of the codelists by submission value and by code, and of the terms, built on first use
+        self._codelist_trigrams = [None, None]
+        self._term_trigrams = None
+        self._terms_by_value = None
+        # Terms by NCI code, built on first use
+        self._terms_by_code = None
+
+        # Keys are interned too: upper() returns a new string even when nothing changes
+        for codelist in self.codelists:
+            self.by_submission_value.setdefault(sys.intern(codelist.submission_value.upper()), codelist)
+            self.by_concept_id.setdefault(sys.intern(codelist.code.upper()), codelist)
+
+    def find(self, codelist_value: str, codelist_type: str = "ID") -> CTCodelist:
+        """
+        Find a codelist by submission value ('ID') or NCI code ('CodelistCode')
+
+        Returns:
+            The codelist, or None if it is not in the package
+        """
+        if codelist_type.upper() == "CODELISTCODE":
+            return self.by_concept_id.get(codelist_value.upper())
+        return self.by_submission_value.get(codelist_value.upper())
+
+    def similar(self, codelist_value: str, codelist_type: str = "ID", limit: int = 5) -> list:
+        """
+        Find the codelists closest to a misspelt submission value ('ID') or NCI code ('CodelistCode')
+
+        Returns:
+            List of submission values or NCI codes, most similar first
+        """
+        by_code = codelist_type.upper() == "CODELISTCODE"
+        if self._codelist_trigrams[by_code] is None:
+            self._codelist_trigrams[by_code] = TrigramIndex(
+                codelist.code if by_code else codelist.submission_value for codelist in self.codelists
+            )
+        return self._codelist_trigrams[by_code].similar(codelist_value, limit=limit)
+
+    def similar_terms(self, submission_value: str, limit: int = 5) -> list:
+        """
+        Find the terms whose submission value is closest to a value, e.g. a term asked for as a codelist
+
+        Returns:
+            List of (codelist, term) pairs, most similar first
+        """
+        if self._term_trigrams is None:
+            self._terms_by_value = {}
+            for codelist in self.codelists:
+                for term in codelist.terms:
+                    self._terms_by_value.setdefault(term.submission_value.upper(), []).append((codelist, term))
+            self._term_trigrams = TrigramIndex(self._terms_by_value)
+        value_upper = submission_value.upper()
+        names = self._term_trigrams.similar(value_upper, limit=limit)
+        # The index leaves out the value itself, which is the best match when it is a term
+        if value_upper in self._terms_by_value:
+            names.insert(0, value_upper)
+        return [pair for name in names for pair in self._terms_by_value[name]][:limit]
+
+    def find_term(self, term_code: str) -> list:
+        """
+        Find a term by its NCI code
+
+        Returns:
+            List of (codelist, term) pairs, one per codelist containing the term
+        """
+        if self._terms_by_code is None:
+            terms_by_code = {}
+            for codelist in self.codelists:
+                for term in codelist.terms:
+                    terms_by_code.setdefault(term.code.upper(), []).append((codelist, term))
+            self._terms_by_code = terms_by_code
+        return list(self._terms_by_code.get(term_code.upper(), ()))
+
+
+class CTStore:
+    """
+    In-memory store of CT packages, each downloaded and indexed once
+
+    A whole package is several megabytes, while a single codelist resource is
+    a few kilobytes. Codelists requested by NCI code are therefore fetched one
+    by one from /mdr/ct/packages/{package}/codelists/{code} until
+    full_package_after distinct codelists of the same package were asked for;
+    from then on (and for lookups by submission value or bulk tools, which need
+    the whole package) the package is downloaded once and served from memory.
+
+    The least recently used packages are dropped when more than max_packages
+    are loaded. Concurrent loads of the same resource share one download.
+    Packages and codelists are kept per api key, like the response cache, so
+    a caller is never answered with a package downloaded with another key.
+
+    Args:
+        fetch_json: Coroutine function (url, headers_) returning the parsed JSON.
+        max_packages: Maximum number of packages kept in memory.
+        full_package_after: Distinct codelists of a package fetched one by one
+                            before the whole package is loaded.
+        max_codelists: Maximum number of individually fetched codelists kept in memory.
+        headers: The request headers used when a caller passes none.
+    """
+
+    base_url = "https://api.library.cdisc.org/api/mdr/ct/packages"
+
+    def __init__(self, fetch_json, max_packages: int = 16, full_package_after: int = 5, max_codelists: int = 512,
+                 headers: dict = None):
+        self.fetch_json = fetch_json
+        self.headers = headers or {}
+        self.max_packages = max_packages
+        self.full_package_after = full_package_after
+        self.max_codelists = max_codelists
+        self.package_fetches = 0
+        self.codelist_fetches = 0
+        self._packages = OrderedDict()
+        self._codelists = OrderedDict()
+        self._requested = {}
+        self._flights = SingleFlight()
+
+    def _key(self, standard: str, version: str, headers_ = None) -> tuple:
+        # (api key hash, package name), e.g. (None, "sdtmct-2024-03-29")
+        return credential(self.headers if headers_ is None else headers_), package_name(standard, version)
+
+    async def package(self, standard: str, version: str, headers_ = None) -> CTPackage:
+        """
+        Get a CT package, loading and indexing it on first use
+
+        Args:
+            standard: The CDISC standard (e.g., SDTM, ADAM).
+            version: CT version in YYYY-MM-DD format.
+            headers_: Optional custom headers
+
+        Returns:
+            CTPackage
+        """
+        key = self._key(standard, version, headers_)
+        if key in self._packages:
+            self._packages.move_to_end(key)
+            return self._packages[key]
+
+        async def load():
+            ct_data = await self.fetch_json(f"{self.base_url}/{key[1]}", headers_=headers_)
+            self.package_fetches += 1
+            ct_package = CTPackage(standard.upper(), version, ct_data.get("codelists", []))
+            self._packages[key] = ct_package
+            while len(self._packages) > self.max_packages:
+                self._packages.popitem(last=False)
+            # Codelists fetched one by one are now served from the package
+            for cached_key in [cached_key for cached_key in self._codelists if cached_key[0] == key]:
+                del self._codelists[cached_key]
+            self._requested.pop(key, None)
+            return ct_package
+
+        return await self._flights.ado(key, load)
+
+    async def codelist(self, standard: str, version: str, codelist_value: str,
+                       codelist_type: str = "ID", headers_ = None) -> CTCodelist:
+        """
+        Get one codelist, fetching only that codelist while its package is cold
+
+        Args:
+            standard: The CDISC standard (e.g., SDTM, ADAM).
+            version: CT version in YYYY-MM-DD format.
+            codelist_value: The codelist submission value or NCI code.
+            codelist_type: Match by 'ID' or 'CodelistCode'. Default is 'ID'.
+            headers_: Optional custom headers
+
+        Returns:
+            CTCodelist, or None if the package does not contain the codelist
+
+        Raises:
+            httpx.HTTPStatusError: If the package does not exist.
+        """
+        key = self._key(standard, version, headers_)
+        by_code = codelist_type.upper() == "CODELISTCODE"
+
+        # The codelist resource is addressed by NCI code only, so lookups by
+        # submission value always need the package
+        if key in self._packages or not by_code:
+            ct_package = await self.package(standard, version, headers_=headers_)
+            return ct_package.find(codelist_value, codelist_type)
+
+        code = codelist_value.upper()
+        if (key, code) in self._codelists:
+            self._codelists.move_to_end((key, code))
+            return self._codelists[(key, code)]
+
+        requested = self._requested.setdefault(key, set())
+        requested.add(code)
+        if len(requested) >= self.full_package_after:
+            ct_package = await self.package(standard, version, headers_=headers_)
+            return ct_package.find(codelist_value, codelist_type)
+
+        async def load():
+            try:
+                data = await self.fetch_json(f"{self.base_url}/{key[1]}/codelists/{code}", headers_=headers_)
+            except httpx.HTTPStatusError as error_http:
+                if error_http.response.status_code != 404:
+                    raise
+                # A package that does not exist answers 404 too: loading it raises
+                # that error, and otherwise tells the codelists it does contain
+                ct_package = await self.package(standard, version, headers_=headers_)
+                return ct_package.find(codelist_value, codelist_type)
+            self.codelist_fetches += 1
+            ct_codelist = CTCodelist.from_json(data)
+            self._codelists[(key, code)] = ct_codelist
+            while len(self._codelists) > self.max_codelists:
+                self._codelists.popitem(last=False)
+            return ct_codelist
+
+        return await self._flights.ado((key, code), load)
+
+    async def codelists(self, standard: str, version: str, codes: list, headers_ = None) -> dict:
+        """
+        Get several codelists of one CT package by NCI code in one batch
+
+        Enough codelists to reach full_package_after load the whole package
+        once; fewer are fetched one by one, concurrently.
+
+        Args:
+            standard: The CDISC standard (e.g., SDTM, ADAM).
+            version: CT version in YYYY-MM-DD format.
+            codes: Codelist NCI codes.
+            headers_: Optional custom headers
+
+        Returns:
+            Dictionary of upper case code to CTCodelist, without the codes the package does not contain
+        """
+        key = self._key(standard, version, headers_)
+        codes = list(dict.fromkeys(code.upper() for code in codes))
+
+        if key in self._packages or len(codes) >= self.full_package_after:
+            ct_package = await self.package(standard, version, headers_=headers_)
+            found = [ct_package.find(code, "CodelistCode") for code in codes]
+        else:
+            found = await asyncio.gather(*(
+                self.codelist(standard, version, code, "CodelistCode", headers_=headers_)
+                for code in codes
+            ))
+        return {code: codelist for code, codelist in zip(codes, found) if codelist is not None}
+
+    def loaded(self, standard: str, version: str, headers_ = None) -> CTPackage:
+        """
+        Get a CT package if it is loaded already, without any request
+
+        Returns:
+            CTPackage, or None if the package is not in memory for this api key
+        """
+        return self._packages.get(self._key(standard, version, headers_))
+
+    def fetched(self, standard: str, version: str, headers_ = None) -> list:
+        """
+        Get the codelists of a CT package fetched one by one while the package is not loaded
+
+        Returns:
+            List of CTCodelist, without any request
+        """
+        key = self._key(standard, version, headers_)
+        return [codelist for (package_key, _), codelist in self._codelists.items() if package_key == key]
+
+    def stats(self) -> dict:
+        """Report the loaded packages and how many packages and codelists were downloaded."""
+        return {
+            "packages": [name for _, name in self._packages],
+            "max_packages": self.max_packages,
+            "codelists": len(self._codelists),
+            "package_fetches": self.package_fetches,
+            "codelist_fetches": self.codelist_fetches
+        }
+
+
+class CTVersionRegistry:
+    """
+    Index of the published CT package versions of every standard
+
+    The /mdr/ct/packages listing is parsed in one pass into a newest-first
+    list of versions per standard, and kept in memory for ttl seconds, so
+    resolving the latest version does not parse the listing again per call.
+    Listings are kept per api key, like the CT packages of CTStore.
+
+    Args:
+        fetch_json: Coroutine function (url, headers_) returning the parsed JSON.
+        ttl: Seconds the parsed listing is used before it is fetched again.
+        headers: The request headers used when a caller passes none.
+    """
+
+    url = "https://api.library.cdisc.org/api/mdr/ct/packages"
+    package_pattern = re.compile(r"/mdr/ct/packages/([a-z-]+)ct-(\d{4}-\d{2}-\d{2})$")
+
+    def __init__(self, fetch_json, ttl: float = 600, headers: dict = None):
+        self.fetch_json = fetch_json
+        self.ttl = ttl
+        self.headers = headers or {}
+        self.refreshes = 0
+        # Per api key hash: (versions by standard, package hrefs, monotonic load time)
+        self._listings = {}
+        self._flights = SingleFlight()
+
+    @classmethod
+    def parse(cls, listing: dict) -> dict:
+        """
+        Group the packages of a /mdr/ct/packages listing by standard
+
+        Returns:
+            Dictionary of upper case standard to its versions, newest first
+        """
+        versions = {}
+        for package in listing.get("_links", {}).get("packages", []):
+            match = cls.package_pattern.search(package.get("href", "").strip())
+            if match:
+                versions.setdefault(match.group(1).upper(), []).append(match.group(2))
+        for standard_versions in versions.values():
+            standard_versions.sort(reverse=True)
+        return versions
+
+    async def versions(self, standard: str, headers_ = None) -> list:
+        """
+        Get the published CT versions of a standard, newest first
+
+        Args:
+            standard: The CDISC standard (e.g., SDTM, ADAM).
+            headers_: Optional custom headers
+
+        Returns:
+            List of versions in YYYY-MM-DD format, empty if the standard has none
+        """
+        key = credential(self.headers if headers_ is None else headers_)
+        listing = self._listings.get(key)
+        if listing is None or time.monotonic() - listing[2] >= self.ttl:
+            async def load():
+                data = await self.fetch_json(self.url, headers_=headers_)
+                hrefs = [package.get("href", "") for package in data.get("_links", {}).get("packages", [])]
+                self._listings[key] = (self.parse(data), hrefs, time.monotonic())
+                self.refreshes += 1
+
+            # Like the response cache, each api key gets the listing it was allowed to download
+            await self._flights.ado((self.url, key), load)
+        return self._listings[key][0].get(standard.upper(), [])
+
+    async def latest(self, standard: str, headers_ = None) -> str:
+        """
+        Get the latest CT version of a standard
+
+        Returns:
+            The version in YYYY-MM-DD format, or None if the standard has none
+        """
+        versions = await self.versions(standard, headers_=headers_)
+        return versions[0] if versions else None
+
+    def sample_hrefs(self, count: int = 5, headers_ = None) -> list:
+        """First package hrefs of the last listing of an api key, for error messages."""
+        listing = self._listings.get(credential(self.headers if headers_ is None else headers_))
+        return listing[1][:count] if listing else []
+
+    def stats(self) -> dict:
+        """Report the indexed standards and how often the listing was parsed."""
+        standards = {}
+        for versions, _, _ in self._listings.values():
+            for standard, standard_versions in versions.items():
+                standards[standard] = max(standards.get(standard, 0), len(standard_versions))
+        return {
+            "standards": standards,
+            "api_keys": len(self._listings),
+            "refreshes": self.refreshes,
+            "ttl": self.ttl
+        }
+
+
+DEFAULT_MAX_PACKAGES = int(os.getenv("SHIRANUI_CT_PACKAGES", "16"))
+DEFAULT_FULL_PACKAGE_AFTER = int(os.getenv("SHIRANUI_CT_FULL_PACKAGE_AFTER", "5"))
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import re
+import time
+
+from .cache import credential
+from .singleflight import SingleFlight
+
+# Implementation guide versions by the href pattern of their product links
+PRODUCT_PATTERNS = {
+    "SDTMIG": re.compile(r"/mdr/sdtmig/(\d+(?:-\d+)*)$"),
+    "SENDIG": re.compile(r"/mdr/sendig/(\d+(?:-\d+)*)$"),
+    "CDASHIG": re.compile(r"/mdr/cdashig/(\d+(?:-\d+)*)$"),
+    "ADAMIG": re.compile(r"/mdr/adam/adamig-(\d+(?:-\d+)*)$")
+}
+
+# Used when the product listing can be neither downloaded nor read from the cache
+FALLBACK_VERSIONS = {
+    "SDTMIG": ["3-4", "3-3", "3-2"],
+    "SENDIG": ["3-1-1", "3-1", "3-0"],
+    "CDASHIG": ["2-3", "2-2", "2-1"],
+    "ADAMIG": ["1-3", "1-2", "1-1"]
+}
+
+
+def version_key(version: str) -> tuple:
+    """Sort key of a hyphenated version, e.g. "3-1-1" -> (3, 1, 1)."""
+    return tuple(int(part) for part in version.split("-"))
+
+
+class ProductRegistry:
+    """
+    Published versions of the implementation guides, read from /mdr/products
+
+    One request lists every product, so the versions of SDTMIG, SENDIG,
+    CDASHIG and ADaMIG are parsed together and kept in memory for
+    refresh_interval seconds, per api key like the response cache. When the
+    listing cannot be downloaded, the versions known so far for the api key
+    are kept, else the last listing in the response cache downloaded with the
+    same key is used whatever its age, and without one the built-in
+    FALLBACK_VERSIONS, so default versions still resolve offline. After a
+    failure the listing is fetched again after retry_interval seconds.
+
+    Args:
+        fetch_json: Coroutine function (url, headers_) returning the parsed JSON.
+        cache: The ResponseCache holding the last downloaded listing.
+        refresh_interval: Seconds the parsed listing is used before it is fetched again.
+        headers: The request headers used when a caller passes none.
+        retry_interval: Seconds before a listing that failed to download is fetched again.
+    """
+
+    url = "https://library.cdisc.org/api/mdr/products"
+
+    def __init__(self, fetch_json, cache, refresh_interval: float = 600, headers: dict = None,
+                 retry_interval: float = 30):
+        self.fetch_json = fetch_json
+        self.cache = cache
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.headers = headers or {}
+        self.refreshes = 0
+        # Per api key hash: (versions by product, source, monotonic time of the next refresh)
+        self._listings = {}
+        self._flights = SingleFlight()
+
+    def _credential(self, headers_ = None) -> str:
+        return credential(self.headers if headers_ is None else headers_)
+
+    @staticmethod
+    def parse(listing: dict) -> dict:
+        """
+        Collect the versions of every implementation guide from a product listing
+
+        Returns:
+            Dictionary of product (e.g., SDTMIG) to its versions, newest first
+        """
+        versions = {product: [] for product in PRODUCT_PATTERNS}
+
+        def walk(node):
+            if isinstance(node, dict):
+                href = node.get("href")
+                if isinstance(href, str):
+                    for product, pattern in PRODUCT_PATTERNS.items():
+                        match = pattern.search(href)
+                        if match and match.group(1) not in versions[product]:
+                            versions[product].append(match.group(1))
+                for value in node.values():
+                    walk(value)
+            elif isinstance(node, list):
+                for value in node:
+                    walk(value)
+
+        walk(listing.get("_links", {}))
+        for product_versions in versions.values():
+            product_versions.sort(key=version_key, reverse=True)
+        return versions
+
+    async def _refresh(self, key: str, headers_ = None):
+        try:
+            listing = await self.fetch_json(self.url, headers_=headers_)
+            source = "api"
+        except Exception:
+            known = self._listings.get(key)
+            if known is not None and known[1] != "fallback":
+                # Keep the versions known so far and retry shortly
+                self._listings[key] = (known[0], known[1], time.monotonic() + self.retry_interval)
+                return
+            cached = await asyncio.to_thread(self.cache.get, self.url, key)
+            try:
+                listing = json.loads(cached.body) if cached is not None else None
+            except ValueError:
+                listing = None
+            source = "cache" if listing is not None else "fallback"
+
+        versions = self.parse(listing) if listing is not None else {}
+        for product, fallback in FALLBACK_VERSIONS.items():
+            if not versions.get(product):
+                versions[product] = list(fallback)
+        interval = self.refresh_interval if source == "api" else self.retry_interval
+        self._listings[key] = (versions, source, time.monotonic() + interval)
+        self.refreshes += 1
+
+    async def versions(self, product: str, headers_ = None) -> list:
+        """
+        Get the published versions of an implementation guide, newest first
+
+        Args:
+            product: SDTMIG, SENDIG, CDASHIG or ADAMIG.
+            headers_: Optional custom headers
+
+        Returns:
+            List of versions in hyphen format (e.g., ["3-4", "3-3", ...])
+        """
+        key = self._credential(headers_)
+        listing = self._listings.get(key)
+        if listing is None or time.monotonic() >= listing[2]:
+            # Callers with different api keys do not share a download
+            await self._flights.ado((self.url, key), lambda: self._refresh(key, headers_=headers_))
+        return list(self._listings[key][0].get(product.upper(), []))
+
+    async def latest(self, product: str, headers_ = None) -> str:
+        """Get the latest version of an implementation guide in hyphen format."""
+        versions = await self.versions(product, headers_=headers_)
+        return versions[0] if versions else None
+
+    def source(self, headers_ = None) -> str:
+        """
+        Where the versions of an api key were read from
+
+        Returns:
+            "api", "cache", "fallback", or None before the first call
+        """
+        listing = self._listings.get(self._credential(headers_))
+        return listing[1] if listing else None
+
+    def stats(self) -> dict:
+        """Report the known versions per product and where they were read from."""
+        listing = self._listings.get(self._credential())
+        return {
+            "versions": dict(listing[0]) if listing else {},
+            "source": listing[1] if listing else None,
+            "api_keys": len(self._listings),
+            "refreshes": self.refreshes,
+            "refresh_interval": self.refresh_interval
+        }
@@ -0,0 +1,435 @@
+import json
+import queue
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .cache import FRESH
+
+SEARCH_INDEX_FORMAT = 2
+
+# Nested collections holding indexed items, with the path segment and key of their hrefs
+CHILD_COLLECTIONS = {
+    "codelists": ("codelists", "conceptId"),
+    "terms": ("terms", "conceptId"),
+    "datasets": ("datasets", "name"),
+    "datasetVariables": ("variables", "name"),
+    "analysisVariables": ("variables", "name"),
+    "fields": ("fields", "name")
+}
+
+# Collections passed through to their items without an href of their own
+PASS_THROUGH = ("analysisVariableSets",)
+
+# Document type by the href pattern of the item
+DOCUMENT_TYPES = [
+    (re.compile(r"/codelists/[^/]+/terms/[^/]+$"), "Codelist Term"),
+    (re.compile(r"/codelists/[^/]+$"), "Codelist"),
+    (re.compile(r"/domains/[^/]+/fields/[^/]+$"), "Field"),
+    (re.compile(r"/(datasets|datastructures)/[^/]+/variables/[^/]+$"), "Variable"),
+    (re.compile(r"/(datasets|datastructures|domains)/[^/]+$"), "Dataset"),
+    (re.compile(r"/biomedicalconcepts/[^/]+$"), "Biomedical Concept"),
+    (re.compile(r"/datasetspecializations/[^/?]+$"), "Dataset Specialization")
+]
+
+# Names of the CDISC Library search (/mdr/search) for the document types it names differently,
+# so local and remote hits of search_cdisc_library can be filtered by the same type
+REMOTE_TYPES = {
+    "Codelist": "Code List",
+    "Codelist Term": "Code List Value"
+}
+
+
+def _first(node: dict, *keys) -> str:
+    for key in keys:
+        value = node.get(key)
+        if isinstance(value, str) and value:
+            return value
+    return ""
+
+
+def _text(node: dict) -> str:
+    parts = [
+        node.get(key) for key in ("description", "definition", "questionText", "prompt", "conceptId", "domain")
+        if isinstance(node.get(key), str)
+    ]
+    synonyms = node.get("synonyms")
+    if isinstance(synonyms, list):
+        parts.extend(synonym for synonym in synonyms if isinstance(synonym, str))
+    return " ".join(parts)
+
+
+def resource_href(url: str) -> str:
+    """Href of a resource as used in CDISC Library links, e.g. /mdr/sdtmig/3-4/datasets/DM."""
+    return re.sub(r"^.*?/api(/cosmos/v2)?(?=/mdr/)", "", urlsplit(url).path)
+
+
+def documents(data: dict, url: str = None) -> list:
+    """
+    Collect the searchable items of a CDISC Library resource
+
+    Items are variables, CDASH fields, datasets, codelists, codelist terms,
+    Biomedical Concepts and Dataset Specializations, whether the resource is
+    the item itself or a listing, dataset or CT package containing it. Items
+    without a link of their own get an href derived from the resource url or
+    from the item containing them.
+
+    Returns:
+        List of (href, type, name, label, text) tuples
+    """
+    found = []
+
+    def walk(node, href):
+        if not isinstance(node, dict):
+            return
+        self_link = (node.get("_links") or {}).get("self") or {}
+        if isinstance(self_link.get("href"), str):
+            href = self_link["href"]
+        if href:
+            for pattern, document_type in DOCUMENT_TYPES:
+                if pattern.search(href):
+                    name = _first(node, "submissionValue", "datasetSpecializationId", "name", "shortName")
+                    label = _first(node, "preferredTerm", "label", "shortName", "name")
+                    if name:
+                        found.append((href, document_type, name, "" if label == name else label, _text(node)))
+                    break
+        for key, children in node.items():
+            if key in CHILD_COLLECTIONS and isinstance(children, list):
+                segment, id_key = CHILD_COLLECTIONS[key]
+                for child in children:
+                    if isinstance(child, dict):
+                        child_id = child.get(id_key)
+                        walk(child, f"{href}/{segment}/{child_id}" if href and child_id else None)
+            elif key in PASS_THROUGH and isinstance(children, list):
+                for child in children:
+                    walk(child, href)
+
+    walk(data, resource_href(url) if url else None)
+    return found
+
+
+def link_documents(data: dict) -> list:
+    """
+    Collect the items linked from the _links of a resource, such as the
+    Biomedical Concepts of the concept listing, named by their link titles
+
+    Returns:
+        List of (href, type, name, label, text) tuples
+    """
+    found = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            href = node.get("href")
+            if isinstance(href, str):
+                for pattern, document_type in DOCUMENT_TYPES:
+                    if pattern.search(href):
+                        name = href.rstrip("/").split("/")[-1]
+                        found.append((href, document_type, name, node.get("title") or "", ""))
+                        break
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(data.get("_links", {}))
+    return found
+
+
+def match_expression(query: str) -> str:
+    """FTS5 expression matching documents containing every word of a query."""
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", query))
+
+
+class SearchIndex:
+    """
+    Full-text index of the CDISC Library items the server has read, ranked with BM25
+
+    Every JSON resource fetched through the server is split into its items
+    (see documents()), which are indexed in a SQLite FTS5 table next to the
+    response cache, so the index grows with use and survives restarts. Items
+    of published versions are indexed once; "latest" resources are indexed
+    again when they may have changed, following the cache policy. Responses
+    already cached, or mirrored in a snapshot, are indexed on first search.
+
+    Responses are handed over with submit() and indexed by one worker thread,
+    so callers never wait for the database. When queue_size responses are
+    waiting, further ones are dropped and indexed the next time they are read.
+
+    Like the response cache, the index keeps which api keys (by credential
+    hash) read each item, and searches only return the items read with the
+    credentials of the caller, so nobody is answered with definitions the
+    CDISC Library would have refused them.
+
+    Args:
+        cache: The ResponseCache whose directory and enabled flag are followed;
+               without a cache the index is kept in memory.
+        policy: CachePolicy deciding when an indexed resource is indexed again.
+        queue_size: Maximum number of responses waiting to be indexed.
+    """
+
+    def __init__(self, cache, policy, queue_size: int = 256):
+        self.cache = cache
+        self.policy = policy
+        self.searches = 0
+        self.generation = 0
+        self.backfilled = False
+        self.dropped = 0
+        self._indexed_at = None
+        self._connection = None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._queued = set()
+        self._worker = None
+        self._submit_lock = threading.Lock()
+        self._backfill_lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._connection is None:
+            if self.cache.enabled:
+                self.cache.directory.mkdir(parents=True, exist_ok=True)
+                connection = sqlite3.connect(
+                    self.cache.directory / "search.sqlite3",
+                    check_same_thread=False,
+                    isolation_level=None
+                )
+                connection.execute("PRAGMA journal_mode=WAL")
+            else:
+                connection = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+            if connection.execute("PRAGMA user_version").fetchone()[0] != SEARCH_INDEX_FORMAT:
+                for table in ("documents", "items", "readers", "resources"):
+                    connection.execute(f"DROP TABLE IF EXISTS {table}")
+                connection.execute(f"PRAGMA user_version = {SEARCH_INDEX_FORMAT}")
+            connection.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5("
+                "name, label, text, href UNINDEXED, type UNINDEXED)"
+            )
+            connection.execute("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, href TEXT UNIQUE NOT NULL)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS readers (item_id INTEGER NOT NULL, credential TEXT NOT NULL, "
+                "PRIMARY KEY (item_id, credential)) WITHOUT ROWID"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS resources (url TEXT NOT NULL, credential TEXT NOT NULL, "
+                "indexed_at REAL NOT NULL, PRIMARY KEY (url, credential))"
+            )
+            self._indexed_at = {
+                (url, url_credential): indexed_at
+                for url, url_credential, indexed_at in connection.execute(
+                    "SELECT url, credential, indexed_at FROM resources"
+                )
+            }
+            self._connection = connection
+        return self._connection
+
+    def configure(self):
+        """Reopen the index on next use, after the cache settings changed."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._indexed_at = None
+            self.backfilled = False
+
+    def needs(self, url: str, credential: str = None) -> bool:
+        """
+        Whether a resource is not indexed for a credential, or indexed long enough ago that it may have changed
+
+        Answered from memory without waiting for the database; before the index
+        is opened, every resource is reported as needed.
+        """
+        key = (url, credential or "")
+        indexed_at = self._indexed_at.get(key) if self._indexed_at is not None else None
+        return indexed_at is None or self.policy.freshness(url, indexed_at) != FRESH
+
+    def submit(self, url: str, body: bytes, credential: str = None):
+        """Queue a JSON response body for the worker thread, unless it is queued or indexed already."""
+        key = (url, credential or "")
+        with self._submit_lock:
+            if key in self._queued or not self.needs(url, credential):
+                return
+            try:
+                self._queue.put_nowait((url, credential, body))
+            except queue.Full:
+                self.dropped += 1
+                return
+            self._queued.add(key)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._work, name="search-index", daemon=True)
+                self._worker.start()
+
+    def _work(self):
+        while True:
+            url, credential, body = self._queue.get()
+            try:
+                self.add_body(url, body, credential)
+            except Exception:
+                pass
+            finally:
+                with self._submit_lock:
+                    self._queued.discard((url, credential or ""))
+
+    def add(self, url: str, data: dict, credential: str = None):
+        """Index the items of a resource read with a credential, unless they are indexed for it already."""
+        with self._lock:
+            self._db()
+        if not self.needs(url, credential):
+            return
+        reader = credential or ""
+        found = documents(data, url) if isinstance(data, dict) else []
+        linked = link_documents(data) if isinstance(data, dict) else []
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            try:
+                for href, document_type, name, label, text in found:
+                    db.execute("INSERT OR IGNORE INTO items (href) VALUES (?)", (href,))
+                    item_id = db.execute("SELECT id FROM items WHERE href = ?", (href,)).fetchone()[0]
+                    db.execute("DELETE FROM documents WHERE rowid = ?", (item_id,))
+                    db.execute(
+                        "INSERT INTO documents (rowid, name, label, text, href, type) VALUES (?, ?, ?, ?, ?, ?)",
+                        (item_id, name, label, text, href, document_type)
+                    )
+                    db.execute("INSERT OR IGNORE INTO readers (item_id, credential) VALUES (?, ?)", (item_id, reader))
+                # A link only names an item not indexed from its own resource yet
+                for href, document_type, name, label, text in linked:
+                    if db.execute("INSERT OR IGNORE INTO items (href) VALUES (?)", (href,)).rowcount:
+                        db.execute(
+                            "INSERT INTO documents (rowid, name, label, text, href, type) "
+                            "VALUES (last_insert_rowid(), ?, ?, ?, ?, ?)",
+                            (name, label, text, href, document_type)
+                        )
+                    item_id = db.execute("SELECT id FROM items WHERE href = ?", (href,)).fetchone()[0]
+                    db.execute("INSERT OR IGNORE INTO readers (item_id, credential) VALUES (?, ?)", (item_id, reader))
+                db.execute(
+                    "INSERT OR REPLACE INTO resources (url, credential, indexed_at) VALUES (?, ?, ?)",
+                    (url, reader, now)
+                )
+                db.execute("COMMIT")
+            except sqlite3.Error:
+                db.execute("ROLLBACK")
+                return
+            self._indexed_at[(url, reader)] = now
+            if found or linked:
+                self.generation += 1
+
+    def add_body(self, url: str, body: bytes, credential: str = None):
+        """Index the items of a JSON response body read with a credential, unless they are indexed already."""
+        if not self.needs(url, credential):
+            return
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return
+        self.add(url, data, credential)
+
+    def backfill(self, source):
+        """
+        Index the stored responses of a ResponseCache or Snapshot not indexed yet
+
+        Each response is indexed for the credential it is stored with. Runs
+        once; call it from a worker thread, as a large cache takes a while.
+        Concurrent calls wait for the first one instead of reading the source
+        again.
+        """
+        with self._backfill_lock:
+            if self.backfilled:
+                return
+            for url, body_credential, body in source.bodies():
+                self.add_body(url, body, body_credential)
+            self.backfilled = True
+
+    def search(self, query: str, limit: int = 100, offset: int = 0, readers: tuple = None) -> tuple:
+        """
+        Find the indexed items matching every word of a query, best BM25 score first
+
+        Name matches weigh more than label matches, and those more than
+        matches in descriptions and definitions.
+
+        Args:
+            query: Free text; every word must match.
+            limit: Maximum number of hits returned.
+            offset: Number of hits skipped.
+            readers: Only return the items read with one of these credentials
+                     ("" without an api key). If not specified, all items.
+
+        Returns:
+            Tuple of the total number of matching items and the hits from offset
+        """
+        expression = match_expression(query)
+        if not expression:
+            return 0, []
+        self.searches += 1
+        condition, parameters = "documents MATCH ?", [expression]
+        if readers is not None:
+            readers = [reader or "" for reader in readers]
+            condition += (
+                f" AND rowid IN (SELECT item_id FROM readers WHERE credential IN ({', '.join('?' * len(readers))}))"
+            )
+            parameters += readers
+        with self._lock:
+            db = self._db()
+            total = db.execute(
+                f"SELECT COUNT(*) FROM documents WHERE {condition}", parameters
+            ).fetchone()[0]
+            rows = db.execute(
+                "SELECT href, type, name, label, text, bm25(documents, 10.0, 4.0, 1.0) AS score "
+                f"FROM documents WHERE {condition} ORDER BY score LIMIT ? OFFSET ?",
+                (*parameters, limit, offset)
+            ).fetchall()
+        return total, [
+            {
+                "href": href,
+                "type": document_type,
+                "name": name,
+                "label": label,
+                "text": text,
+                "score": round(-score, 3)
+            }
+            for href, document_type, name, label, text, score in rows
+        ]
+
+    def items(self, batch: int = 5000) -> list:
+        """
+        Get all indexed items
+
+        The items are read in batches, releasing the lock in between, so
+        indexing and searches are not held up for a whole scan.
+
+        Returns:
+            List of (href, type, name, label, text, readers) tuples, readers being
+            the frozenset of the credentials the item was read with
+        """
+        found = []
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._db().execute(
+                    "SELECT rowid, href, type, name, label, text, "
+                    "(SELECT json_group_array(credential) FROM readers WHERE item_id = documents.rowid) "
+                    "FROM documents WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last, batch)
+                ).fetchall()
+            if not rows:
+                return found
+            last = rows[-1][0]
+            found.extend((*row[1:6], frozenset(json.loads(row[6]))) for row in rows)
+
+    def stats(self) -> dict:
+        """Report the number of indexed items and resources."""
+        with self._lock:
+            db = self._db()
+            items = db.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+            resources = len({url for url, _ in self._indexed_at})
+        return {
+            "items": items,
+            "resources": resources,
+            "queued": self._queue.qsize(),
+            "dropped": self.dropped,
+            "backfilled": self.backfilled,
+            "searches": self.searches
+        }
@@ -0,0 +1,121 @@
+from collections import OrderedDict
+
+from .cache import credential
+from .trigrams import TrigramIndex
+from .variable_index import first_result
+
+
+class SENDDatasetStore:
+    """
+    In-memory store of parsed SENDIG dataset payloads, shared by the SEND tools
+
+    SENDIG versions never change, so each /mdr/sendig/{version}/datasets/{domain}
+    payload is downloaded and parsed once per process. Payloads are kept per
+    api key, like the response cache, and the least recently used are dropped
+    when more than max_datasets are kept.
+
+    Args:
+        fetch_json: Coroutine function (url, headers_) returning the parsed JSON.
+        max_datasets: Maximum number of dataset payloads kept in memory.
+        headers: The request headers used when a caller passes none.
+    """
+
+    base_url = "https://library.cdisc.org/api/mdr/sendig"
+
+    def __init__(self, fetch_json, max_datasets: int = 64, headers: dict = None):
+        self.fetch_json = fetch_json
+        self.max_datasets = max_datasets
+        self.headers = headers or {}
+        self.fetches = 0
+        self._datasets = OrderedDict()
+
+    def _credential(self, headers_ = None) -> str:
+        return credential(self.headers if headers_ is None else headers_)
+
+    async def dataset(self, sendig_version: str, domain: str, headers_ = None) -> dict:
+        """
+        Get a SENDIG dataset payload, including its _links
+
+        Args:
+            sendig_version: SENDIG version in hyphen format (e.g., "3-1-1").
+            domain: SEND domain name in upper case.
+            headers_: Optional custom headers
+
+        Returns:
+            The dataset JSON. It is shared, so callers must not modify it.
+        """
+        key = (self._credential(headers_), sendig_version, domain)
+        if key in self._datasets:
+            self._datasets.move_to_end(key)
+            return self._datasets[key]
+
+        data = await self.fetch_json(f"{self.base_url}/{sendig_version}/datasets/{domain}", headers_=headers_)
+        self.fetches += 1
+        self._datasets[key] = data
+        while len(self._datasets) > self.max_datasets:
+            self._datasets.popitem(last=False)
+        return data
+
+    async def find_variable(self, variable: str, sendig_version: str, domains: list, limit: int = 4,
+                            headers_ = None) -> str:
+        """
+        Find the first of several domains whose dataset contains a variable
+
+        The datasets are fetched concurrently, at most limit at a time, and
+        checked in the order of the domains: once a domain contains the
+        variable, the datasets of the domains after it are no longer fetched.
+        Fetched datasets are kept for later calls; datasets that fail to
+        download are skipped.
+
+        Args:
+            variable: Variable name in upper case.
+            sendig_version: SENDIG version in hyphen format.
+            domains: SEND domain names in the order they are preferred.
+            limit: Maximum number of datasets fetched at the same time.
+            headers_: Optional custom headers
+
+        Returns:
+            The domain name, or None if no dataset contains the variable
+        """
+        def probe(domain):
+            async def contains_variable():
+                try:
+                    data = await self.dataset(sendig_version, domain, headers_=headers_)
+                except Exception:
+                    return None
+                if any(var.get("name") == variable for var in data.get("datasetVariables", [])):
+                    return domain
+                return None
+            return contains_variable
+
+        return await first_result(limit, [probe(domain) for domain in domains])
+
+    def similar(self, variable: str, sendig_version: str, domain: str = None, headers_ = None) -> list:
+        """
+        Find the variables of the datasets read so far closest to a misspelt variable name
+
+        Args:
+            variable: Variable name looked up.
+            sendig_version: SENDIG version in hyphen format.
+            domain: Only consider this domain. If not specified, all datasets read so far.
+            headers_: Optional custom headers
+
+        Returns:
+            List of variable names, most similar first
+        """
+        key_credential = self._credential(headers_)
+        return TrigramIndex(
+            var.get("name")
+            for (dataset_credential, version, dataset), data in list(self._datasets.items())
+            if dataset_credential == key_credential and version == sendig_version
+            and (domain is None or dataset == domain)
+            for var in data.get("datasetVariables", [])
+        ).similar(variable)
+
+    def stats(self) -> dict:
+        """Report how many dataset payloads are kept and how many were downloaded."""
+        return {
+            "datasets": len(self._datasets),
+            "max_datasets": self.max_datasets,
+            "fetches": self.fetches
+        }
@@ -1,10 +1,53 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from typing import Optional
+from urllib.parse import urlencode
 
-import requests
+import httpx
 from mcp.server.fastmcp import FastMCP
 
-mcp = FastMCP("CDISC Library Retriever")
+from .cache import FRESH, LATEST_TTL, STALE, CacheEntry, cache_policy, credential, response_cache
+from .client import async_http_pool
+from .ct_store import (
+    DEFAULT_FULL_PACKAGE_AFTER,
+    DEFAULT_MAX_PACKAGES,
+    CTStore,
+    CTVersionRegistry,
+    codelist_hrefs,
+    parse_codelist_href
+)
+from .products import ProductRegistry, version_key
+from .search_index import REMOTE_TYPES, SearchIndex
+from .send_store import SENDDatasetStore
+from .similarity import SimilarityIndex
+from .singleflight import SingleFlight
+from .snapshot import SNAPSHOT_CREDENTIAL, snapshot
+from .trigrams import TrigramIndex
+from .variable_index import PartialIndex, VariableIndex, first_result, gather_limited, succeeded
+
+
+# The event loop only keeps weak references to tasks; these are held until they finish
+_background_tasks = set()
+
+
+def _run_in_background(coroutine) -> asyncio.Task:
+    """Schedule a coroutine on the running event loop without awaiting it."""
+    task = asyncio.get_running_loop().create_task(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    # The async clients are bound to the server's event loop, so they are warmed up here
+    if async_http_pool.prewarm_on_start:
+        _run_in_background(async_http_pool.prewarm())
+    yield {}
+
+
+mcp = FastMCP("CDISC Library Retriever", lifespan=lifespan)
 
 headers = {
     "api-key": os.getenv('CDISC_LIBRARY_API_KEY'),
@@ -12,27 +55,167 @@ headers = {
 }
 
 
-def api(endpoint_url: str, headers_ = None)-> requests.Response:
+async def _afetch(endpoint_url: str, request_headers: dict, cached: CacheEntry = None) -> httpx.Response:
+    if cached is not None:
+        request_headers = {**request_headers, **cached.conditional_headers()}
+
+    response = await async_http_pool.get(endpoint_url, headers=request_headers)
+    # SQLite writes and compression run in a worker thread, off the event loop
+    if response.status_code == 304 and cached is not None:
+        await asyncio.to_thread(response_cache.refresh, endpoint_url, credential(request_headers))
+        response_cache.count("revalidated")
+        return cached.to_httpx_response()
+
+    response.raise_for_status()
+    await asyncio.to_thread(
+        response_cache.put, endpoint_url, response.content, response.headers, credential(request_headers)
+    )
+    response_cache.count("downloaded")
+    return response
+
+
+flights = SingleFlight()
+
+_revalidating = set()
+
+
+def _revalidate_in_background(endpoint_url: str, request_headers: dict, cached: CacheEntry):
+    """Revalidate a stale response without making the caller wait for it."""
+    # Each api key has its own cache entry to revalidate
+    key = (endpoint_url, credential(request_headers))
+    if key in _revalidating:
+        return
+    _revalidating.add(key)
+
+    async def revalidate():
+        try:
+            await _afetch(endpoint_url, request_headers, cached)
+        except Exception:
+            pass
+        finally:
+            _revalidating.discard(key)
+
+    _run_in_background(revalidate())
+
+
+# Full-text index of the items of every response read, answering search_cdisc_library
+search_index = SearchIndex(response_cache, cache_policy)
+
+# TF-IDF vectors of the indexed items, answering find_similar_metadata
+similarity_index = SimilarityIndex(search_index)
+
+
+def _index_in_background(endpoint_url: str, response, request_credential: str = None):
+    """Add the items of a response to the search index without making the caller wait for it."""
+    if response.status_code == 200:
+        search_index.submit(endpoint_url, response.content, request_credential)
+
+
+async def _backfill_search_index():
+    """Index the cached or mirrored responses on first search, in one pass shared by concurrent searches."""
+    if not search_index.backfilled:
+        source = snapshot if snapshot.enabled else response_cache
+        await flights.ado("search-index-backfill", lambda: asyncio.to_thread(search_index.backfill, source))
+
+
+def _search_readers(headers_ = None) -> tuple:
+    """Credentials whose indexed items a caller may see: their own, and the snapshot's while one is used."""
+    reader = credential(headers if headers_ is None else headers_) or ""
+    return (reader, SNAPSHOT_CREDENTIAL) if snapshot.enabled else (reader,)
+
+
+async def _aget(endpoint_url: str, request_headers: dict) -> httpx.Response:
+    if snapshot.enabled:
+        response = await asyncio.to_thread(snapshot.httpx_response, endpoint_url)
+        response.raise_for_status()
+        return response
+
+    cached = await asyncio.to_thread(response_cache.get, endpoint_url, credential(request_headers))
+    if cached is not None:
+        freshness = cache_policy.freshness(endpoint_url, cached.stored_at)
+        if freshness == FRESH:
+            response_cache.count("fresh")
+            return cached.to_httpx_response()
+        if freshness == STALE:
+            response_cache.count("stale")
+            _revalidate_in_background(endpoint_url, request_headers, cached)
+            return cached.to_httpx_response()
+
+    return await _afetch(endpoint_url, request_headers, cached)
+
+
+async def aapi(endpoint_url: str, headers_ = None) -> httpx.Response:
     try:
-        if headers_ is None:
-            response = requests.get(endpoint_url, headers=headers)
-            response.raise_for_status()
-            return response
-        else:
-            response = requests.get(endpoint_url, headers=headers_)
-            response.raise_for_status()
+        request_headers = dict(headers if headers_ is None else headers_)
+        async def fetch():
+            response = await _aget(endpoint_url, request_headers)
+            _index_in_background(endpoint_url, response, credential(request_headers))
             return response
 
-    except requests.exceptions.HTTPError as error_http:
+        # Callers with different api keys do not share a download
+        return await flights.ado((endpoint_url, credential(request_headers)), fetch)
+
+    except httpx.HTTPStatusError as error_http:
         raise error_http
-    except requests.exceptions.ConnectionError as error_connection:
+    except httpx.ConnectError as error_connection:
         raise error_connection
-    except requests.exceptions.Timeout as time_out_error:
+    except httpx.TimeoutException as time_out_error:
         raise time_out_error
-    except requests.exceptions.RequestException as other_error:
+    except httpx.HTTPError as other_error:
         raise other_error
 
 
+async def aapi_json(endpoint_url: str, headers_ = None):
+    """
+    Fetch and parse a JSON resource. Concurrent callers for the same url and
+    api key share one download and one parsed object, which must be treated
+    as read-only.
+    """
+    async def fetch():
+        response = await aapi(endpoint_url, headers_=headers_)
+        return response.json()
+
+    key = ("json", endpoint_url, credential(headers if headers_ is None else headers_))
+    return await flights.ado(key, fetch)
+
+
+# Published implementation guide versions, the default of every version parameter
+products = ProductRegistry(aapi_json, response_cache, refresh_interval=LATEST_TTL, headers=headers)
+
+
+@mcp.tool(name="get_server_stats")
+async def get_server_stats() -> dict:
+    """
+    Get runtime statistics of the server, such as upstream connection usage
+
+    Usage:
+        get_server_stats()
+    """
+    # The cache, snapshot and search index stats query SQLite, off the event loop
+    cache_stats, snapshot_stats, search_index_stats = await asyncio.gather(
+        asyncio.to_thread(response_cache.stats),
+        asyncio.to_thread(snapshot.stats),
+        asyncio.to_thread(search_index.stats)
+    )
+    return {
+        "async_http": async_http_pool.stats(),
+        "cache": cache_stats,
+        "snapshot": snapshot_stats,
+        "singleflight": flights.stats(),
+        "ct_store": ct_store.stats(),
+        "ct_versions": ct_versions.stats(),
+        "variable_indexes": {
+            "sdtmig": sdtmig_variable_index.stats(),
+            "adamig": adamig_variable_index.stats(),
+            "cdashig": cdashig_field_index.stats()
+        },
+        "sendig_datasets": sendig_datasets.stats(),
+        "products": products.stats(),
+        "search_index": search_index_stats,
+        "similarity_index": similarity_index.stats()
+    }
+
+
 # MCP for Biomedical Concepts V2
 @mcp.tool(name="get_latest_bc_list")
 async def get_latest_bc_list(headers_ = None) -> dict:
@@ -44,14 +227,14 @@ async def get_latest_bc_list(headers_ = None) -> dict:
     """
     url = "https://api.library.cdisc.org/api/cosmos/v2/mdr/bc/biomedicalconcepts"
     if headers_ is None:
-        response = api(url)
+        response = await aapi(url)
     else:
-        response = api(url, headers_=headers_)
+        response = await aapi(url, headers_=headers_)
 
     return response.json()
 
 @mcp.tool(name="get_latest_bc_cat")
-def get_latest_bc_cat(headers_ = None) -> dict:
+async def get_latest_bc_cat(headers_ = None) -> dict:
     """
     Get Latest Biomedical Concept Categories from CDISC Library
 
@@ -60,15 +243,15 @@ def get_latest_bc_cat(headers_ = None) -> dict:
     """
     url = "https://api.library.cdisc.org/api/cosmos/v2/mdr/bc/categories"
     if headers_ is None:
-        response = api(url)
+        response = await aapi(url)
     else:
-        response = api(url, headers_=headers_)
+        response = await aapi(url, headers_=headers_)
 
     return response.json()
 
 
 @mcp.tool(name="get_latest_bc")
-def get_latest_bc(concept_id: str, headers_ = None) -> dict:
+async def get_latest_bc(concept_id: str, headers_ = None) -> dict:
     """
     Get latest Biomedical Concept specified by concept_id from CDISC Library
 
@@ -80,15 +263,15 @@ def get_latest_bc(concept_id: str, headers_ = None) -> dict:
     """
     url = f"https://api.library.cdisc.org/api/cosmos/v2/mdr/bc/biomedicalconcepts/{concept_id}"
     if headers_ is None:
-        response = api(url)
+        response = await aapi(url)
     else:
-        response = api(url, headers_=headers_)
+        response = await aapi(url, headers_=headers_)
 
     return response.json()
 
 
 @mcp.tool(name="get_bc_package_list")
-def get_bc_package_list(headers_ = None) -> dict:
+async def get_bc_package_list(headers_ = None) -> dict:
     """
     Get Biomedical Concept Package List from CDISC Library
 
@@ -97,15 +280,15 @@ def get_bc_package_list(headers_ = None) -> dict:
     """
     url = "https://api.library.cdisc.org/api/cosmos/v2/mdr/bc/packages"
     if headers_ is None:
-        response = api(url)
+        response = await aapi(url)
     else:
-        response = api(url, headers_=headers_)
+        response = await aapi(url, headers_=headers_)
 
     return response.json()
 
 
 @mcp.tool(name="get_bc_for_package")
-def get_bc_for_package(package: str, biomedicalconcept_id: str, headers_ = None) -> dict:
+async def get_bc_for_package(package: str, biomedicalconcept_id: str, headers_ = None) -> dict:
     """
     Get a specific Biomedical Concept from a specific package
 
@@ -118,15 +301,15 @@ def get_bc_for_package(package: str, biomedicalconcept_id: str, headers_ = None)
     """
     url = f"https://api.library.cdisc.org/api/cosmos/v2/mdr/bc/packages/{package}/biomedicalconcepts/{biomedicalconcept_id}"
     if headers_ is None:
-        response = api(url)
+        response = await aapi(url)
     else:
-        response = api(url, headers_=headers_)
+        response = await aapi(url, headers_=headers_)
 
     return response.json()
 
 
 @mcp.tool(name="get_bc_list_for_package")
-def get_bc_list_for_package(package: str, headers_ = None) -> dict:
+async def get_bc_list_for_package(package: str, headers_ = None) -> dict:
     """
     Get Biomedical Concept list for a specific Package
 
@@ -138,16 +321,16 @@ def get_bc_list_for_package(package: str, headers_ = None) -> dict:
     """
     url=f"https://api.library.cdisc.org/api/cosmos/v2/mdr/bc/packages/{package}/biomedicalconcepts"
     if headers_ is None:
-        response = api(url)
+        response = await aapi(url)
     else:
-        response = api(url, headers_=headers_)
+        response = await aapi(url, headers_=headers_)
 
     return response.json()
 
 
 # MCP for SDTM Dataset Specialization
 @mcp.tool(name="get_latest_bc_dataset_specializations")
-def get_latest_bc_dataset_specializations(biomedicalconcept: str, headers_ = None) -> dict:
+async def get_latest_bc_dataset_specializations(biomedicalconcept: str, headers_ = None) -> dict:
     """
     Get latest Biomedical Concept Dataset Specializations List from CDISC Library
 
@@ -159,15 +342,15 @@ def get_latest_bc_dataset_specializations(biomedicalconcept: str, headers_ = Non
     """
     url = f"https://api.library.cdisc.org/api/cosmos/v2/mdr/specializations/datasetspecializations?biomedicalconcept={biomedicalconcept}"
     if headers_ is None:
-        response = api(url)
+        response = await aapi(url)
     else:
-        response = api(url, headers_=headers_)
+        response = await aapi(url, headers_=headers_)
 
     return response.json()
 
 
 @mcp.tool(name="get_latest_sdtm_dataset_specializations_list")
-def get_latest_sdtm_dataset_specializations_list(domain: str, headers_ = None) -> dict:
+async def get_latest_sdtm_dataset_specializations_list(domain: str, headers_ = None) -> dict:
     """
     Get Latest SDTM Dataset Specializations List for a specific domain
 
@@ -181,14 +364,14 @@ def get_latest_sdtm_dataset_specializations_list(domain: str, headers_ = None) -
 
     print(headers_)
     if headers_ is None:
-        response = api(endpoint_url=url)
+        response = await aapi(endpoint_url=url)
     else:
-        response = api(endpoint_url=url, headers_ = headers)
+        response = await aapi(endpoint_url=url, headers_ = headers)
     return response.json()
 
 
 @mcp.tool(name="get_latest_sdtm_specialization")
-def get_latest_sdtm_specialization(dataset_specialization_id: str, headers_ = None) -> dict:
+async def get_latest_sdtm_specialization(dataset_specialization_id: str, headers_ = None) -> dict:
     """
     Get Latest SDTM Specialization for a specific specialization ID
 
@@ -200,14 +383,14 @@ def get_latest_sdtm_specialization(dataset_specialization_id: str, headers_ = No
     """
     url = f"https://api.library.cdisc.org/api/cosmos/v2/mdr/specializations/sdtm/datasetspecializations/{dataset_specialization_id}"
     if headers_ is None:
-        response = api(url)
+        response = await aapi(url)
     else:
-        response = api(url, headers_=headers_)
+        response = await aapi(url, headers_=headers_)
     return response.json()
 
 
 @mcp.tool(name="get_sdtm_dataset_specialization_domain_list")
-def get_sdtm_dataset_specialization_domain_list(headers_ = None) -> dict:
+async def get_sdtm_dataset_specialization_domain_list(headers_ = None) -> dict:
     """
     Get SDTM Dataset Specialization Domain List from CDISC Library
 
@@ -216,15 +399,15 @@ def get_sdtm_dataset_specialization_domain_list(headers_ = None) -> dict:
     """
     url = "https://api.library.cdisc.org/api/cosmos/v2/mdr/specializations/sdtm/domains"
     if headers_ is None:
-        response = api(url)
+        response = await aapi(url)
     else:
-        response = api(url, headers_ = headers)
+        response = await aapi(url, headers_ = headers)
 
     return response.json()
 
 
 @mcp.tool()
-def get_sdtm_dataset_specialization_for_package(package: str, datasetspecialization: str, headers_ = None) -> dict:
+async def get_sdtm_dataset_specialization_for_package(package: str, datasetspecialization: str, headers_ = None) -> dict:
     """
     Get SDTM Dataset Specialization for a specific package and dataset specialization
 
@@ -237,15 +420,15 @@ def get_sdtm_dataset_specialization_for_package(package: str, datasetspecializat
     """
     url = f"https://api.library.cdisc.org/api/cosmos/v2/mdr/specializations/sdtm/packages/{package}/datasetspecializations/{datasetspecialization}"
     if headers_ is None:
-        response = api(url)
+        response = await aapi(url)
     else:
-        response = api(url, headers_ = headers)
+        response = await aapi(url, headers_ = headers)
 
     return response.json()
 
 
 @mcp.tool()
-def get_sdtm_dataset_specialization_package_list(headers_ = None) -> dict:
+async def get_sdtm_dataset_specialization_package_list(headers_ = None) -> dict:
     """
     Get SDTM Dataset Specialization Package List from CDISC Library
 
@@ -254,15 +437,15 @@ def get_sdtm_dataset_specialization_package_list(headers_ = None) -> dict:
     """
     url="https://api.library.cdisc.org/api/cosmos/v2/mdr/specializations/sdtm/packages"
     if headers_ is None:
-        response = api(url)
+        response = await aapi(url)
     else:
-        response = api(url, headers_ = headers)
+        response = await aapi(url, headers_ = headers)
 
     return response.json()
 
 
 @mcp.tool(name="get_sdtm_dataset_specialization_list_for_package")
-def get_sdtm_dataset_specialization_list_for_package(package: str, headers_ = None) -> dict:
+async def get_sdtm_dataset_specialization_list_for_package(package: str, headers_ = None) -> dict:
     """
     Get SDTM Dataset Specializations List for a specific Package
 
@@ -274,20 +457,28 @@ def get_sdtm_dataset_specialization_list_for_package(package: str, headers_ = No
     """
     url = f"https://api.library.cdisc.org/api/cosmos/v2/mdr/specializations/sdtm/packages/{package}/datasetspecializations"
     if headers_ is None:
-        response = api(url)
+        response = await aapi(url)
     else:
-        response = api(url, headers_=headers_)
+        response = await aapi(url, headers_=headers_)
 
     return response.json()
 
 
 # MCP for Controlled Terminology Codelists
+ct_store = CTStore(
+    aapi_json,
+    max_packages=DEFAULT_MAX_PACKAGES,
+    full_package_after=DEFAULT_FULL_PACKAGE_AFTER,
+    headers=headers
+)
+ct_versions = CTVersionRegistry(aapi_json, ttl=LATEST_TTL, headers=headers)
+
 VALID_STANDARDS = [
     "SDTM", "ADAM", "CDASH", "DEFINE-XML", "SEND",
     "DDF", "GLOSSARY", "MRCT", "PROTOCOL", "QRS", "QS-FT", "TMF"
 ]
 
-def get_latest_ct_version(standard: str, headers_ = None, return_all: bool = False):
+async def get_latest_ct_version(standard: str, headers_ = None, return_all: bool = False):
     """
     Fetch the latest Controlled Terminology version for a given standard
 
@@ -305,44 +496,22 @@ def get_latest_ct_version(standard: str, headers_ = None, return_all: bool = Fal
     if standard_upper not in VALID_STANDARDS:
         raise ValueError(f"Invalid standard '{standard}'. Supported values are: {', '.join(VALID_STANDARDS)}")
 
-    url = "https://api.library.cdisc.org/api/mdr/ct/packages"
-    response = api(url, headers_=headers_)
-    data = response.json()
-
-    versions = []
-    if "_links" in data and "packages" in data["_links"]:
-        standard_pattern = f"{standard.lower()}ct-"
-        for package in data["_links"]["packages"]:
-            href = package.get("href", "")
-
-            if standard_pattern in href:
-                parts = href.split(standard_pattern)
-                if len(parts) == 2:
-                    version_date = parts[1].strip()
-                    if len(version_date) == 10 and version_date.count("-") == 2:
-                        try:
-                            year, month, day = version_date.split("-")
-                            if len(year) == 4 and len(month) == 2 and len(day) == 2:
-                                versions.append(version_date)
-                        except (ValueError, AttributeError):
-                            continue
+    versions = await ct_versions.versions(standard_upper, headers_=headers_)
 
     if not versions:
-        available_packages = [pkg.get("href", "") for pkg in data.get("_links", {}).get("packages", [])[:5]]
         raise Exception(
             f"No versions found for standard '{standard}'. "
             f"Expected href format: '/mdr/ct/packages/{standard.lower()}ct-YYYY-MM-DD'. "
-            f"Sample available packages: {', '.join(available_packages)}"
+            f"Sample available packages: {', '.join(ct_versions.sample_hrefs(headers_=headers_))}"
         )
 
-    versions.sort(reverse=True)
     if return_all:
-        return versions[0], versions
+        return versions[0], list(versions)
     return versions[0]
 
 
 @mcp.tool(name="get_ct_latest_version")
-def get_ct_latest_version_tool(standard: str = "SDTM", headers_ = None) -> dict:
+async def get_ct_latest_version_tool(standard: str = "SDTM", headers_ = None) -> dict:
     """
     Get the latest Controlled Terminology version for a CDISC standard
 
@@ -357,7 +526,7 @@ def get_ct_latest_version_tool(standard: str = "SDTM", headers_ = None) -> dict:
         Dictionary with standard, latest version, display version, and all available versions
     """
     try:
-        latest_version, all_versions = get_latest_ct_version(standard, headers_=headers_, return_all=True)
+        latest_version, all_versions = await get_latest_ct_version(standard, headers_=headers_, return_all=True)
         return {
             "standard": standard.upper(),
             "latest_version": latest_version,
@@ -372,8 +541,74 @@ def get_ct_latest_version_tool(standard: str = "SDTM", headers_ = None) -> dict:
         }
 
 
+def format_codelist(codelist, standard: str, version: str) -> dict:
+    """
+    Format a CT codelist as returned by the codelist tools
+
+    Args:
+        codelist: CTCodelist from the CT package store
+        standard: The CDISC standard in upper case
+        version: CT version in YYYY-MM-DD format
+    """
+    extensible_yn = "Yes" if codelist.extensible else "No"
+
+    terms = []
+    for term in codelist.terms:
+        terms.append({
+            "term": term.submission_value,
+            "term_code": term.code,
+            "decoded_value": term.preferred_term
+        })
+
+    return {
+        "codelist_info": {
+            "id": codelist.submission_value,
+            "codelist_code": codelist.code,
+            "name": codelist.name,
+            "extensible": extensible_yn,
+            "standard": standard,
+            "version": version
+        },
+        "terms": terms,
+        "term_count": len(terms)
+    }
+
+
+def codelist_suggestions(ct_package, codelist_value: str, codelist_type: str = "ID", fetched: list = ()) -> dict:
+    """
+    Suggest codelists for a codelist value missing from a CT package
+
+    Without the package in memory, only the codelists fetched from it one by
+    one (see CTStore.fetched) are suggested, and a note says so.
+
+    Returns:
+        Dictionary with the closest codelists ("did_you_mean") and the terms
+        with the closest submission values, or for codes with the same NCI code
+        ("similar_terms"), e.g. when a term was asked for as a codelist
+    """
+    if ct_package is None:
+        by_code = codelist_type.upper() == "CODELISTCODE"
+        names = [codelist.code if by_code else codelist.submission_value for codelist in fetched]
+        return {
+            "did_you_mean": TrigramIndex(names).similar(codelist_value),
+            "suggestions_note": f"The CT package is not loaded; only the {len(names)} codelists "
+                                "fetched from it so far were compared"
+        }
+    suggestions = {"did_you_mean": ct_package.similar(codelist_value, codelist_type)}
+    if codelist_type.upper() == "ID":
+        terms = ct_package.similar_terms(codelist_value)
+    else:
+        # A term code asked for as a codelist code
+        terms = ct_package.find_term(codelist_value)
+    suggestions["similar_terms"] = [
+        {"term": term.submission_value, "term_code": term.code, "codelist": codelist.submission_value}
+        for codelist, term in terms
+    ]
+    return suggestions
+
+
 @mcp.tool(name="get_cdisc_codelist")
-def get_cdisc_codelist(
+async def get_cdisc_codelist(
     codelist_value: str,
     codelist_type: str = "ID",
     standard: str = "SDTM",
@@ -418,79 +653,158 @@ def get_cdisc_codelist(
             }
 
         if not version:
-            version = get_latest_ct_version(standard, headers_=headers_)
+            version = await get_latest_ct_version(standard, headers_=headers_)
 
-        api_standard = f"{standard.lower()}ct"
-        url = f"https://api.library.cdisc.org/api/mdr/ct/packages/{api_standard}-{version}"
+        target_codelist = await ct_store.codelist(
+            standard, version, codelist_value, codelist_type, headers_=headers_
+        )
 
-        response = api(url, headers_=headers_)
-        ct_data = response.json()
+        if not target_codelist:
+            ct_package = ct_store.loaded(standard, version, headers_=headers_)
+            if ct_package is not None and not ct_package.codelists:
+                return {
+                    "error": "No codelists found in the CT package",
+                    "standard": standard_upper,
+                    "version": version
+                }
 
-        if "codelists" not in ct_data:
             return {
-                "error": "No codelists found in the CT package",
+                "warning": f"The provided Codelist Value '{codelist_value}' does not exist in the {standard_upper} Controlled Terminology version {version}",
                 "standard": standard_upper,
-                "version": version
+                "version": version,
+                "codelist_type": codelist_type,
+                "message": "Please check if your value is correct or if it exists in the specified standard",
+                **codelist_suggestions(
+                    ct_package, codelist_value, codelist_type, fetched=ct_store.fetched(standard, version, headers_=headers_)
+                )
             }
 
-        target_codelist = None
+        return format_codelist(target_codelist, standard_upper, version)
+
+    except Exception as e:
+        return {
+            "error": str(e),
+            "codelist_value": codelist_value,
+            "standard": standard,
+            "version": version if version else "auto-detect"
+        }
 
-        for codelist in ct_data["codelists"]:
-            if codelist_type.upper() == "ID":
-                if codelist.get("submissionValue", "").upper() == codelist_value.upper():
-                    target_codelist = codelist
-                    break
-            elif codelist_type.upper() == "CODELISTCODE":
-                if codelist.get("conceptId", "").upper() == codelist_value.upper():
-                    target_codelist = codelist
-                    break
 
-        if not target_codelist:
+@mcp.tool(name="get_cdisc_codelists")
+async def get_cdisc_codelists(
+    codelist_values: list[str],
+    codelist_type: str = "ID",
+    standard: str = "SDTM",
+    version: Optional[str | dict[str, str]] = None,
+    headers_ = None
+) -> dict:
+    """
+    Retrieve many CDISC Controlled Terminology codelists in one call
+
+    The latest CT version is resolved once per standard and each CT package is
+    downloaded at most once, however many codelists are requested from it.
+
+    Args:
+        codelist_values: Codelist names or codes (e.g., ["AGEU", "SEX", "RACE"]).
+                         Prefix a value with its standard to mix standards
+                         (e.g., ["AGEU", "ADAM:DTYPE"]).
+        codelist_type: Match by 'ID' or 'CodelistCode'. Default is 'ID'.
+        standard: CDISC standard of values without prefix. Default is 'SDTM'.
+        version: CT version per standard, as a dictionary (e.g., {"SDTM": "2024-09-27",
+                 "ADAM": "2024-09-27"}) or as comma-separated "STANDARD:YYYY-MM-DD"
+                 values. A version without standard applies to the standard argument.
+                 Standards without a version use their latest CT package.
+
+    Usage:
+        get_cdisc_codelists(["AGEU", "SEX", "RACE", "ETHNIC", "NY"])
+        get_cdisc_codelists(["AGEU", "ADAM:DTYPE", "ADAM:PARAMCD"])
+        get_cdisc_codelists(["AGEU", "ADAM:DTYPE"], version={"SDTM": "2024-09-27"})
+        get_cdisc_codelists(["AGEU", "ADAM:DTYPE"], version="SDTM:2024-09-27,ADAM:2024-03-29")
+        get_cdisc_codelists(["C66781", "C66731"], codelist_type="CodelistCode")
+
+    Returns:
+        Dictionary with the codelists found (same structure as get_cdisc_codelist),
+        the values not found, and the CT version used per standard
+    """
+    try:
+        if codelist_type.upper() not in ["ID", "CODELISTCODE"]:
             return {
-                "warning": f"The provided Codelist Value '{codelist_value}' does not exist in the {standard_upper} Controlled Terminology version {version}",
-                "standard": standard_upper,
-                "version": version,
-                "codelist_type": codelist_type,
-                "message": "Please check if your value is correct or if it exists in the specified standard"
+                "error": "codelist_type must be either 'ID' or 'CodelistCode'"
             }
 
-        extensible_yn = "Yes" if target_codelist.get("extensible") == "Yes" else "No"
+        if isinstance(version, dict):
+            ct_versions_requested = {key.upper(): value for key, value in version.items()}
+        else:
+            ct_versions_requested = {}
+            for part in (version or "").split(","):
+                version_standard, _, ct_version = part.strip().rpartition(":")
+                if ct_version:
+                    ct_versions_requested[(version_standard or standard).upper()] = ct_version
+        for version_standard in ct_versions_requested:
+            if version_standard not in VALID_STANDARDS:
+                return {
+                    "error": f"Invalid standard '{version_standard}' in version. Supported values are: {', '.join(VALID_STANDARDS)}"
+                }
 
-        terms = []
-        if "terms" in target_codelist:
-            for term in target_codelist["terms"]:
-                terms.append({
-                    "term": term.get("submissionValue", ""),
-                    "term_code": term.get("conceptId", ""),
-                    "decoded_value": term.get("preferredTerm", "")
-                })
+        requested = {}
+        for value in codelist_values:
+            value_standard, _, name = value.rpartition(":")
+            value_standard = (value_standard or standard).upper()
+            if value_standard not in VALID_STANDARDS:
+                return {
+                    "error": f"Invalid standard '{value_standard}' in '{value}'. Supported values are: {', '.join(VALID_STANDARDS)}"
+                }
+            requested.setdefault(value_standard, []).append((value, name.strip()))
+
+        async def resolve(value_standard, values):
+            ct_version = (
+                ct_versions_requested.get(value_standard)
+                or await get_latest_ct_version(value_standard, headers_=headers_)
+            )
+            ct_package = await ct_store.package(value_standard, ct_version, headers_=headers_)
+            found = []
+            not_found = {}
+            for value, name in values:
+                target_codelist = ct_package.find(name, codelist_type)
+                if target_codelist:
+                    found.append(format_codelist(target_codelist, value_standard, ct_version))
+                else:
+                    not_found[value] = codelist_suggestions(ct_package, name, codelist_type)
+            return ct_version, found, not_found
 
-        result = {
-            "codelist_info": {
-                "id": target_codelist.get("submissionValue", ""),
-                "codelist_code": target_codelist.get("conceptId", ""),
-                "name": target_codelist.get("name", ""),
-                "extensible": extensible_yn,
-                "standard": standard_upper,
-                "version": version
-            },
-            "terms": terms,
-            "term_count": len(terms)
-        }
+        resolved = await asyncio.gather(*(
+            resolve(value_standard, values) for value_standard, values in requested.items()
+        ))
+
+        codelists = []
+        not_found = []
+        suggestions = {}
+        versions = {}
+        for value_standard, (ct_version, found, missing) in zip(requested, resolved):
+            versions[value_standard] = ct_version
+            codelists.extend(found)
+            not_found.extend(missing)
+            suggestions.update(missing)
 
-        return result
+        return {
+            "versions": versions,
+            "codelist_count": len(codelists),
+            "codelists": codelists,
+            "not_found": not_found,
+            "suggestions": suggestions
+        }
 
     except Exception as e:
         return {
             "error": str(e),
-            "codelist_value": codelist_value,
+            "codelist_values": codelist_values,
             "standard": standard,
             "version": version if version else "auto-detect"
         }
 
 
 @mcp.tool(name="get_ct_package_codelists")
-def get_ct_package_codelists(
+async def get_ct_package_codelists(
     standard: str = "SDTM",
     version: Optional[str] = None,
     headers_ = None
@@ -518,23 +832,18 @@ def get_ct_package_codelists(
             }
 
         if not version:
-            version = get_latest_ct_version(standard, headers_=headers_)
-
-        api_standard = f"{standard.lower()}ct"
-        url = f"https://api.library.cdisc.org/api/mdr/ct/packages/{api_standard}-{version}"
+            version = await get_latest_ct_version(standard, headers_=headers_)
 
-        response = api(url, headers_=headers_)
-        ct_data = response.json()
+        ct_package = await ct_store.package(standard, version, headers_=headers_)
 
         codelists = []
-        if "codelists" in ct_data:
-            for codelist in ct_data["codelists"]:
-                codelists.append({
-                    "id": codelist.get("submissionValue", ""),
-                    "codelist_code": codelist.get("conceptId", ""),
-                    "name": codelist.get("name", ""),
-                    "extensible": "Yes" if codelist.get("extensible") == "Yes" else "No"
-                })
+        for codelist in ct_package.codelists:
+            codelists.append({
+                "id": codelist.submission_value,
+                "codelist_code": codelist.code,
+                "name": codelist.name,
+                "extensible": "Yes" if codelist.extensible else "No"
+            })
 
         return {
             "standard": standard_upper,
@@ -551,70 +860,163 @@ def get_ct_package_codelists(
         }
 
 
+async def resolve_codelists(hrefs: list, headers_ = None) -> dict:
+    """
+    Resolve codelist links of IG metadata to codelists of the latest CT
+
+    The latest CT version is resolved once per standard and the codelists of
+    each CT package are loaded in one batch, whatever number of links share it.
+
+    Args:
+        hrefs: Codelist hrefs (e.g., "/mdr/ct/packages/sdtmct-2024-09-27/codelists/C66731")
+        headers_: Optional custom headers
+
+    Returns:
+        Dictionary of href to codelist (same structure as get_cdisc_codelist),
+        without the hrefs that could not be resolved
+    """
+    links = {}
+    for href in hrefs:
+        link = parse_codelist_href(href)
+        if link and link[0] in VALID_STANDARDS:
+            links[href] = link
+
+    codes_by_standard = {}
+    for standard, code in links.values():
+        codes_by_standard.setdefault(standard, []).append(code)
+
+    async def load(standard, codes):
+        ct_version = await get_latest_ct_version(standard, headers_=headers_)
+        return ct_version, await ct_store.codelists(standard, ct_version, codes, headers_=headers_)
+
+    loaded = await asyncio.gather(
+        *(load(standard, codes) for standard, codes in codes_by_standard.items()),
+        return_exceptions=True
+    )
+
+    resolved = {}
+    for standard, result in zip(codes_by_standard, loaded):
+        if isinstance(result, Exception):
+            continue
+        ct_version, codelists = result
+        for href, (link_standard, code) in links.items():
+            if link_standard == standard and code in codelists:
+                resolved[href] = format_codelist(codelists[code], standard, ct_version)
+    return resolved
+
+
+async def resolve_codelist(links: dict, headers_ = None) -> dict:
+    """
+    Resolve the first codelist of a metadata item's _links
+
+    Returns:
+        The codelist (same structure as get_cdisc_codelist), or None
+    """
+    hrefs = codelist_hrefs(links)
+    resolved = await resolve_codelists(hrefs, headers_=headers_)
+    for href in hrefs:
+        if href in resolved:
+            return resolved[href]
+    return None
+
+
 # MCP for ADaM Variable Metadata
-def find_adam_variable_dataset(adam_variable: str, adamig_version: str, headers_ = None):
+def adam_structure_variables(ds_data: dict) -> list:
+    """Upper case names of the variables of an ADaM data structure."""
+    names = [var.get("name", "").upper() for var in ds_data.get("analysisVariables", [])]
+    for var_set in ds_data.get("analysisVariableSets", []):
+        names.extend(var.get("name", "").upper() for var in var_set.get("analysisVariables", []))
+    return names
+
+
+def adam_structure_names(data: dict) -> list:
+    """Data structure names of an ADaMIG datastructures listing."""
+    # e.g. "/mdr/adam/adamig-1-3/datastructures/ADSL" -> "ADSL"
+    return [
+        ds_link["href"].split("/")[-1]
+        for ds_link in data.get("_links", {}).get("dataStructures", [])
+        if ds_link.get("href") and ds_link["href"].split("/")[-1]
+    ]
+
+
+async def build_adamig_variable_index(adamig_version: str, headers_ = None) -> dict:
+    """
+    Build the variable to data structure index of an ADaMIG version from all its data structures
+    """
+    url = f"https://api.library.cdisc.org/api/mdr/adam/adamig-{adamig_version}/datastructures"
+    ds_names = adam_structure_names(await aapi_json(url, headers_=headers_))
+
+    structures = await gather_limited(async_http_pool.pool_size, [
+        aapi_json(f"{url}/{ds_name}", headers_=headers_) for ds_name in ds_names
+    ], return_exceptions=True)
+
+    # Data structures that failed to download are left out of a partial index
+    downloaded = succeeded(ds_names, structures)
+    index = {}
+    for ds_name, ds_data in downloaded:
+        for name in adam_structure_variables(ds_data):
+            structures_of_variable = index.setdefault(name, [])
+            if ds_name not in structures_of_variable:
+                structures_of_variable.append(ds_name)
+    return index if len(downloaded) == len(ds_names) else PartialIndex(index)
+
+
+adamig_variable_index = VariableIndex("adamig", build_adamig_variable_index, response_cache)
+
+
+async def find_adam_variable_dataset(adam_variable: str, adamig_version: str, headers_ = None,
+                                     variables: set = None):
     """
     Find which dataset structure contains a given ADaM variable
 
+    Answered from the variable index of the ADaMIG version once it was built.
+    Until then the data structures are fetched concurrently and the search
+    stops at the first one containing the variable, while the index is built
+    in the background.
+
     Args:
         adam_variable: The ADaM variable name (e.g., TRT01P, PARAMCD)
         adamig_version: ADaMIG version in hyphen format (e.g., "1-3")
         headers_: Optional custom headers
+        variables: Optional set receiving the names of the variables of the
+                   data structures read, to suggest names when none matches
 
     Returns:
         Dataset name (e.g., ADSL, OCCDS) or None if not found
     """
     adamig_version_hyphen = adamig_version.replace(".", "-")
+    adam_variable_upper = adam_variable.upper()
 
-    # First, get the list of datastructures
-    url = f"https://api.library.cdisc.org/api/mdr/adam/adamig-{adamig_version_hyphen}/datastructures"
-    response = api(url, headers_=headers_)
-    data = response.json()
-
-    if not data or "_links" not in data or "dataStructures" not in data["_links"]:
-        return None
+    index = await adamig_variable_index.peek(adamig_version_hyphen)
+    if index is not None:
+        datasets = index.get(adam_variable_upper, [])
+        return datasets[0] if datasets else None
 
-    # Iterate through each datastructure and query its variables
-    for ds_link in data["_links"]["dataStructures"]:
-        href = ds_link.get("href", "")
-        if not href:
-            continue
-
-        # Extract dataset name from href (e.g., "/mdr/adam/adamig-1-3/datastructures/ADSL" -> "ADSL")
-        ds_name = href.split("/")[-1]
-        if not ds_name:
-            continue
+    url = f"https://api.library.cdisc.org/api/mdr/adam/adamig-{adamig_version_hyphen}/datastructures"
+    ds_names = adam_structure_names(await aapi_json(url, headers_=headers_))
 
-        # Query individual dataset to get its variables
-        ds_url = f"https://api.library.cdisc.org/api/mdr/adam/adamig-{adamig_version_hyphen}/datastructures/{ds_name}"
-        try:
-            ds_response = api(ds_url, headers_=headers_)
-            ds_data = ds_response.json()
-
-            # Check analysisVariables
-            if "analysisVariables" in ds_data:
-                for var in ds_data["analysisVariables"]:
-                    if var.get("name", "").upper() == adam_variable.upper():
-                        return ds_name
-
-            # Check analysisVariableSets
-            if "analysisVariableSets" in ds_data:
-                for var_set in ds_data["analysisVariableSets"]:
-                    if "analysisVariables" in var_set:
-                        for var in var_set["analysisVariables"]:
-                            if var.get("name", "").upper() == adam_variable.upper():
-                                return ds_name
-        except Exception:
-            # If a specific dataset query fails, continue to next one
-            continue
+    def probe(ds_name):
+        async def contains_variable():
+            try:
+                ds_data = await aapi_json(f"{url}/{ds_name}", headers_=headers_)
+            except Exception:
+                # If a specific dataset query fails, continue with the others
+                return None
+            ds_variables = adam_structure_variables(ds_data)
+            if variables is not None:
+                variables.update(ds_variables)
+            return ds_name if adam_variable_upper in ds_variables else None
+        return contains_variable
 
-    return None
+    dataset = await first_result(async_http_pool.pool_size, [probe(ds_name) for ds_name in ds_names])
+    adamig_variable_index.warm(adamig_version_hyphen, headers_=headers_)
+    return dataset
 
 
 @mcp.tool(name="get_adam_variable_details")
-def get_adam_variable_details(
+async def get_adam_variable_details(
     adam_variable: str,
-    adamig_version: str = "1-3",
+    adamig_version: Optional[str] = None,
     headers_ = None
 ) -> dict:
     """
@@ -622,7 +1024,7 @@ def get_adam_variable_details(
 
     Args:
         adam_variable: The ADaM variable name (e.g., TRT01P, PARAMCD, AVAL)
-        adamig_version: ADaMIG version (e.g., "1-3" or "1.3"). Default is "1-3".
+        adamig_version: ADaMIG version (e.g., "1-3" or "1.3"). If not provided, uses latest version.
 
     Usage:
         get_adam_variable_details("TRT01P")
@@ -633,18 +1035,34 @@ def get_adam_variable_details(
         Dictionary with variable details, label, datatype, core status, and associated codelists
     """
     try:
+        if adamig_version is None:
+            adamig_version = await products.latest("ADAMIG", headers_=headers_)
         adamig_version_hyphen = adamig_version.replace(".", "-")
 
-        dataset = find_adam_variable_dataset(adam_variable, adamig_version_hyphen, headers_)
+        # The CT package listing holds the versions of every standard, so it is
+        # fetched while the data structure is looked up instead of afterwards
+        variables = set()
+        dataset, _ = await asyncio.gather(
+            find_adam_variable_dataset(adam_variable, adamig_version_hyphen, headers_, variables),
+            ct_versions.versions("ADAM", headers_=headers_),
+            return_exceptions=True
+        )
+        if isinstance(dataset, Exception):
+            raise dataset
         if not dataset:
+            # Before the index is built, the data structures the lookup just read suggest the names
             return {
                 "error": f"Variable '{adam_variable}' not found in any dataset structure for ADaMIG {adamig_version_hyphen}",
                 "variable": adam_variable,
-                "adamig_version": adamig_version_hyphen
+                "adamig_version": adamig_version_hyphen,
+                "did_you_mean": (
+                    await adamig_variable_index.similar(adamig_version_hyphen, adam_variable)
+                    or TrigramIndex(sorted(variables)).similar(adam_variable)
+                )
             }
 
         url = f"https://api.library.cdisc.org/api/mdr/adam/adamig-{adamig_version_hyphen}/datastructures/{dataset}/variables/{adam_variable}"
-        response = api(url, headers_=headers_)
+        response = await aapi(url, headers_=headers_)
         data = response.json()
 
         if not data:
@@ -662,52 +1080,15 @@ def get_adam_variable_details(
             "description": data.get("description"),
             "dataset": dataset,
             "adamig_version": adamig_version_hyphen,
-            "codelist_links": [],
+            "codelist_links": codelist_hrefs(data.get("_links")),
             "codelists": []
         }
 
-        codelist_info_list = []
-        if "_links" in data and "codelist" in data["_links"]:
-            for link in data["_links"]["codelist"]:
-                href = link.get("href")
-                if href:
-                    details["codelist_links"].append(href)
-                    try:
-                        parts = href.split("/")
-                        codelist_id = parts[-1]
-
-                        if "/packages/" in href:
-                            package_part = href.split("/packages/")[1].split("/")[0]
-                            if "-" in package_part:
-                                standard_with_ct = package_part.split("-")[0]
-                                if standard_with_ct in ["sdtmct", "adamct"]:
-                                    codelist_info_list.append((codelist_id, standard_with_ct, href))
-                    except (IndexError, ValueError):
-                        continue
-
-        if codelist_info_list:
-            unique_codelists = {info[0]: info for info in codelist_info_list}.values()
-            fetched_versions = {}
-
-            for cl_id, standard, href in unique_codelists:
-                if standard not in fetched_versions:
-                    ct_version = get_latest_ct_version(standard.replace("ct", "").upper(), headers_=headers_)
-                    if not ct_version:
-                        fetched_versions[standard] = None
-                        continue
-                    fetched_versions[standard] = ct_version
-
-                ct_version = fetched_versions[standard]
-                if ct_version:
-                    codelist_result = get_cdisc_codelist(
-                        codelist_value=cl_id,
-                        codelist_type="CodelistCode",
-                        standard=standard.replace("ct", "").upper(),
-                        version=ct_version,
-                        headers_=headers_
-                    )
-                    if codelist_result and "codelist_info" in codelist_result:
-                        details["codelists"].append(codelist_result)
+        resolved = await resolve_codelists(details["codelist_links"], headers_=headers_)
+        for href in details["codelist_links"]:
+            # Links to the same codelist in different packages resolve to one codelist
+            if href in resolved and resolved[href] not in details["codelists"]:
+                details["codelists"].append(resolved[href])
 
         return details
 
@@ -720,9 +1101,9 @@ def get_adam_variable_details(
 
 
 @mcp.tool(name="get_adam_dataset_structure")
-def get_adam_dataset_structure(
+async def get_adam_dataset_structure(
     dataset: str,
-    adamig_version: str = "1-3",
+    adamig_version: Optional[str] = None,
     headers_ = None
 ) -> dict:
     """
@@ -730,7 +1111,7 @@ def get_adam_dataset_structure(
 
     Args:
         dataset: The ADaM dataset name (e.g., ADSL, ADAE, OCCDS)
-        adamig_version: ADaMIG version (e.g., "1-3" or "1.3"). Default is "1-3".
+        adamig_version: ADaMIG version (e.g., "1-3" or "1.3"). If not provided, uses latest version.
 
     Usage:
         get_adam_dataset_structure("ADSL")
@@ -740,10 +1121,12 @@ def get_adam_dataset_structure(
         Dictionary with dataset structure and list of variables
     """
     try:
+        if adamig_version is None:
+            adamig_version = await products.latest("ADAMIG", headers_=headers_)
         adamig_version_hyphen = adamig_version.replace(".", "-")
 
         url = f"https://api.library.cdisc.org/api/mdr/adam/adamig-{adamig_version_hyphen}/datastructures/{dataset}"
-        response = api(url, headers_=headers_)
+        response = await aapi(url, headers_=headers_)
         data = response.json()
 
         if not data:
@@ -792,7 +1175,7 @@ def get_adam_dataset_structure(
 
 
 @mcp.tool(name="get_sdtm_latest_version")
-def get_sdtm_latest_version(headers_ = None) -> dict:
+async def get_sdtm_latest_version(headers_ = None) -> dict:
     """
     Get the latest SDTM-IG version from CDISC Library.
 
@@ -803,54 +1186,23 @@ def get_sdtm_latest_version(headers_ = None) -> dict:
         get_sdtm_latest_version()
         Returns: {"latest_version": "3-4", "display_version": "3.4"}
     """
-    try:
-        url = "https://library.cdisc.org/api/mdr/sdtmig"
-
-        if headers_ is None:
-            response = api(url)
-        else:
-            response = api(url, headers_=headers_)
-
-        data = response.json()
-
-        if "_links" in data and "sdtmigVersions" in data["_links"]:
-            versions = [link["href"].split("/")[-1] for link in data["_links"]["sdtmigVersions"]]
-        else:
-            versions = ["3-4", "3-3", "3-2"]
-
-        if not versions:
-            return {"error": "No SDTM-IG versions found"}
+    versions = await products.versions("SDTMIG", headers_=headers_)
+    sorted_versions = sorted(versions, key=version_key)
+    latest_version_hyphen = sorted_versions[-1]
+    latest_version_dot = latest_version_hyphen.replace("-", ".")
 
-        def version_key(version_str):
-            """Convert version string to tuple for proper sorting"""
-            try:
-                parts = version_str.split("-")
-                return tuple(int(p) for p in parts)
-            except:
-                return (0, 0)
-
-        sorted_versions = sorted(versions, key=version_key)
-        latest_version_hyphen = sorted_versions[-1]
-        latest_version_dot = latest_version_hyphen.replace("-", ".")
-
-        return {
-            "latest_version": latest_version_hyphen,
-            "display_version": latest_version_dot,
-            "all_versions": sorted_versions
-        }
-
-    except Exception as e:
-        latest_default = "3-4"
-        return {
-            "latest_version": latest_default,
-            "display_version": latest_default.replace("-", "."),
-            "all_versions": [latest_default],
-            "note": "Using default version due to API error"
-        }
+    result = {
+        "latest_version": latest_version_hyphen,
+        "display_version": latest_version_dot,
+        "all_versions": sorted_versions
+    }
+    if products.source(headers_=headers_) == "fallback":
+        result["note"] = "Using default versions due to API error"
+    return result
 
 
 @mcp.tool(name="get_sdtm_classes")
-def get_sdtm_classes(sdtmig_version: Optional[str] = None, headers_ = None) -> dict:
+async def get_sdtm_classes(sdtmig_version: Optional[str] = None, headers_ = None) -> dict:
     """
     Get SDTM domain classes (Findings, Events, Interventions, etc.) from CDISC Library.
 
@@ -868,7 +1220,7 @@ def get_sdtm_classes(sdtmig_version: Optional[str] = None, headers_ = None) -> d
     """
     try:
         if sdtmig_version is None:
-            version_info = get_sdtm_latest_version(headers_=headers_)
+            version_info = await get_sdtm_latest_version(headers_=headers_)
             if "error" in version_info:
                 return version_info
             sdtmig_version = version_info["latest_version"]
@@ -878,9 +1230,9 @@ def get_sdtm_classes(sdtmig_version: Optional[str] = None, headers_ = None) -> d
         url = f"https://library.cdisc.org/api/mdr/sdtmig/{sdtmig_version}/classes"
 
         if headers_ is None:
-            response = api(url)
+            response = await aapi(url)
         else:
-            response = api(url, headers_=headers_)
+            response = await aapi(url, headers_=headers_)
 
         data = response.json()
 
@@ -907,7 +1259,7 @@ def get_sdtm_classes(sdtmig_version: Optional[str] = None, headers_ = None) -> d
 
 
 @mcp.tool(name="get_sdtm_domain_structure")
-def get_sdtm_domain_structure(domain: str, sdtmig_version: Optional[str] = None, include_codelists: bool = False, headers_ = None) -> dict:
+async def get_sdtm_domain_structure(domain: str, sdtmig_version: Optional[str] = None, include_codelists: bool = False, headers_ = None) -> dict:
     """
     Get complete domain structure with all variables for an SDTM domain.
 
@@ -916,7 +1268,8 @@ def get_sdtm_domain_structure(domain: str, sdtmig_version: Optional[str] = None,
         sdtmig_version (str, optional): SDTM-IG version (e.g., "3-4" or "3.4").
                                         If not provided, uses latest version.
         include_codelists (bool, optional): If True, retrieves full codelist terms for variables.
-                                           Default False for faster response.
+                                           All codelists of the domain are fetched together in one pass.
+                                           Default False.
         headers_ (dict, optional): Custom headers for API request.
 
     Returns:
@@ -930,7 +1283,7 @@ def get_sdtm_domain_structure(domain: str, sdtmig_version: Optional[str] = None,
         domain = domain.upper()
 
         if sdtmig_version is None:
-            version_info = get_sdtm_latest_version(headers_=headers_)
+            version_info = await get_sdtm_latest_version(headers_=headers_)
             if "error" in version_info:
                 return version_info
             sdtmig_version = version_info["latest_version"]
@@ -940,13 +1293,14 @@ def get_sdtm_domain_structure(domain: str, sdtmig_version: Optional[str] = None,
         url = f"https://library.cdisc.org/api/mdr/sdtmig/{sdtmig_version}/datasets/{domain}"
 
         if headers_ is None:
-            response = api(url)
+            response = await aapi(url)
         else:
-            response = api(url, headers_=headers_)
+            response = await aapi(url, headers_=headers_)
 
         data = response.json()
 
         variables = []
+        codelist_links = []
 
         for var_link in data.get("datasetVariables", []):
             var_data = {
@@ -959,35 +1313,24 @@ def get_sdtm_domain_structure(domain: str, sdtmig_version: Optional[str] = None,
                 "length": var_link.get("maxLength")
             }
 
-            if include_codelists and "_links" in var_link and "codelist" in var_link["_links"]:
-                codelist_href = var_link["_links"]["codelist"]["href"]
-                try:
-                    parts = codelist_href.split("/")
-                    codelist_id = parts[-1]
-
-                    if "/packages/" in codelist_href:
-                        package_part = codelist_href.split("/packages/")[1].split("/")[0]
-                        if "-" in package_part:
-                            standard_with_ct = package_part.split("-")[0]
-                            if standard_with_ct.endswith("ct"):
-                                standard = standard_with_ct[:-2].upper()
-
-                                ct_version_info = get_latest_ct_version(standard, headers_=headers_)
-                                if "error" not in ct_version_info:
-                                    ct_version = ct_version_info["latest_version"]
-                                    codelist_data = get_cdisc_codelist(
-                                        codelist_id,
-                                        standard=standard,
-                                        version=ct_version,
-                                        headers_=headers_
-                                    )
-                                    if "error" not in codelist_data:
-                                        var_data["codelist"] = codelist_data
-                except:
-                    pass
+            if include_codelists:
+                codelist_links.append((var_data, codelist_hrefs(var_link.get("_links"))))
 
             variables.append(var_data)
 
+        # Variables share codelists (NY, UNIT) and CT packages, so all codelists
+        # of the domain are resolved together, each once
+        if codelist_links:
+            resolved = await resolve_codelists(
+                [href for _, hrefs in codelist_links for href in hrefs],
+                headers_=headers_
+            )
+            for var_data, hrefs in codelist_links:
+                for href in hrefs:
+                    if href in resolved:
+                        var_data["codelist"] = resolved[href]
+                        break
+
         variables.sort(key=lambda x: x.get("ordinal", 999))
 
         return {
@@ -1008,38 +1351,65 @@ def get_sdtm_domain_structure(domain: str, sdtmig_version: Optional[str] = None,
         }
 
 
-def find_sdtm_variable_domain(variable: str, sdtmig_version: str, headers_ = None):
+COMMON_DOMAINS = ["DM", "AE", "VS", "LB", "EX", "CM", "MH", "DS", "EG", "PE", "QS"]
+
+
+def preferred_domain(variable: str, domains: list) -> str:
     """
-    Helper function to find which SDTM domain contains a specific variable.
-    Searches common domains first for efficiency.
+    Pick the domain of a variable found in several domains: the domain named
+    by its prefix (AESTDTC -> AE), else the most common domain (STUDYID -> DM)
     """
-    common_domains = ["DM", "AE", "VS", "LB", "EX", "CM", "MH", "DS", "EG", "PE", "QS"]
+    for domain in domains:
+        if variable.startswith(domain):
+            return domain
+    for domain in COMMON_DOMAINS:
+        if domain in domains:
+            return domain
+    return domains[0] if domains else None
 
-    variable_upper = variable.upper()
 
-    for domain in common_domains:
-        try:
-            url = f"https://library.cdisc.org/api/mdr/sdtmig/{sdtmig_version}/datasets/{domain}"
+async def build_sdtmig_variable_index(sdtmig_version: str, headers_ = None) -> dict:
+    """
+    Build the variable to domain index of an SDTMIG version from its full dataset catalog
+    """
+    url = f"https://library.cdisc.org/api/mdr/sdtmig/{sdtmig_version}/datasets"
+    data = await aapi_json(url, headers_=headers_)
+    domains = [
+        link["href"].rstrip("/").split("/")[-1]
+        for link in data.get("_links", {}).get("datasets", [])
+        if link.get("href")
+    ]
 
-            if headers_ is None:
-                response = api(url)
-            else:
-                response = api(url, headers_=headers_)
+    datasets = await gather_limited(async_http_pool.pool_size, [
+        aapi_json(f"{url}/{domain}", headers_=headers_) for domain in domains
+    ], return_exceptions=True)
 
-            data = response.json()
+    # Datasets that failed to download are left out of a partial index
+    downloaded = succeeded(domains, datasets)
+    index = {}
+    for domain, dataset in downloaded:
+        for var_link in dataset.get("datasetVariables", []):
+            domains_of_variable = index.setdefault(var_link.get("name", "").upper(), [])
+            if domain not in domains_of_variable:
+                domains_of_variable.append(domain)
+    return index if len(downloaded) == len(domains) else PartialIndex(index)
 
-            for var_link in data.get("datasetVariables", []):
-                if var_link.get("name", "").upper() == variable_upper:
-                    return domain
 
-        except:
-            continue
+sdtmig_variable_index = VariableIndex("sdtmig", build_sdtmig_variable_index, response_cache)
 
-    return None
+
+async def find_sdtm_variable_domain(variable: str, sdtmig_version: str, headers_ = None):
+    """
+    Helper function to find which SDTM domain contains a specific variable.
+    Looks the variable up in the index of all domains of the SDTMIG version.
+    """
+    variable_upper = variable.upper()
+    domains = await sdtmig_variable_index.lookup(sdtmig_version, variable_upper, headers_=headers_)
+    return preferred_domain(variable_upper, domains)
 
 
 @mcp.tool(name="get_sdtm_variable_details")
-def get_sdtm_variable_details(variable: str,
+async def get_sdtm_variable_details(variable: str,
                             domain: Optional[str] = None,
                             sdtmig_version: Optional[str] = None,
                             include_codelist: bool = True,
@@ -1050,7 +1420,7 @@ def get_sdtm_variable_details(variable: str,
     Args:
         variable (str): Variable name (e.g., "USUBJID", "AESTDTC", "LBORRES").
         domain (str, optional): SDTM domain code (e.g., "DM", "AE", "VS").
-                               If not provided, will search common domains.
+                               If not provided, will search all domains.
         sdtmig_version (str, optional): SDTM-IG version (e.g., "3-4" or "3.4").
                                         If not provided, uses latest version.
         include_codelist (bool, optional): If True, retrieves full codelist terms. Default True.
@@ -1068,7 +1438,7 @@ def get_sdtm_variable_details(variable: str,
         variable = variable.upper()
 
         if sdtmig_version is None:
-            version_info = get_sdtm_latest_version(headers_=headers_)
+            version_info = await get_sdtm_latest_version(headers_=headers_)
             if "error" in version_info:
                 return version_info
             sdtmig_version = version_info["latest_version"]
@@ -1076,11 +1446,12 @@ def get_sdtm_variable_details(variable: str,
             sdtmig_version = sdtmig_version.replace(".", "-")
 
         if domain is None:
-            domain = find_sdtm_variable_domain(variable, sdtmig_version, headers_=headers_)
+            domain = await find_sdtm_variable_domain(variable, sdtmig_version, headers_=headers_)
             if domain is None:
                 return {
-                    "error": f"Variable '{variable}' not found in common SDTM domains",
-                    "variable": variable
+                    "error": f"Variable '{variable}' not found in any SDTMIG {sdtmig_version} domain",
+                    "variable": variable,
+                    "did_you_mean": await sdtmig_variable_index.similar(sdtmig_version, variable)
                 }
         else:
             domain = domain.upper()
@@ -1088,9 +1459,9 @@ def get_sdtm_variable_details(variable: str,
         url = f"https://library.cdisc.org/api/mdr/sdtmig/{sdtmig_version}/datasets/{domain}"
 
         if headers_ is None:
-            response = api(url)
+            response = await aapi(url)
         else:
-            response = api(url, headers_=headers_)
+            response = await aapi(url, headers_=headers_)
 
         data = response.json()
 
@@ -1104,7 +1475,10 @@ def get_sdtm_variable_details(variable: str,
             return {
                 "error": f"Variable '{variable}' not found in domain '{domain}'",
                 "variable": variable,
-                "domain": domain
+                "domain": domain,
+                "did_you_mean": TrigramIndex(
+                    var.get("name") for var in data.get("datasetVariables", [])
+                ).similar(variable)
             }
 
         details = {
@@ -1121,31 +1495,7 @@ def get_sdtm_variable_details(variable: str,
         }
 
         if include_codelist and "_links" in variable_data and "codelist" in variable_data["_links"]:
-            codelist_href = variable_data["_links"]["codelist"]["href"]
-            try:
-                parts = codelist_href.split("/")
-                codelist_id = parts[-1]
-
-                if "/packages/" in codelist_href:
-                    package_part = codelist_href.split("/packages/")[1].split("/")[0]
-                    if "-" in package_part:
-                        standard_with_ct = package_part.split("-")[0]
-                        if standard_with_ct.endswith("ct"):
-                            standard = standard_with_ct[:-2].upper()
-
-                            ct_version_info = get_latest_ct_version(standard, headers_=headers_)
-                            if "error" not in ct_version_info:
-                                ct_version = ct_version_info["latest_version"]
-                                codelist_data = get_cdisc_codelist(
-                                    codelist_id,
-                                    standard=standard,
-                                    version=ct_version,
-                                    headers_=headers_
-                                )
-                                if "error" not in codelist_data:
-                                    details["codelist"] = codelist_data
-            except:
-                pass
+            details["codelist"] = await resolve_codelist(variable_data["_links"], headers_=headers_)
 
         return details
 
@@ -1163,7 +1513,7 @@ def get_sdtm_variable_details(variable: str,
 # ============================================================================
 
 @mcp.tool(name="get_cdashig_latest_version")
-def get_cdashig_latest_version(headers_ = None) -> dict:
+async def get_cdashig_latest_version(headers_ = None) -> dict:
     """
     Get the latest CDASH-IG version from the CDISC Library API.
 
@@ -1177,50 +1527,24 @@ def get_cdashig_latest_version(headers_ = None) -> dict:
         get_cdash_latest_version()
         Returns: {"latest_version": "2-3", "display_version": "CDASHIG v2.3", ...}
     """
-    try:
-        url = "https://library.cdisc.org/api/mdr/products/DataCollection"
+    cdashig_versions_sorted = await products.versions("CDASHIG", headers_=headers_)
+    latest = cdashig_versions_sorted[0]
 
-        if headers_ is None:
-            response = api(url)
-        else:
-            response = api(url, headers_=headers_)
-
-        data = response.json()
+    display_version = f"CDASHIG v{latest.replace('-', '.')}"
 
-        cdashig_versions = []
-        for link in data.get("_links", {}).get("cdashig", []):
-            version = link.get("href", "").split("/")[-1]
-            if version:
-                cdashig_versions.append(version)
-
-        if not cdashig_versions:
-            return {"error": "No CDASHIG versions found in API response"}
-
-        def version_tuple(v):
-            try:
-                parts = v.split("-")
-                return tuple(int(p) for p in parts)
-            except:
-                return (0,)
-
-        cdashig_versions_sorted = sorted(cdashig_versions, key=version_tuple, reverse=True)
-        latest = cdashig_versions_sorted[0]
-
-        display_version = f"CDASHIG v{latest.replace('-', '.')}"
-
-        return {
-            "latest_version": latest,
-            "display_version": display_version,
-            "all_versions": cdashig_versions_sorted,
-            "version_count": len(cdashig_versions_sorted)
-        }
-
-    except Exception as e:
-        return {"error": str(e)}
+    result = {
+        "latest_version": latest,
+        "display_version": display_version,
+        "all_versions": cdashig_versions_sorted,
+        "version_count": len(cdashig_versions_sorted)
+    }
+    if products.source(headers_=headers_) == "fallback":
+        result["note"] = "Using default versions due to API error"
+    return result
 
 
 @mcp.tool(name="get_cdashig_domains_list")
-def get_cdashig_domains_list(cdashig_version: Optional[str] = None, headers_ = None) -> dict:
+async def get_cdashig_domains_list(cdashig_version: Optional[str] = None, headers_ = None) -> dict:
     """
     Get list of all CDASH domains for a specific CDASHIG version.
 
@@ -1238,7 +1562,7 @@ def get_cdashig_domains_list(cdashig_version: Optional[str] = None, headers_ = N
     """
     try:
         if cdashig_version is None:
-            version_info = get_cdashig_latest_version(headers_=headers_)
+            version_info = await get_cdashig_latest_version(headers_=headers_)
             if "error" in version_info:
                 return version_info
             cdashig_version = version_info["latest_version"]
@@ -1248,9 +1572,9 @@ def get_cdashig_domains_list(cdashig_version: Optional[str] = None, headers_ = N
         url = f"https://library.cdisc.org/api/mdr/cdashig/{cdashig_version}/domains"
 
         if headers_ is None:
-            response = api(url)
+            response = await aapi(url)
         else:
-            response = api(url, headers_=headers_)
+            response = await aapi(url, headers_=headers_)
 
         data = response.json()
 
@@ -1277,7 +1601,7 @@ def get_cdashig_domains_list(cdashig_version: Optional[str] = None, headers_ = N
 
 
 @mcp.tool(name="get_cdashig_domain_structure")
-def get_cdashig_domain_structure(domain: str, cdashig_version: Optional[str] = None, include_codelists: bool = False, headers_ = None) -> dict:
+async def get_cdashig_domain_structure(domain: str, cdashig_version: Optional[str] = None, include_codelists: bool = False, headers_ = None) -> dict:
     """
     Get complete domain structure with all fields for a CDASH domain.
 
@@ -1286,7 +1610,7 @@ def get_cdashig_domain_structure(domain: str, cdashig_version: Optional[str] = N
         cdashig_version (str, optional): CDASHIG version (e.g., "2-3" or "2.3").
                                          If not provided, uses latest version.
         include_codelists (bool, optional): If True, retrieves full codelist terms for fields.
-                                           Default False for faster response.
+                                           Default False.
         headers_ (dict, optional): Custom headers for API request.
 
     Returns:
@@ -1300,7 +1624,7 @@ def get_cdashig_domain_structure(domain: str, cdashig_version: Optional[str] = N
         domain = domain.upper()
 
         if cdashig_version is None:
-            version_info = get_cdashig_latest_version(headers_=headers_)
+            version_info = await get_cdashig_latest_version(headers_=headers_)
             if "error" in version_info:
                 return version_info
             cdashig_version = version_info["latest_version"]
@@ -1310,13 +1634,14 @@ def get_cdashig_domain_structure(domain: str, cdashig_version: Optional[str] = N
         url = f"https://library.cdisc.org/api/mdr/cdashig/{cdashig_version}/domains/{domain}"
 
         if headers_ is None:
-            response = api(url)
+            response = await aapi(url)
         else:
-            response = api(url, headers_=headers_)
+            response = await aapi(url, headers_=headers_)
 
         data = response.json()
 
         fields = []
+        codelist_links = []
 
         for field_raw in data.get("fields", []):
             field_data = {
@@ -1331,35 +1656,24 @@ def get_cdashig_domain_structure(domain: str, cdashig_version: Optional[str] = N
                 "implementation_notes": field_raw.get("implementationNotes")
             }
 
-            if include_codelists and "_links" in field_raw and "codelist" in field_raw["_links"]:
-                codelist_href = field_raw["_links"]["codelist"]["href"]
-                try:
-                    parts = codelist_href.split("/")
-                    codelist_id = parts[-1]
-
-                    if "/packages/" in codelist_href:
-                        package_part = codelist_href.split("/packages/")[1].split("/")[0]
-                        if "-" in package_part:
-                            standard_with_ct = package_part.split("-")[0]
-                            if standard_with_ct.endswith("ct"):
-                                standard = standard_with_ct[:-2].upper()
-
-                                ct_version_info = get_latest_ct_version(standard, headers_=headers_)
-                                if "error" not in ct_version_info:
-                                    ct_version = ct_version_info["latest_version"]
-                                    codelist_data = get_cdisc_codelist(
-                                        codelist_id,
-                                        standard=standard,
-                                        version=ct_version,
-                                        headers_=headers_
-                                    )
-                                    if "error" not in codelist_data:
-                                        field_data["codelist"] = codelist_data
-                except:
-                    pass
+            if include_codelists:
+                codelist_links.append((field_data, codelist_hrefs(field_raw.get("_links"))))
 
             fields.append(field_data)
 
+        # Fields share codelists (NY, UNIT) and CT packages, so all codelists
+        # of the domain are resolved together, each once
+        if codelist_links:
+            resolved = await resolve_codelists(
+                [href for _, hrefs in codelist_links for href in hrefs],
+                headers_=headers_
+            )
+            for field_data, hrefs in codelist_links:
+                for href in hrefs:
+                    if href in resolved:
+                        field_data["codelist"] = resolved[href]
+                        break
+
         fields.sort(key=lambda x: x.get("ordinal", 999) if isinstance(x.get("ordinal"), (int, float)) else 999)
 
         return {
@@ -1378,39 +1692,46 @@ def get_cdashig_domain_structure(domain: str, cdashig_version: Optional[str] = N
         }
 
 
-def find_cdash_field_domain(field: str, cdashig_version: str, headers_ = None):
+async def build_cdashig_field_index(cdashig_version: str, headers_ = None) -> dict:
     """
-    Helper function to find which CDASH domain contains a specific field.
-    Searches common domains first for efficiency.
+    Build the field to domain index of a CDASHIG version from all its domains
     """
-    common_domains = ["DM", "AE", "VS", "LB", "EX", "CM", "MH", "DS", "EG", "PE", "QS"]
+    domains_info = await get_cdashig_domains_list(cdashig_version, headers_=headers_)
+    if "error" in domains_info:
+        raise Exception(domains_info["error"])
+    domains = [domain["name"] for domain in domains_info["domains"] if domain["name"]]
 
-    field_upper = field.upper()
-
-    for domain in common_domains:
-        try:
-            url = f"https://library.cdisc.org/api/mdr/cdashig/{cdashig_version}/domains/{domain}"
+    url = f"https://library.cdisc.org/api/mdr/cdashig/{cdashig_version}/domains"
+    domain_data = await gather_limited(async_http_pool.pool_size, [
+        aapi_json(f"{url}/{domain}", headers_=headers_) for domain in domains
+    ], return_exceptions=True)
 
-            if headers_ is None:
-                response = api(url)
-            else:
-                response = api(url, headers_=headers_)
+    # Domains that failed to download are left out of a partial index
+    downloaded = succeeded(domains, domain_data)
+    index = {}
+    for domain, data in downloaded:
+        for field_raw in data.get("fields", []):
+            domains_of_field = index.setdefault(field_raw.get("name", "").upper(), [])
+            if domain not in domains_of_field:
+                domains_of_field.append(domain)
+    return index if len(downloaded) == len(domains) else PartialIndex(index)
 
-            data = response.json()
 
-            for field_raw in data.get("fields", []):
-                field_name = field_raw.get("name", "")
-                if field_name.upper() == field_upper:
-                    return domain
+cdashig_field_index = VariableIndex("cdashig", build_cdashig_field_index, response_cache)
 
-        except:
-            continue
 
-    return None
+async def find_cdash_field_domain(field: str, cdashig_version: str, headers_ = None):
+    """
+    Helper function to find which CDASH domain contains a specific field.
+    Looks the field up in the index of all domains of the CDASHIG version.
+    """
+    field_upper = field.upper()
+    domains = await cdashig_field_index.lookup(cdashig_version, field_upper, headers_=headers_)
+    return preferred_domain(field_upper, domains)
 
 
 @mcp.tool(name="get_cdashig_field_details")
-def get_cdashig_field_details(field: str,
+async def get_cdashig_field_details(field: str,
                                 domain: Optional[str] = None,
                                 cdashig_version: Optional[str] = None,
                                 include_codelist: bool = True,
@@ -1421,7 +1742,7 @@ def get_cdashig_field_details(field: str,
     Args:
         field (str): Field name (e.g., "USUBJID", "AESTDTC", "CMTRT").
         domain (str, optional): CDASH domain code (e.g., "DM", "AE", "CM").
-                               If not provided, will search common domains.
+                               If not provided, will search all domains.
         cdashig_version (str, optional): CDASHIG version (e.g., "2-3" or "2.3").
                                         If not provided, uses latest version.
         include_codelist (bool, optional): If True, retrieves full codelist terms. Default True.
@@ -1439,7 +1760,7 @@ def get_cdashig_field_details(field: str,
         field = field.upper()
 
         if cdashig_version is None:
-            version_info = get_cdashig_latest_version(headers_=headers_)
+            version_info = await get_cdashig_latest_version(headers_=headers_)
             if "error" in version_info:
                 return version_info
             cdashig_version = version_info["latest_version"]
@@ -1447,11 +1768,12 @@ def get_cdashig_field_details(field: str,
             cdashig_version = cdashig_version.replace(".", "-")
 
         if domain is None:
-            domain = find_cdash_field_domain(field, cdashig_version, headers_=headers_)
+            domain = await find_cdash_field_domain(field, cdashig_version, headers_=headers_)
             if domain is None:
                 return {
-                    "error": f"Field '{field}' not found in common CDASH domains",
-                    "field": field
+                    "error": f"Field '{field}' not found in any CDASHIG {cdashig_version} domain",
+                    "field": field,
+                    "did_you_mean": await cdashig_field_index.similar(cdashig_version, field)
                 }
         else:
             domain = domain.upper()
@@ -1459,9 +1781,9 @@ def get_cdashig_field_details(field: str,
         url = f"https://library.cdisc.org/api/mdr/cdashig/{cdashig_version}/domains/{domain}"
 
         if headers_ is None:
-            response = api(url)
+            response = await aapi(url)
         else:
-            response = api(url, headers_=headers_)
+            response = await aapi(url, headers_=headers_)
 
         data = response.json()
 
@@ -1475,7 +1797,8 @@ def get_cdashig_field_details(field: str,
             return {
                 "error": f"Field '{field}' not found in domain '{domain}'",
                 "field": field,
-                "domain": domain
+                "domain": domain,
+                "did_you_mean": TrigramIndex(field_raw.get("name") for field_raw in data.get("fields", [])).similar(field)
             }
 
         details = {
@@ -1494,31 +1817,7 @@ def get_cdashig_field_details(field: str,
         }
 
         if include_codelist and "_links" in field_data and "codelist" in field_data["_links"]:
-            codelist_href = field_data["_links"]["codelist"]["href"]
-            try:
-                parts = codelist_href.split("/")
-                codelist_id = parts[-1]
-
-                if "/packages/" in codelist_href:
-                    package_part = codelist_href.split("/packages/")[1].split("/")[0]
-                    if "-" in package_part:
-                        standard_with_ct = package_part.split("-")[0]
-                        if standard_with_ct.endswith("ct"):
-                            standard = standard_with_ct[:-2].upper()
-
-                            ct_version_info = get_latest_ct_version(standard, headers_=headers_)
-                            if "error" not in ct_version_info:
-                                ct_version = ct_version_info["latest_version"]
-                                codelist_data = get_cdisc_codelist(
-                                    codelist_id,
-                                    standard=standard,
-                                    version=ct_version,
-                                    headers_=headers_
-                                )
-                                if "error" not in codelist_data:
-                                    details["codelist"] = codelist_data
-            except:
-                pass
+            details["codelist"] = await resolve_codelist(field_data["_links"], headers_=headers_)
 
         return details
 
@@ -1536,52 +1835,159 @@ def get_cdashig_field_details(field: str,
 # ============================================================================
 
 @mcp.tool(name="search_cdisc_library")
-def search_cdisc_library(
+async def search_cdisc_library(
     query: str,
     limit: int = 100,
+    source: str = "auto",
+    offset: int = 0,
+    cursor: Optional[str] = None,
     headers_=None
 ) -> dict:
     """
     Search across all CDISC Library content (variables, domains, codelists, BC, etc.)
 
+    Queries are first answered from the local full-text index of the variables,
+    fields, datasets, codelists, terms, Biomedical Concepts and Dataset
+    Specializations read so far with the caller's api key, ranked by BM25, and
+    sent to the CDISC Library search only when nothing matches locally.
+
+    Results are paged: only `limit` hits from `offset` are requested, and when
+    more hits follow, the result has a `cursor` which returns the next page
+    when passed back with the same query.
+
     Args:
         query (str): Search query string
-        limit (int): Maximum number of results to return (default: 100, max: 500)
+        limit (int): Maximum number of results to return (default: 100, 1 to 500)
+        source (str): "auto" (default) for the local index with the CDISC Library
+                      as fallback, "local" for the local index only, or "remote"
+                      for the CDISC Library search only
+        offset (int): Number of hits to skip (default: 0)
+        cursor (str): Cursor of a previous result, continuing where it ended.
+                      Overrides source and offset.
         headers_: Optional custom headers
 
     Returns:
-        dict: Search results with hits, totalHits, and hasMore
+        dict: Search results with hits, totalHits, hasMore, the source of the hits
+              and the cursor of the next page, if any
 
     Example:
         search_cdisc_library("blood pressure")
         search_cdisc_library("USUBJID", limit=50)
+        search_cdisc_library("USUBJID", limit=50, cursor="remote:50")
+        search_cdisc_library("adverse event", source="remote")
     """
     try:
-        if limit > 500:
-            limit = 500
+        limit = min(max(limit, 1), 500)
 
-        url = f"https://library.cdisc.org/api/mdr/search?q={query}"
+        if cursor is not None:
+            source, _, cursor_offset = cursor.partition(":")
+            if source not in ("local", "remote") or not cursor_offset.isdigit():
+                return {
+                    "error": f"Invalid cursor '{cursor}'",
+                    "query": query
+                }
+            offset = int(cursor_offset)
+
+        if source not in ("auto", "local", "remote"):
+            return {
+                "error": f"Invalid source '{source}'. Use auto, local or remote",
+                "query": query
+            }
+
+        offset = max(offset, 0)
+
+        def page(page_source: str, total: int, hits: list, has_more: bool) -> dict:
+            result = {
+                "query": query,
+                "source": page_source,
+                "totalHits": total,
+                "hasMore": has_more,
+                "offset": offset,
+                "returnedHits": len(hits),
+                "hits": hits
+            }
+            if has_more:
+                result["cursor"] = f"{page_source}:{offset + len(hits)}"
+            return result
+
+        if source != "remote":
+            await _backfill_search_index()
+            total, hits = await asyncio.to_thread(
+                search_index.search, query, limit=limit, offset=offset, readers=_search_readers(headers_)
+            )
+            for hit in hits:
+                hit["type"] = REMOTE_TYPES.get(hit["type"], hit["type"])
+            if total or source == "local":
+                return page("local", total, hits, offset + len(hits) < total)
+
+        url = f"https://library.cdisc.org/api/mdr/search?{urlencode({'q': query, 'start': offset, 'pageSize': limit})}"
 
         if headers_ is None:
-            response = api(url)
+            response = await aapi(url)
         else:
-            response = api(url, headers_=headers_)
+            response = await aapi(url, headers_=headers_)
 
         data = response.json()
 
-        # Limit results if needed
-        hits = data.get("hits", [])
-        if len(hits) > limit:
-            hits = hits[:limit]
-            data["hits"] = hits
-            data["hasMore"] = True
+        total = data.get("totalHits", 0)
+        hits = data.get("hits", [])[:limit]
+        has_more = data.get("hasMore", offset + len(hits) < total) and len(hits) > 0
+
+        return page("remote", total, hits, has_more)
+
+    except Exception as e:
+        return {
+            "error": str(e),
+            "query": query
+        }
+
+
+@mcp.tool(name="find_similar_metadata")
+async def find_similar_metadata(
+    query: str,
+    top_k: int = 10,
+    item_type: Optional[str] = None,
+    standard: Optional[str] = None,
+    headers_ = None
+) -> dict:
+    """
+    Find the variables, fields, codelists and terms whose meaning is closest to a free-text question
+
+    Ranks the items read so far with the caller's api key (see search_cdisc_library) by the cosine
+    similarity of TF-IDF vectors of their labels, descriptions and definitions,
+    computed locally without any request to the CDISC Library.
+
+    Args:
+        query (str): What the item holds (e.g., "date of first exposure to treatment")
+        top_k (int): Maximum number of items to return (default: 10, max: 100)
+        item_type (str): Only return items of this type: Variable, Field, Dataset,
+                         Code List, Code List Value, Biomedical Concept or Dataset Specialization
+                         ("Codelist" and "Codelist Term" are accepted too)
+        standard (str): Only return items of a standard or version, matched against
+                        their href (e.g., "sdtmig", "adam", "sdtmig/3-4", "ct")
+
+    Returns:
+        dict: The most similar items with their similarity, most similar first
+
+    Example:
+        find_similar_metadata("planned treatment for period 1", standard="adam")
+        find_similar_metadata("body mass index", item_type="Variable", standard="sdtmig/3-4")
+    """
+    try:
+        top_k = min(max(top_k, 1), 100)
+
+        await _backfill_search_index()
+        await asyncio.to_thread(similarity_index.refresh)
+
+        items = similarity_index.similar(
+            query, top_k=top_k, item_type=item_type, standard=standard, readers=_search_readers(headers_)
+        )
 
         return {
             "query": query,
-            "totalHits": data.get("totalHits", 0),
-            "hasMore": data.get("hasMore", False),
-            "returnedHits": len(hits),
-            "hits": hits
+            "indexed_items": similarity_index.stats()["items"],
+            "count": len(items),
+            "items": items
         }
 
     except Exception as e:
@@ -1595,7 +2001,11 @@ def search_cdisc_library(
 # SEND (SENDIG) METADATA TOOLS
 # ============================================================================
 
-def find_sendig_variable_domain(variable: str, sendig_version: Optional[str] = None, headers_=None) -> str:
+# Parsed SENDIG dataset payloads, shared by the SEND tools
+sendig_datasets = SENDDatasetStore(aapi_json, headers=headers)
+
+
+async def find_sendig_variable_domain(variable: str, sendig_version: Optional[str] = None, headers_=None) -> str:
     """
     Helper function to find which SEND domain contains a variable
 
@@ -1608,7 +2018,7 @@ def find_sendig_variable_domain(variable: str, sendig_version: Optional[str] = N
         str: Domain name if found, None otherwise
     """
     if sendig_version is None:
-        version_info = get_sendig_latest_version(headers_=headers_)
+        version_info = await get_sendig_latest_version(headers_=headers_)
         if "error" in version_info:
             return None
         sendig_version = version_info["latest_version"]
@@ -1616,31 +2026,16 @@ def find_sendig_variable_domain(variable: str, sendig_version: Optional[str] = N
     # Normalize version format
     sendig_version = sendig_version.replace(".", "-")
 
-    # Common SEND domains to check
+    # Common SEND domains to check, a few at a time; the first one listed wins
     common_domains = ["DM", "EX", "LB", "MI", "OM", "PC", "PP", "CL", "MA", "BW", "FW"]
 
-    for domain in common_domains:
-        try:
-            url = f"https://library.cdisc.org/api/mdr/sendig/{sendig_version}/datasets/{domain}"
-            if headers_ is None:
-                response = api(url)
-            else:
-                response = api(url, headers_=headers_)
-
-            domain_data = response.json()
-            variables = domain_data.get("datasetVariables", [])
-
-            for var in variables:
-                if var.get("name") == variable:
-                    return domain
-        except:
-            continue
-
-    return None
+    return await sendig_datasets.find_variable(
+        variable, sendig_version, common_domains, limit=min(async_http_pool.pool_size, 4), headers_=headers_
+    )
 
 
 @mcp.tool(name="get_sendig_latest_version")
-def get_sendig_latest_version(headers_=None) -> dict:
+async def get_sendig_latest_version(headers_=None) -> dict:
     """
     Get the latest SEND Implementation Guide version from CDISC Library
 
@@ -1653,63 +2048,22 @@ def get_sendig_latest_version(headers_=None) -> dict:
     Example:
         get_sendig_latest_version()
     """
-    try:
-        # Start with a known recent version and work backwards to find all
-        url = "https://library.cdisc.org/api/mdr/sendig/3-1-1"
+    versions = await products.versions("SENDIG", headers_=headers_)
+    latest_version = versions[0]
 
-        if headers_ is None:
-            response = api(url)
-        else:
-            response = api(url, headers_=headers_)
-
-        data = response.json()
-
-        # Parse version string (e.g., "3.1.1" -> "3-1-1")
-        latest_version = data.get("version", "3.1.1").replace(".", "-")
-
-        # Collect all versions by following priorVersion links
-        versions = [latest_version]
-        current_data = data
-
-        while "_links" in current_data and "priorVersion" in current_data["_links"]:
-            try:
-                prior_href = current_data["_links"]["priorVersion"]["href"]
-                full_url = f"https://library.cdisc.org{prior_href}" if prior_href.startswith("/") else prior_href
-
-                if headers_ is None:
-                    response = api(full_url)
-                else:
-                    response = api(full_url, headers_=headers_)
-
-                current_data = response.json()
-                version = current_data.get("version", "").replace(".", "-")
-
-                if version and version not in versions:
-                    versions.append(version)
-                else:
-                    break
-
-                if len(versions) >= 20:  # Safety limit
-                    break
-            except:
-                break
-
-        return {
-            "latest_version": latest_version,
-            "all_versions": versions,
-            "total_versions": len(versions),
-            "display_version": f"SENDIG v{latest_version.replace('-', '.')}"
-        }
-
-    except Exception as e:
-        return {
-            "error": str(e),
-            "latest_version": "3-1-1"  # Fallback to known stable version
-        }
+    result = {
+        "latest_version": latest_version,
+        "all_versions": versions,
+        "total_versions": len(versions),
+        "display_version": f"SENDIG v{latest_version.replace('-', '.')}"
+    }
+    if products.source(headers_=headers_) == "fallback":
+        result["note"] = "Using default versions due to API error"
+    return result
 
 
 @mcp.tool(name="get_sendig_classes")
-def get_sendig_classes(sendig_version: Optional[str] = None, headers_=None) -> dict:
+async def get_sendig_classes(sendig_version: Optional[str] = None, headers_=None) -> dict:
     """
     Get list of all SEND domain classes (Findings, Events, Interventions, etc.)
 
@@ -1726,7 +2080,7 @@ def get_sendig_classes(sendig_version: Optional[str] = None, headers_=None) -> d
     """
     try:
         if sendig_version is None:
-            version_info = get_sendig_latest_version(headers_=headers_)
+            version_info = await get_sendig_latest_version(headers_=headers_)
             if "error" in version_info:
                 return version_info
             sendig_version = version_info["latest_version"]
@@ -1737,9 +2091,9 @@ def get_sendig_classes(sendig_version: Optional[str] = None, headers_=None) -> d
         url = f"https://library.cdisc.org/api/mdr/sendig/{sendig_version}"
 
         if headers_ is None:
-            response = api(url)
+            response = await aapi(url)
         else:
-            response = api(url, headers_=headers_)
+            response = await aapi(url, headers_=headers_)
 
         data = response.json()
 
@@ -1759,7 +2113,7 @@ def get_sendig_classes(sendig_version: Optional[str] = None, headers_=None) -> d
 
 
 @mcp.tool(name="get_sendig_domain_structure")
-def get_sendig_domain_structure(
+async def get_sendig_domain_structure(
     domain: str,
     sendig_version: Optional[str] = None,
     headers_=None
@@ -1783,7 +2137,7 @@ def get_sendig_domain_structure(
         domain = domain.upper()
 
         if sendig_version is None:
-            version_info = get_sendig_latest_version(headers_=headers_)
+            version_info = await get_sendig_latest_version(headers_=headers_)
             if "error" in version_info:
                 return version_info
             sendig_version = version_info["latest_version"]
@@ -1791,14 +2145,7 @@ def get_sendig_domain_structure(
         # Normalize version format
         sendig_version = sendig_version.replace(".", "-")
 
-        url = f"https://library.cdisc.org/api/mdr/sendig/{sendig_version}/datasets/{domain}"
-
-        if headers_ is None:
-            response = api(url)
-        else:
-            response = api(url, headers_=headers_)
-
-        data = response.json()
+        data = await sendig_datasets.dataset(sendig_version, domain, headers_=headers_)
 
         # Extract class information from _links if available
         domain_class = None
@@ -1841,7 +2188,7 @@ def get_sendig_domain_structure(
 
 
 @mcp.tool(name="get_sendig_variable_details")
-def get_sendig_variable_details(
+async def get_sendig_variable_details(
     variable: str,
     domain: Optional[str] = None,
     sendig_version: Optional[str] = None,
@@ -1869,7 +2216,7 @@ def get_sendig_variable_details(
         variable = variable.upper()
 
         if sendig_version is None:
-            version_info = get_sendig_latest_version(headers_=headers_)
+            version_info = await get_sendig_latest_version(headers_=headers_)
             if "error" in version_info:
                 return version_info
             sendig_version = version_info["latest_version"]
@@ -1879,23 +2226,22 @@ def get_sendig_variable_details(
 
         # Auto-detect domain if not provided
         if domain is None:
-            domain = find_sendig_variable_domain(variable, sendig_version, headers_=headers_)
+            domain = await find_sendig_variable_domain(variable, sendig_version, headers_=headers_)
             if domain is None:
                 return {
                     "error": f"Could not find variable {variable} in common SEND domains",
-                    "variable": variable
+                    "variable": variable,
+                    "did_you_mean": sendig_datasets.similar(variable, sendig_version, headers_=headers_)
                 }
         else:
             domain = domain.upper()
 
-        # Get domain structure
-        domain_data = get_sendig_domain_structure(domain, sendig_version, headers_=headers_)
-        if "error" in domain_data:
-            return domain_data
+        # One payload serves the metadata and the codelist link
+        domain_data = await sendig_datasets.dataset(sendig_version, domain, headers_=headers_)
 
         # Find the variable
         var_data = None
-        for var in domain_data.get("variables", []):
+        for var in domain_data.get("datasetVariables", []):
             if var.get("name") == variable:
                 var_data = var
                 break
@@ -1904,14 +2250,15 @@ def get_sendig_variable_details(
             return {
                 "error": f"Variable {variable} not found in domain {domain}",
                 "variable": variable,
-                "domain": domain
+                "domain": domain,
+                "did_you_mean": sendig_datasets.similar(variable, sendig_version, domain, headers_=headers_)
             }
 
         details = {
             "variable": variable,
             "label": var_data.get("label"),
             "domain": domain,
-            "datatype": var_data.get("datatype"),
+            "datatype": var_data.get("simpleDatatype"),
             "core": var_data.get("core"),
             "description": var_data.get("description"),
             "role": var_data.get("role"),
@@ -1919,46 +2266,10 @@ def get_sendig_variable_details(
         }
 
         # Add codelist if requested and available
-        if include_codelist:
-            # Get full variable data to check for codelist link
-            url = f"https://library.cdisc.org/api/mdr/sendig/{sendig_version}/datasets/{domain}"
-            if headers_ is None:
-                response = api(url)
-            else:
-                response = api(url, headers_=headers_)
-
-            full_domain = response.json()
-            for var in full_domain.get("datasetVariables", []):
-                if var.get("name") == variable:
-                    if "_links" in var and "codelist" in var["_links"]:
-                        codelist_href = var["_links"]["codelist"]["href"]
-                        try:
-                            # Extract codelist ID from href
-                            parts = codelist_href.split("/")
-                            codelist_id = parts[-1]
-
-                            # Get codelist using CT tool
-                            if "/packages/" in codelist_href:
-                                package_part = codelist_href.split("/packages/")[1].split("/")[0]
-                                if "-" in package_part:
-                                    standard_with_ct = package_part.split("-")[0]
-                                    if standard_with_ct.endswith("ct"):
-                                        standard = standard_with_ct[:-2].upper()
-
-                                        ct_version_info = get_latest_ct_version(standard, headers_=headers_)
-                                        if "error" not in ct_version_info:
-                                            ct_version = ct_version_info["latest_version"]
-                                            codelist_data = get_cdisc_codelist(
-                                                codelist_id,
-                                                standard=standard,
-                                                version=ct_version,
-                                                headers_=headers_
-                                            )
-                                            if "error" not in codelist_data:
-                                                details["codelist"] = codelist_data
-                        except:
-                            pass
-                    break
+        if include_codelist and "_links" in var_data and "codelist" in var_data["_links"]:
+            codelist_data = await resolve_codelist(var_data["_links"], headers_=headers_)
+            if codelist_data:
+                details["codelist"] = codelist_data
 
         return details
 
@@ -0,0 +1,198 @@
+import re
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from .search_index import REMOTE_TYPES
+
+# Lower-case type names accepted by the item_type filter, the local and the
+# CDISC Library search spellings alike
+_TYPE_NAMES = {
+    **{name.lower(): remote.lower() for name, remote in REMOTE_TYPES.items()},
+    **{remote.lower(): remote.lower() for remote in REMOTE_TYPES.values()}
+}
+
+
+def features(text: str) -> list:
+    """
+    Word unigrams and bigrams of a text, in lower case
+
+    Numbers are kept whatever their length, so "period 1" and "period 2" differ.
+
+    Example:
+        features("Systolic Blood Pressure") -> ["systolic", "blood", "pressure",
+                                                "systolic blood", "blood pressure"]
+    """
+    words = re.findall(r"[a-z0-9]{2,}|[0-9]", text.lower())
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+class SimilarityIndex:
+    """
+    TF-IDF matrix over the labels, descriptions and definitions of the indexed items
+
+    The items of the search index (variables, fields, datasets, codelists,
+    terms, Biomedical Concepts, Dataset Specializations) are weighted by
+    sublinear TF-IDF over word unigrams and bigrams, labels counting twice,
+    and stored column-wise as NumPy arrays, so the cosine similarity of a
+    query to every item is one sparse matrix-vector product. The matrix is
+    rebuilt when the search index gained items, at most every
+    rebuild_interval seconds.
+
+    Args:
+        search_index: The SearchIndex whose items are vectorized.
+        rebuild_interval: Minimum seconds between two builds of the matrix.
+    """
+
+    def __init__(self, search_index, rebuild_interval: float = 60):
+        self.search_index = search_index
+        self.rebuild_interval = rebuild_interval
+        self.builds = 0
+        self.build_seconds = 0.0
+        self._generation = None
+        self._built_at = 0.0
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Build the matrix if it is missing or out of date; call it from a worker thread."""
+        with self._lock:
+            if self._matrix is not None and (
+                self._generation == self.search_index.generation
+                or time.monotonic() - self._built_at < self.rebuild_interval
+            ):
+                return
+            started = time.monotonic()
+            generation = self.search_index.generation
+            self._matrix = self._build(self.search_index.items())
+            self._generation = generation
+            self._built_at = time.monotonic()
+            self.builds += 1
+            self.build_seconds = round(self._built_at - started, 3)
+
+    @staticmethod
+    def _build(items: list) -> dict:
+        vocabulary = {}
+        term_ids = []
+        doc_ids = []
+        counts = []
+        for doc_id, (_, _, name, label, text, _) in enumerate(items):
+            counted = Counter(features(f"{name} {label} {label} {text}"))
+            for feature, count in counted.items():
+                term_ids.append(vocabulary.setdefault(feature, len(vocabulary)))
+                doc_ids.append(doc_id)
+                counts.append(count)
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        document_frequency = np.bincount(term_ids, minlength=len(vocabulary))
+        idf = (np.log((1 + len(items)) / (1 + document_frequency)) + 1).astype(np.float32)
+        weights = (1 + np.log(np.asarray(counts, dtype=np.float32))) * idf[term_ids]
+        norms = np.sqrt(np.bincount(doc_ids, weights=weights ** 2, minlength=len(items)))
+        weights /= norms[doc_ids].clip(min=1e-12)
+
+        # Column-wise storage: the items and weights of each term are contiguous
+        order = np.argsort(term_ids, kind="stable")
+        return {
+            "vocabulary": vocabulary,
+            "idf": idf,
+            "indptr": np.concatenate(([0], np.cumsum(document_frequency))).astype(np.int64),
+            "doc_ids": doc_ids[order],
+            "weights": weights[order].astype(np.float32),
+            "hrefs": np.asarray([item[0] for item in items], dtype=str),
+            "types": np.asarray([REMOTE_TYPES.get(item[1], item[1]).lower() for item in items], dtype=str),
+            "items": items,
+            # Per tuple of reader credentials: which items they may see
+            "visible": {}
+        }
+
+    def similar(self, query: str, top_k: int = 10, item_type: str = None, standard: str = None,
+                readers: tuple = None) -> list:
+        """
+        Find the items whose labels, descriptions and definitions are most similar to a query
+
+        Args:
+            query: Free text, e.g. "date of first study treatment".
+            top_k: Maximum number of items returned.
+            item_type: Only return items of this type, e.g. "Variable" or "Code List Value";
+                       the local names "Codelist" and "Codelist Term" are accepted too.
+            standard: Only return items whose href contains /{standard}, e.g. "sdtmig",
+                      "adam" or "sdtmig/3-4".
+            readers: Only return the items read with one of these credentials
+                     ("" without an api key), see SearchIndex.search.
+
+        Returns:
+            List of items with their cosine similarity, most similar first
+        """
+        matrix = self._matrix
+        if matrix is None or not matrix["items"]:
+            return []
+
+        query_features = Counter(
+            feature for feature in features(query) if feature in matrix["vocabulary"]
+        )
+        if not query_features:
+            return []
+        term_ids = np.asarray([matrix["vocabulary"][feature] for feature in query_features], dtype=np.int64)
+        query_weights = (
+            1 + np.log(np.asarray(list(query_features.values()), dtype=np.float32))
+        ) * matrix["idf"][term_ids]
+        query_weights /= np.linalg.norm(query_weights)
+
+        # Sparse matrix-vector product over the columns of the query terms
+        starts = matrix["indptr"][term_ids]
+        lengths = matrix["indptr"][term_ids + 1] - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        scores = np.bincount(
+            matrix["doc_ids"][positions],
+            weights=matrix["weights"][positions] * np.repeat(query_weights, lengths),
+            minlength=len(matrix["items"])
+        )
+
+        mask = scores > 0
+        if readers is not None:
+            mask &= self._visible(matrix, tuple(reader or "" for reader in readers))
+        if standard:
+            mask &= np.char.find(matrix["hrefs"], f"/{standard.lower()}") >= 0
+        if item_type:
+            mask &= matrix["types"] == _TYPE_NAMES.get(item_type.lower(), item_type.lower())
+        candidates = np.flatnonzero(mask)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        results = []
+        for doc_id in candidates:
+            href, document_type, name, label, text, _ = matrix["items"][doc_id]
+            results.append({
+                "href": href,
+                "type": REMOTE_TYPES.get(document_type, document_type),
+                "name": name,
+                "label": label,
+                "text": text,
+                "similarity": round(float(scores[doc_id]), 4)
+            })
+        return results
+
+    @staticmethod
+    def _visible(matrix: dict, readers: tuple) -> np.ndarray:
+        if readers not in matrix["visible"]:
+            allowed = set(readers)
+            matrix["visible"][readers] = np.fromiter(
+                (not allowed.isdisjoint(item[5]) for item in matrix["items"]),
+                dtype=bool,
+                count=len(matrix["items"])
+            )
+        return matrix["visible"][readers]
+
+    def stats(self) -> dict:
+        """Report the size of the matrix and how often it was built."""
+        matrix = self._matrix
+        return {
+            "items": len(matrix["items"]) if matrix else 0,
+            "features": len(matrix["vocabulary"]) if matrix else 0,
+            "builds": self.builds,
+            "build_seconds": self.build_seconds
+        }
@@ -0,0 +1,52 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one execution
+
+    While a call for a key is in flight, further callers with the same key do
+    not execute their own function but wait for the running one and receive
+    its result (or its exception). Nothing is kept once the call finished, so
+    this only deduplicates work that overlaps in time.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def ado(self, key, coroutine_fn):
+        """
+        Await coroutine_fn() unless a task for key is already in flight, then await that one
+
+        The shared task is shielded, so a cancelled caller does not cancel the
+        work the other callers are waiting for.
+
+        Args:
+            key: Identity of the work, e.g. the url to fetch.
+            coroutine_fn: Function without arguments returning a coroutine.
+
+        Returns:
+            The result of the task that executed for key
+        """
+        loop = asyncio.get_running_loop()
+        task = self._tasks.get((loop, key))
+        if task is None:
+            task = loop.create_task(coroutine_fn())
+            self._tasks[(loop, key)] = task
+            task.add_done_callback(lambda _: self._tasks.pop((loop, key), None))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        """
+        Report how many calls were executed and how many joined an in-flight call
+        """
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._tasks)
+        }
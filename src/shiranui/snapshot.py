@@ -0,0 +1,506 @@
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+import httpx
+
+from .cache import CacheEntry, cache_policy, default_cache_dir
+from .ct_store import CTVersionRegistry
+from .products import ProductRegistry
+from .variable_index import gather_limited
+
+MDR_URL = "https://library.cdisc.org/api"
+MDR_API_URL = "https://api.library.cdisc.org/api"
+COSMOS_URL = "https://api.library.cdisc.org/api/cosmos/v2"
+
+# Credential of the snapshot resources in the search index, readable by every
+# caller while the snapshot is used
+SNAPSHOT_CREDENTIAL = "snapshot"
+
+
+def default_snapshot_path() -> Path:
+    """Path of the snapshot database when none is given."""
+    return default_cache_dir() / "snapshot.sqlite3"
+
+
+def snapshot_key(url: str) -> str:
+    """
+    Key of a resource in the snapshot: its path and query without the host,
+    since the tools reach the same resources through both CDISC Library hosts
+    """
+    parts = urlsplit(url)
+    return f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+
+def links(data: dict, pattern: str) -> list:
+    """Hrefs anywhere under the _links of a resource matching a pattern, in order and without duplicates."""
+    compiled = re.compile(pattern)
+    found = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            href = node.get("href")
+            if isinstance(href, str) and compiled.search(href) and href not in found:
+                found.append(href)
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk((data or {}).get("_links", {}))
+    return found
+
+
+class Snapshot:
+    """
+    Local mirror of CDISC Library resources in a SQLite database
+
+    A snapshot is written by `shiranui snapshot` and read by a server started
+    with --snapshot, which then answers every request from the database
+    without any network access. Resources missing from the snapshot are
+    answered with 404 Not Found.
+
+    Args:
+        path: Path of the snapshot database. If None, the snapshot is not used.
+        readonly: Open the database read-only, as the server does.
+    """
+
+    def __init__(self, path: Path = None, readonly: bool = True):
+        self.path = Path(path) if path else None
+        self.readonly = readonly
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._connection is None:
+            if self.readonly:
+                connection = sqlite3.connect(
+                    f"{self.path.resolve().as_uri()}?mode=ro",
+                    uri=True,
+                    check_same_thread=False
+                )
+            else:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS resources ("
+                    "key TEXT PRIMARY KEY, url TEXT NOT NULL, body BLOB NOT NULL, "
+                    "etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL)"
+                )
+                connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._connection = connection
+        return self._connection
+
+    def configure(self, path: Path = None, readonly: bool = True):
+        """Use another snapshot database, or none with path None."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self.path = Path(path) if path else None
+            self.readonly = readonly
+
+    def get(self, url: str) -> CacheEntry:
+        """
+        Look up a resource
+
+        Returns:
+            CacheEntry, or None if the resource is not in the snapshot
+        """
+        with self._lock:
+            row = self._db().execute(
+                "SELECT body, etag, last_modified, fetched_at FROM resources WHERE key = ?",
+                (snapshot_key(url),)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        body, etag, last_modified, fetched_at = row
+        return CacheEntry(url, zlib.decompress(body), etag, last_modified, fetched_at)
+
+    def put(self, url: str, body: bytes, response_headers=None):
+        """Store a resource with its validators."""
+        response_headers = response_headers or {}
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO resources (key, url, body, etag, last_modified, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (snapshot_key(url), url, zlib.compress(body, 6), response_headers.get("ETag"),
+                 response_headers.get("Last-Modified"), time.time())
+            )
+
+    def touch(self, url: str):
+        """Record that a resource was revalidated unchanged."""
+        with self._lock:
+            self._db().execute(
+                "UPDATE resources SET fetched_at = ? WHERE key = ?", (time.time(), snapshot_key(url))
+            )
+
+    def contains(self, url: str) -> bool:
+        with self._lock:
+            return self._db().execute(
+                "SELECT 1 FROM resources WHERE key = ?", (snapshot_key(url),)
+            ).fetchone() is not None
+
+    def prune(self, keep: set) -> int:
+        """
+        Remove the resources whose key is not in keep, e.g. those of superseded versions
+
+        Returns:
+            The number of resources removed
+        """
+        with self._lock:
+            db = self._db()
+            db.execute("CREATE TEMP TABLE IF NOT EXISTS kept (key TEXT PRIMARY KEY)")
+            db.execute("DELETE FROM kept")
+            db.executemany("INSERT OR IGNORE INTO kept (key) VALUES (?)", ((key,) for key in keep))
+            removed = db.execute("DELETE FROM resources WHERE key NOT IN (SELECT key FROM kept)").rowcount
+            db.execute("DELETE FROM kept")
+        return removed
+
+    def bodies(self, batch: int = 200):
+        """
+        Iterate over the (url, credential, body) of all stored resources
+
+        The credential is SNAPSHOT_CREDENTIAL: a snapshot answers every
+        caller while it is used, whatever their api key.
+        """
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._db().execute(
+                    "SELECT rowid, url, body FROM resources WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last, batch)
+                ).fetchall()
+            if not rows:
+                return
+            for last, url, body in rows:
+                yield url, SNAPSHOT_CREDENTIAL, zlib.decompress(body)
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self._db().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def get_meta(self, key: str) -> str:
+        with self._lock:
+            row = self._db().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def httpx_response(self, url: str) -> httpx.Response:
+        """The stored resource as a response, or 404 Not Found if it is not in the snapshot."""
+        entry = self.get(url)
+        if entry is None:
+            return httpx.Response(
+                404,
+                json={"message": "Not in the snapshot"},
+                request=httpx.Request("GET", url)
+            )
+        return entry.to_httpx_response()
+
+    def stats(self) -> dict:
+        """Report the snapshot in use and how many requests it answered."""
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock:
+            resources, size = self._db().execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM resources"
+            ).fetchone()
+        return {
+            "enabled": True,
+            "path": str(self.path),
+            "created_at": self.get_meta("created_at"),
+            "synced_at": self.get_meta("synced_at"),
+            "resources": resources,
+            "stored_bytes": size,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class Mirror:
+    """
+    Copy the CDISC Library resources used by the tools into a snapshot
+
+    Mirrored are the CT package listing and packages, the product listing,
+    the SDTMIG, SENDIG, CDASHIG and ADaMIG datasets and variables, the
+    Biomedical Concepts and the SDTM Dataset Specializations with their
+    package listings. Of versioned resources, the latest `versions` versions
+    of each standard or package series are mirrored.
+
+    An incremental mirror updates an existing snapshot: resources that never
+    change once published (dated CT packages, IG versions, package snapshots)
+    are read from the snapshot when already there, so only new packages and
+    versions are downloaded, and the "latest" listings and resources are
+    revalidated with conditional requests and kept when unchanged. The latest
+    Biomedical Concepts and Dataset Specializations, thousands of resources,
+    are only revalidated when their package listing changed, since they
+    change with a new package.
+
+    Resources not reached by a run, such as the CT packages and IG versions
+    superseded by newer ones beyond `versions`, are removed at the end, so
+    the snapshot does not grow with every release. A run with failed
+    downloads removes nothing, as it may not have reached every resource.
+
+    Args:
+        snapshot: Snapshot opened for writing.
+        pool: AsyncConnectionPool used for the downloads.
+        request_headers: Headers of every request, including the api key.
+        versions: Number of latest versions mirrored per standard.
+        incremental: Update the resources already in the snapshot instead of downloading them again.
+    """
+
+    def __init__(self, snapshot: Snapshot, pool, request_headers: dict, versions: int = 1,
+                 incremental: bool = False):
+        self.snapshot = snapshot
+        self.pool = pool
+        self.request_headers = request_headers
+        self.versions = versions
+        self.incremental = incremental
+        self.downloaded = 0
+        self.revalidated = 0
+        self.kept = 0
+        self.added = []
+        self.failed = []
+        self.removed = 0
+        self._reached = set()
+        self._changed = set()
+
+    async def get(self, url: str, revalidate: bool = True) -> dict:
+        """
+        Download a resource into the snapshot
+
+        SQLite reads and writes run in a worker thread, off the event loop.
+
+        Args:
+            url: The url of the resource.
+            revalidate: If False, a resource already in the snapshot is kept without a request.
+
+        Returns:
+            The parsed JSON, or None if the download failed
+        """
+        key = snapshot_key(url)
+        self._reached.add(key)
+        stored = await asyncio.to_thread(self.snapshot.get, url) if self.incremental else None
+        request_headers = self.request_headers
+        if stored is not None:
+            if cache_policy.rule(url)[0] is None or not revalidate:
+                self.kept += 1
+                return self._parse(stored.body)
+            request_headers = {**self.request_headers, **stored.conditional_headers()}
+        try:
+            response = await self.pool.get(url, headers=request_headers)
+            # Without validators upstream, an identical body counts as not modified
+            if stored is not None and (
+                response.status_code == 304 or (response.status_code == 200 and response.content == stored.body)
+            ):
+                await asyncio.to_thread(self.snapshot.touch, url)
+                self.revalidated += 1
+                return self._parse(stored.body)
+            response.raise_for_status()
+        except httpx.HTTPError as error:
+            self.failed.append((url, str(error)))
+            # An unreachable resource keeps its last mirrored copy
+            return self._parse(stored.body) if stored is not None else None
+        await asyncio.to_thread(self.snapshot.put, url, response.content, response.headers)
+        self._changed.add(key)
+        self.downloaded += 1
+        return self._parse(response.content)
+
+    def changed(self, *urls: str) -> bool:
+        """Whether any of the resources was new or modified in this run, always True for a full mirror."""
+        return not self.incremental or any(snapshot_key(url) in self._changed for url in urls)
+
+    @staticmethod
+    def _parse(body: bytes) -> dict:
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+    async def _new(self, urls: list) -> list:
+        """The urls not in the snapshot yet, noted as added by an incremental mirror."""
+        if not self.incremental:
+            return []
+        new = await asyncio.to_thread(lambda: [url for url in urls if not self.snapshot.contains(url)])
+        self.added.extend(snapshot_key(url) for url in new)
+        return new
+
+    async def get_all(self, urls: list, revalidate: bool = True) -> list:
+        """Download resources concurrently, bounded by the pool size."""
+        return await gather_limited(self.pool.pool_size, [self.get(url, revalidate=revalidate) for url in urls])
+
+    async def controlled_terminology(self):
+        listing = await self.get(f"{MDR_API_URL}/mdr/ct/packages")
+        if listing is None:
+            return
+        packages = [
+            f"{standard.lower()}ct-{version}"
+            for standard, standard_versions in CTVersionRegistry.parse(listing).items()
+            for version in standard_versions[:self.versions]
+        ]
+        package_urls = [f"{MDR_API_URL}/mdr/ct/packages/{package}" for package in packages]
+        await self._new(package_urls)
+        await self.get_all(package_urls)
+
+    async def implementation_guides(self):
+        product_listing = await self.get(f"{MDR_URL}/mdr/products")
+        if product_listing is None:
+            return
+        products = ProductRegistry.parse(product_listing)
+
+        await self.get_all(
+            [f"{MDR_URL}/mdr/sendig/{version}" for version in products["SENDIG"][:self.versions]]
+            + [f"{MDR_URL}/mdr/sdtmig/{version}/classes" for version in products["SDTMIG"][:self.versions]]
+        )
+
+        dataset_lists = []
+        for ig, collection in (("sdtmig", "datasets"), ("sendig", "datasets"), ("cdashig", "domains")):
+            for version in products[ig.upper()][:self.versions]:
+                dataset_lists.append((ig, version, collection))
+        listing_urls = [f"{MDR_URL}/mdr/{ig}/{version}/{collection}" for ig, version, collection in dataset_lists]
+        await self._new(listing_urls)
+        listings = await self.get_all(listing_urls)
+        dataset_urls = []
+        for (ig, version, collection), listing in zip(dataset_lists, listings):
+            for href in links(listing, rf"^/mdr/{ig}/{version}/{collection}/[^/]+$"):
+                dataset_urls.append(f"{MDR_URL}{href}")
+        await self.get_all(dataset_urls)
+
+        for version in products["ADAMIG"][:self.versions]:
+            url = f"{MDR_API_URL}/mdr/adam/adamig-{version}/datastructures"
+            await self._new([url])
+            ds_names = [href.split("/")[-1] for href in links(await self.get(url), r"/datastructures/[^/]+$")]
+            structures = await self.get_all([f"{url}/{ds_name}" for ds_name in ds_names])
+            variable_urls = []
+            for ds_name, ds_data in zip(ds_names, structures):
+                ds_data = ds_data or {}
+                variables = list(ds_data.get("analysisVariables", []))
+                for var_set in ds_data.get("analysisVariableSets", []):
+                    variables.extend(var_set.get("analysisVariables", []))
+                for var in variables:
+                    if var.get("name"):
+                        variable_urls.append(f"{url}/{ds_name}/variables/{quote(var['name'])}")
+            await self.get_all(list(dict.fromkeys(variable_urls)))
+
+    async def biomedical_concepts(self):
+        concepts_url = f"{COSMOS_URL}/mdr/bc/biomedicalconcepts"
+        packages_url = f"{COSMOS_URL}/mdr/bc/packages"
+        concepts, _, package_listing = await self.get_all([
+            concepts_url,
+            f"{COSMOS_URL}/mdr/bc/categories",
+            packages_url
+        ])
+        concept_ids = [href.split("/")[-1] for href in links(concepts, r"^/mdr/bc/biomedicalconcepts/[^/]+$")]
+        packages = sorted(
+            {href.split("/")[4] for href in links(package_listing, r"^/mdr/bc/packages/[^/]+/biomedicalconcepts$")},
+            reverse=True
+        )[:self.versions]
+        package_lists = await self.get_all(
+            [f"{COSMOS_URL}/mdr/bc/packages/{package}/biomedicalconcepts" for package in packages]
+        )
+        package_concept_urls = [
+            f"{COSMOS_URL}{href}"
+            for package_list in package_lists
+            for href in links(package_list, r"^/mdr/bc/packages/[^/]+/biomedicalconcepts/[^/]+$")
+        ]
+        await self.get_all(package_concept_urls)
+        # The latest concepts only change with a new package
+        await self.get_all(
+            [f"{COSMOS_URL}/mdr/bc/biomedicalconcepts/{concept_id}" for concept_id in concept_ids]
+            + [f"{COSMOS_URL}/mdr/specializations/datasetspecializations?biomedicalconcept={concept_id}"
+               for concept_id in concept_ids],
+            revalidate=self.changed(concepts_url, packages_url)
+        )
+
+    async def dataset_specializations(self):
+        domains_url = f"{COSMOS_URL}/mdr/specializations/sdtm/domains"
+        packages_url = f"{COSMOS_URL}/mdr/specializations/sdtm/packages"
+        domain_listing, package_listing = await self.get_all([domains_url, packages_url])
+        # The latest specializations only change with a new package
+        revalidate = self.changed(domains_url, packages_url)
+        domain_lists = await self.get_all([
+            f"{COSMOS_URL}{href}"
+            for href in links(domain_listing, r"^/mdr/specializations/sdtm/datasetspecializations\?domain=")
+        ], revalidate=revalidate)
+        latest_urls = []
+        for domain_list in domain_lists:
+            for href in links(domain_list, r"^/mdr/specializations/sdtm/datasetspecializations/[^/?]+$"):
+                latest_urls.append(f"{COSMOS_URL}{href}")
+        packages = sorted(
+            {href.split("/")[5] for href in links(
+                package_listing, r"^/mdr/specializations/sdtm/packages/[^/]+/datasetspecializations$"
+            )},
+            reverse=True
+        )[:self.versions]
+        package_lists = await self.get_all([
+            f"{COSMOS_URL}/mdr/specializations/sdtm/packages/{package}/datasetspecializations"
+            for package in packages
+        ])
+        package_urls = []
+        for package_list in package_lists:
+            for href in links(
+                package_list, r"^/mdr/specializations/sdtm/packages/[^/]+/datasetspecializations/[^/?]+$"
+            ):
+                package_urls.append(f"{COSMOS_URL}{href}")
+        await self.get_all(list(dict.fromkeys(package_urls)))
+        await self.get_all(list(dict.fromkeys(latest_urls)), revalidate=revalidate)
+
+    def _write_meta(self):
+        now = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        if not self.incremental or self.snapshot.get_meta("created_at") is None:
+            self.snapshot.set_meta("created_at", now)
+        if self.incremental:
+            self.snapshot.set_meta("synced_at", now)
+        self.snapshot.set_meta("versions", str(self.versions))
+
+    async def run(self) -> dict:
+        """
+        Mirror all resources
+
+        Returns:
+            Dictionary with the number of resources downloaded and removed and the
+            failed urls, and for an incremental mirror the number of resources
+            revalidated or kept unchanged and the new packages and versions
+        """
+        started = time.monotonic()
+        await self.controlled_terminology()
+        await self.implementation_guides()
+        await self.biomedical_concepts()
+        await self.dataset_specializations()
+        if not self.failed:
+            self.removed = await asyncio.to_thread(self.snapshot.prune, self._reached)
+        await asyncio.to_thread(self._write_meta)
+        result = {"downloaded": self.downloaded}
+        if self.incremental:
+            result.update(revalidated=self.revalidated, kept=self.kept, added=self.added)
+        result.update(
+            removed=self.removed,
+            failed=len(self.failed),
+            failed_urls=[url for url, _ in self.failed],
+            seconds=round(time.monotonic() - started, 1)
+        )
+        return result
+
+
+snapshot = Snapshot()
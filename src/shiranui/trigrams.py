@@ -0,0 +1,62 @@
+from collections import Counter
+
+
+def trigrams(value: str) -> set:
+    """
+    Character trigrams of a name, padded so that its start and end weigh more
+
+    Example:
+        trigrams("AGE") -> {"  A", " AG", "AGE", "GE "}
+    """
+    padded = f"  {value.upper()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    Character trigram index of names, finding the known names closest to a misspelt one
+
+    Names are ranked by the Jaccard similarity of their trigram sets, so
+    "AESTDT" finds "AESTDTC" and "LBTESCD" finds "LBTESTCD". Only names
+    sharing a trigram with the query are scored.
+
+    Args:
+        names: The known names.
+    """
+
+    def __init__(self, names):
+        self.names = list(dict.fromkeys(name for name in names if name))
+        self._trigrams = [trigrams(name) for name in self.names]
+        self._postings = {}
+        for position, name_trigrams in enumerate(self._trigrams):
+            for trigram in name_trigrams:
+                self._postings.setdefault(trigram, []).append(position)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def similar(self, value: str, limit: int = 5, threshold: float = 0.3) -> list:
+        """
+        Find the names most similar to a value
+
+        Args:
+            value: The name looked up.
+            limit: Maximum number of names returned.
+            threshold: Minimum similarity, from 0 to 1, of the names returned.
+
+        Returns:
+            List of names, most similar first, without the value itself
+        """
+        value_trigrams = trigrams(value)
+        shared = Counter()
+        for trigram in value_trigrams:
+            for position in self._postings.get(trigram, ()):
+                shared[position] += 1
+
+        scored = []
+        for position, count in shared.items():
+            similarity = count / (len(value_trigrams) + len(self._trigrams[position]) - count)
+            if similarity >= threshold and self.names[position].upper() != value.upper():
+                scored.append((-similarity, self.names[position]))
+        scored.sort()
+        return [name for _, name in scored[:limit]]
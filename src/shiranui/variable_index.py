@@ -0,0 +1,240 @@
+import asyncio
+import json
+import os
+import time
+
+from .singleflight import SingleFlight
+from .trigrams import TrigramIndex
+
+INDEX_FORMAT = 1
+
+
+async def gather_limited(limit: int, coroutines: list, return_exceptions: bool = False) -> list:
+    """
+    Await coroutines concurrently, at most limit at a time
+
+    Args:
+        limit: Maximum number of coroutines awaited at the same time.
+        coroutines: The coroutines to await.
+        return_exceptions: If True, the exception of a failed coroutine is
+                           returned in its place instead of being raised.
+
+    Returns:
+        The results in the order of the coroutines
+    """
+    semaphore = asyncio.Semaphore(max(limit, 1))
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(coroutine) for coroutine in coroutines), return_exceptions=return_exceptions)
+
+
+def succeeded(names: list, results: list) -> list:
+    """
+    Pair names with the results of gather_limited(..., return_exceptions=True), leaving out the failed ones
+
+    Raises:
+        The exception of the first failure if every result failed
+    """
+    failures = [result for result in results if isinstance(result, BaseException)]
+    if failures and len(failures) == len(results):
+        raise failures[0]
+    return [(name, result) for name, result in zip(names, results) if not isinstance(result, BaseException)]
+
+
+async def first_result(limit: int, coroutine_fns: list):
+    """
+    Run coroutine functions concurrently, at most limit at a time, until one returns a result
+
+    Results are taken in the order of the functions, not of completion, so the
+    answer does not depend on which call finishes first: a result is returned
+    once every call before it finished without one. The calls not finished
+    yet are then cancelled, and a call whose turn comes after an earlier
+    function returned a result is skipped, so it never starts.
+
+    Returns:
+        The result other than None of the first function returning one, or None
+        if every call returned None
+    """
+    semaphore = asyncio.Semaphore(max(limit, 1))
+    found = []
+
+    async def run(position, coroutine_fn):
+        async with semaphore:
+            if found and min(found) < position:
+                return None
+            result = await coroutine_fn()
+            if result is not None:
+                found.append(position)
+            return result
+
+    tasks = [
+        asyncio.ensure_future(run(position, coroutine_fn))
+        for position, coroutine_fn in enumerate(coroutine_fns)
+    ]
+    try:
+        for task in tasks:
+            result = await task
+            if result is not None:
+                return result
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class PartialIndex(dict):
+    """An index built while some datasets could not be downloaded."""
+
+
+class VariableIndex:
+    """
+    Inverted index of variable names to the datasets containing them, per IG version
+
+    Published IG versions never change, so an index is built once from the
+    whole catalog of a version, kept in memory and written next to the
+    response cache, from where later processes load it without any request.
+    An index missing datasets that failed to download (a PartialIndex) only
+    answers the call that built it and is built again on next use.
+
+    Args:
+        name: Name of the indexed IG, used for the file name (e.g., sdtmig).
+        build: Coroutine function (version, headers_) returning a dictionary
+               of upper case variable name to the datasets containing it, or
+               a PartialIndex when some datasets were left out.
+        cache: The ResponseCache whose directory and enabled flag are followed.
+    """
+
+    def __init__(self, name: str, build, cache):
+        self.name = name
+        self.build = build
+        self.cache = cache
+        self.builds = 0
+        self.partial_builds = 0
+        self.loads = 0
+        self._indexes = {}
+        self._trigrams = {}
+        self._warming = {}
+        self._flights = SingleFlight()
+
+    def _path(self, version: str):
+        return self.cache.directory / "indexes" / f"{self.name}-{version}.json"
+
+    def _load(self, version: str) -> dict:
+        if not self.cache.enabled:
+            return None
+        try:
+            with open(self._path(version), encoding="utf-8") as index_file:
+                stored = json.load(index_file)
+        except (OSError, ValueError):
+            return None
+        if stored.get("format") != INDEX_FORMAT:
+            return None
+        return stored.get("index")
+
+    def _store(self, version: str, index: dict):
+        if not self.cache.enabled:
+            return
+        path = self._path(version)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(temporary, "w", encoding="utf-8") as index_file:
+                json.dump({"format": INDEX_FORMAT, "built_at": time.time(), "index": index}, index_file)
+            os.replace(temporary, path)
+        except OSError:
+            pass
+
+    async def get(self, version: str, headers_ = None) -> dict:
+        """
+        Get the index of an IG version, building it on first use
+
+        Returns:
+            Dictionary of upper case variable name to the datasets containing it
+        """
+        if version in self._indexes:
+            return self._indexes[version]
+
+        async def load():
+            index = await asyncio.to_thread(self._load, version)
+            if index is None:
+                index = await self.build(version, headers_=headers_)
+                self.builds += 1
+                if isinstance(index, PartialIndex):
+                    self.partial_builds += 1
+                    return index
+                await asyncio.to_thread(self._store, version, index)
+            else:
+                self.loads += 1
+            self._indexes[version] = index
+            return index
+
+        return await self._flights.ado(version, load)
+
+    async def peek(self, version: str) -> dict:
+        """
+        Get the index of an IG version if it is in memory or on disk, without building it
+
+        Returns:
+            The index, or None if it was not built yet
+        """
+        if version not in self._indexes:
+            if not self.cache.enabled:
+                return None
+            index = await asyncio.to_thread(self._load, version)
+            if index is None:
+                return None
+            self.loads += 1
+            self._indexes[version] = index
+        return self._indexes[version]
+
+    def warm(self, version: str, headers_ = None):
+        """Build the index of an IG version in the background of the running event loop."""
+        if version in self._indexes or version in self._warming:
+            return
+
+        async def build():
+            try:
+                await self.get(version, headers_=headers_)
+            except Exception:
+                pass
+            finally:
+                self._warming.pop(version, None)
+
+        # The event loop only keeps weak references to tasks
+        self._warming[version] = asyncio.get_running_loop().create_task(build())
+
+    async def lookup(self, version: str, variable: str, headers_ = None) -> list:
+        """
+        Get the datasets of an IG version containing a variable
+
+        Returns:
+            List of dataset names, empty if no dataset contains the variable
+        """
+        index = await self.get(version, headers_=headers_)
+        return index.get(variable.upper(), [])
+
+    async def similar(self, version: str, variable: str, limit: int = 5) -> list:
+        """
+        Get the variable names of an IG version closest to a misspelt one, without any request
+
+        Returns:
+            List of variable names, most similar first, empty if the index was not built yet
+        """
+        index = await self.peek(version)
+        if index is None:
+            return []
+        if version not in self._trigrams:
+            self._trigrams[version] = TrigramIndex(index)
+        return self._trigrams[version].similar(variable, limit=limit)
+
+    def stats(self) -> dict:
+        """Report the indexed versions and how often an index was built or loaded from disk."""
+        return {
+            "versions": {version: len(index) for version, index in self._indexes.items()},
+            "builds": self.builds,
+            "partial_builds": self.partial_builds,
+            "loads": self.loads
+        }
@@ -0,0 +1,74 @@
+import hashlib
+
+import httpx
+import pytest
+
+from shiranui import server
+from shiranui.cache import ResponseCache
+from shiranui.client import AsyncConnectionPool
+from shiranui.ct_store import CTStore, CTVersionRegistry
+from shiranui.products import ProductRegistry
+from shiranui.send_store import SENDDatasetStore
+from shiranui.variable_index import VariableIndex
+
+
+class MockLibrary:
+    """
+    Offline CDISC Library answering the server's requests from a dictionary of paths
+
+    Paths are given without the /api prefix and with their query string
+    (e.g., /mdr/sdtmig/3-4/datasets/DM);
+    values are JSON documents, or functions of the request returning an
+    httpx.Response or a JSON document. JSON documents carry an ETag and are
+    answered 304 Not Modified to a matching If-None-Match. Every request is
+    recorded.
+    """
+
+    def __init__(self):
+        self.resources = {}
+        self.requests = []
+        self.pool = AsyncConnectionPool(transport=httpx.MockTransport(self.handle))
+
+    def handle(self, request):
+        self.requests.append(request)
+        path = request.url.raw_path.decode().removeprefix("/api")
+        if path not in self.resources:
+            return httpx.Response(404, json={"error": "not found"})
+        resource = self.resources[path]
+        if callable(resource):
+            resource = resource(request)
+        if isinstance(resource, httpx.Response):
+            return resource
+        response = httpx.Response(200, json=resource)
+        etag = f'"{hashlib.sha256(response.content).hexdigest()[:16]}"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        return response
+
+    def paths(self) -> list:
+        return [request.url.raw_path.decode().removeprefix("/api") for request in self.requests]
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    """Point the server at a MockLibrary, with empty stores and indexes and no disk cache"""
+    library = MockLibrary()
+    cache = ResponseCache(tmp_path, enabled=False)
+    monkeypatch.setattr(server, "async_http_pool", library.pool)
+    monkeypatch.setattr(server, "response_cache", cache)
+    monkeypatch.setattr(server, "_index_in_background", lambda endpoint_url, response, request_credential=None: None)
+    monkeypatch.setattr(server, "products", ProductRegistry(server.aapi_json, cache, headers=server.headers))
+    monkeypatch.setattr(server, "ct_store", CTStore(server.aapi_json, headers=server.headers))
+    monkeypatch.setattr(server, "ct_versions", CTVersionRegistry(server.aapi_json, headers=server.headers))
+    monkeypatch.setattr(server, "sendig_datasets", SENDDatasetStore(server.aapi_json, headers=server.headers))
+    monkeypatch.setattr(
+        server, "sdtmig_variable_index", VariableIndex("sdtmig", server.build_sdtmig_variable_index, cache)
+    )
+    monkeypatch.setattr(
+        server, "adamig_variable_index", VariableIndex("adamig", server.build_adamig_variable_index, cache)
+    )
+    monkeypatch.setattr(
+        server, "cdashig_field_index", VariableIndex("cdashig", server.build_cdashig_field_index, cache)
+    )
+    return library
@@ -0,0 +1,101 @@
+import asyncio
+
+import httpx
+import pytest
+
+from shiranui import server
+
+STRUCTURES = {
+    "ADSL": ["STUDYID", "USUBJID", "TRT01P", "TRT01A"],
+    "ADAE": ["USUBJID", "AEDECOD"],
+    "OCCDS": ["USUBJID", "TRTP", "AESEQ"],
+    "BDS": ["USUBJID", "PARAMCD", "AVAL", "TRTP"]
+}
+
+
+def add_adamig(library, failing: tuple = ()):
+    base = "/mdr/adam/adamig-1-3/datastructures"
+    library.resources[base] = {
+        "_links": {"dataStructures": [{"href": f"{base}/{name}"} for name in STRUCTURES]}
+    }
+    for name, variables in STRUCTURES.items():
+        if name in failing:
+            library.resources[f"{base}/{name}"] = httpx.Response(500)
+        else:
+            library.resources[f"{base}/{name}"] = {
+                "name": name,
+                "analysisVariableSets": [{"analysisVariables": [{"name": variable} for variable in variables]}]
+            }
+
+
+async def warmed():
+    await asyncio.gather(*server.adamig_variable_index._warming.values())
+
+
+@pytest.mark.asyncio
+async def test_find_returns_the_first_structure_in_listing_order(library):
+    """Test that a variable of several structures is found in the first listed one"""
+    add_adamig(library)
+
+    assert await server.find_adam_variable_dataset("trtp", "1.3") == "OCCDS"
+    assert await server.find_adam_variable_dataset("USUBJID", "1-3") == "ADSL"
+    assert await server.find_adam_variable_dataset("NOTAVAR", "1-3") is None
+    await warmed()
+
+    # The index built in the background answers without any request
+    requests = len(library.requests)
+    assert await server.find_adam_variable_dataset("AVAL", "1-3") == "BDS"
+    assert len(library.requests) == requests
+    assert (await server.adamig_variable_index.peek("1-3"))["TRTP"] == ["OCCDS", "BDS"]
+
+
+@pytest.mark.asyncio
+async def test_find_skips_a_failed_structure(library):
+    """Test that a structure failing to download is skipped and the index is not kept"""
+    add_adamig(library, failing=("ADSL",))
+
+    assert await server.find_adam_variable_dataset("USUBJID", "1-3") == "ADAE"
+    assert await server.find_adam_variable_dataset("TRT01P", "1-3") is None
+    await warmed()
+
+    assert await server.adamig_variable_index.peek("1-3") is None
+    assert server.adamig_variable_index.stats()["partial_builds"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_index_build_limits_concurrent_requests(library, monkeypatch):
+    """Test that the index build fetches at most pool_size data structures at a time"""
+    add_adamig(library)
+    library.pool.pool_size = 2
+    in_flight = {"now": 0, "max": 0}
+    fetch_json = server.aapi_json
+
+    async def counting(url, headers_=None):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        try:
+            await asyncio.sleep(0.01)
+            return await fetch_json(url, headers_=headers_)
+        finally:
+            in_flight["now"] -= 1
+
+    monkeypatch.setattr(server, "aapi_json", counting)
+    index = await server.build_adamig_variable_index("1-3")
+
+    assert in_flight["max"] == 2
+    assert index["USUBJID"] == list(STRUCTURES)
+    assert not isinstance(index, server.PartialIndex)
+
+
+@pytest.mark.asyncio
+async def test_first_miss_suggests_names_of_the_fetched_structures(library):
+    """Test that a misspelt variable gets suggestions before the index was built"""
+    add_adamig(library, failing=("BDS",))
+
+    result = await server.get_adam_variable_details("TRT01X", "1-3")
+    await warmed()
+
+    assert "error" in result
+    assert "TRT01P" in result["did_you_mean"]
+    assert "AVAL" not in result["did_you_mean"]
+    assert await server.adamig_variable_index.peek("1-3") is None
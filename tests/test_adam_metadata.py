@@ -171,3 +171,53 @@ async def test_get_adam_variable_with_codelist(mcp_client):
             codelist = result_dict["codelists"][0]
             assert "codelist_info" in codelist
             assert "terms" in codelist
+
+
+@pytest.mark.asyncio
+async def test_get_adam_variable_codelists_resolved(mcp_client):
+    """Test that every codelist link of a variable is resolved"""
+    client = mcp_client.get("client")
+    headers = mcp_client.get("headers")
+
+    async with client:
+        response = await client.call_tool(
+            "get_adam_variable_details",
+            arguments={
+                "adam_variable": "DTYPE",
+                "adamig_version": "1-3",
+                "headers_": headers
+            }
+        )
+        result = response[0]
+        result_dict = json.loads(result.text)
+
+        assert isinstance(result, TextContent)
+        assert result_dict["variable"] == "DTYPE"
+        assert len(result_dict["codelist_links"]) > 0
+        assert len(result_dict["codelists"]) > 0
+        for codelist in result_dict["codelists"]:
+            assert codelist["codelist_info"]["standard"] in ["ADAM", "SDTM"]
+            assert codelist["term_count"] > 0
+
+
+@pytest.mark.asyncio
+async def test_get_adam_variable_details_did_you_mean(mcp_client):
+    """Test that a misspelt variable name returns the closest variable names"""
+    client = mcp_client.get("client")
+    headers = mcp_client.get("headers")
+
+    async with client:
+        response = await client.call_tool(
+            "get_adam_variable_details",
+            arguments={
+                "adam_variable": "TRT01X",
+                "adamig_version": "1-3",
+                "headers_": headers
+            }
+        )
+        result = response[0]
+        result_dict = json.loads(result.text)
+
+        assert isinstance(result, TextContent)
+        assert "error" in result_dict
+        assert "TRT01P" in result_dict["did_you_mean"]
@@ -0,0 +1,141 @@
+import itertools
+import time
+
+import httpx
+import pytest
+
+from shiranui import server
+from shiranui.cache import ResponseCache, credential
+from shiranui.client import AsyncConnectionPool
+
+URL = "https://api.library.cdisc.org/api/mdr/sdtmig/3-4/datasets/DM"
+KEY_A = credential({"api-key": "key-a"})
+KEY_B = credential({"api-key": "key-b"})
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(tmp_path)
+    yield cache
+    cache.configure(enabled=False)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Advance time.time() by one second on every call, so accesses are ordered"""
+    ticks = itertools.count(1_000_000)
+    monkeypatch.setattr(time, "time", lambda: float(next(ticks)))
+
+
+def test_entries_are_kept_per_api_key(cache):
+    """Test that a second api key storing a url does not replace the entry of the first"""
+    cache.put(URL, b'{"key": "a"}', {"ETag": '"a"'}, credential=KEY_A)
+    cache.put(URL, b'{"key": "b"}', {"ETag": '"b"'}, credential=KEY_B)
+
+    assert cache.get(URL, KEY_A).body == b'{"key": "a"}'
+    assert cache.get(URL, KEY_B).body == b'{"key": "b"}'
+    assert cache.get(URL, credential({"api-key": "key-c"})) is None
+    assert cache.get(URL) is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_entry_without_api_key(cache):
+    """Test that a response downloaded without an api key is only served without one"""
+    cache.put(URL, b"{}")
+    cache.put(URL, b'{"again": true}')
+
+    assert cache.get(URL).body == b'{"again": true}'
+    assert cache.get(URL, KEY_A) is None
+    assert cache.stats()["entries"] == 1
+
+
+def test_refresh_only_touches_the_entry_of_its_api_key(cache, clock):
+    """Test that a revalidation renews the entry of its own api key"""
+    cache.put(URL, b"{}", credential=KEY_A)
+    cache.put(URL, b"{}", credential=KEY_B)
+    stored_a = cache.get(URL, KEY_A).stored_at
+    stored_b = cache.get(URL, KEY_B).stored_at
+
+    cache.refresh(URL, KEY_A)
+
+    assert cache.get(URL, KEY_A).stored_at > stored_a
+    assert cache.get(URL, KEY_B).stored_at == stored_b
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    """Test that the entries read least recently are evicted first when over max_bytes"""
+    cache = ResponseCache(tmp_path)
+    bodies = {f"{URL}?n={n}": bytes(range(256)) * 4 for n in range(3)}
+    for url, body in bodies.items():
+        cache.put(url, body, credential=KEY_A)
+    size = cache.stats()["stored_bytes"] // 3
+    first, second, third = bodies
+
+    # Room for three entries; reading the first makes the second the least recently used
+    cache.configure(max_bytes=size * 3)
+    assert cache.get(first, KEY_A) is not None
+    cache.put(f"{URL}?n=3", bytes(range(256)) * 4, credential=KEY_A)
+
+    assert cache.get(second, KEY_A) is None
+    assert cache.get(first, KEY_A) is not None
+    assert cache.get(third, KEY_A) is not None
+    assert cache.stats()["entries"] == 3
+    cache.configure(enabled=False)
+
+
+def test_eviction_keeps_the_other_api_keys_entry(tmp_path, clock):
+    """Test that evicting the entry of one api key leaves the same url of another"""
+    cache = ResponseCache(tmp_path)
+    cache.put(URL, bytes(range(256)) * 4, credential=KEY_A)
+    size = cache.stats()["stored_bytes"]
+    cache.put(URL, bytes(range(256)) * 4, credential=KEY_B)
+
+    cache.configure(max_bytes=size)
+    cache.put(URL, bytes(range(256)) * 4, credential=KEY_B)
+
+    assert cache.get(URL, KEY_A) is None
+    assert cache.get(URL, KEY_B) is not None
+    cache.configure(enabled=False)
+
+
+def test_disabled_cache(cache):
+    """Test that a disabled cache stores and serves nothing"""
+    cache.configure(enabled=False)
+    cache.put(URL, b"{}", credential=KEY_A)
+    cache.refresh(URL, KEY_A)
+
+    assert cache.get(URL, KEY_A) is None
+    assert list(cache.bodies()) == []
+    assert cache.stats() == {"enabled": False}
+
+    cache.configure(enabled=True)
+    assert cache.get(URL, KEY_A) is None
+
+
+@pytest.mark.asyncio
+async def test_not_modified_revalidates_the_cached_response(cache, monkeypatch):
+    """Test that a 304 answers from the cache and renews the entry"""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json={"name": "DM"}, headers={"ETag": '"v1"'})
+
+    pool = AsyncConnectionPool(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(server, "async_http_pool", pool)
+    monkeypatch.setattr(server, "response_cache", cache)
+    request_headers = {"api-key": "key-a"}
+
+    downloaded = await server._afetch(URL, request_headers)
+    cached = cache.get(URL, KEY_A)
+    revalidated = await server._afetch(URL, request_headers, cached)
+
+    assert downloaded.json() == revalidated.json() == {"name": "DM"}
+    assert "If-None-Match" not in requests[0].headers
+    assert requests[1].headers["If-None-Match"] == '"v1"'
+    assert cache.get(URL, KEY_A).stored_at >= cached.stored_at
+    assert cache.counters["downloaded"] == 1
+    assert cache.counters["revalidated"] == 1
+    await pool.close()
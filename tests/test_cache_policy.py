@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import pytest
+
+from shiranui import server
+from shiranui.cache import (
+    EXPIRED,
+    FRESH,
+    LATEST_STALE_WHILE_REVALIDATE,
+    LATEST_TTL,
+    STALE,
+    CacheEntry,
+    CachePolicy
+)
+
+API = "https://api.library.cdisc.org/api"
+COSMOS = "https://api.library.cdisc.org/api/cosmos/v2"
+LATEST = (LATEST_TTL, LATEST_STALE_WHILE_REVALIDATE)
+NEVER = (None, 0)
+ALWAYS = (0, 0)
+
+
+@pytest.mark.parametrize("url, expected", [
+    # Dated CT packages and their codelists
+    (f"{API}/mdr/ct/packages/sdtmct-2024-09-27", NEVER),
+    (f"{API}/mdr/ct/packages/sdtmct-2024-09-27/codelists/C66731", NEVER),
+    (f"{API}/mdr/ct/packages/define-xmlct-2024-03-29", NEVER),
+    # The package listing, not a package
+    (f"{API}/mdr/ct/packages", LATEST),
+    (f"{API}/mdr/ct/packages?page=2", LATEST),
+    (f"{API}/mdr/root/ct/sdtmct/codelists/C66731", ALWAYS),
+    # Versioned implementation guides and models
+    ("https://library.cdisc.org/api/mdr/sdtmig/3-4/datasets/DM", NEVER),
+    ("https://library.cdisc.org/api/mdr/sendig/3-1-1", NEVER),
+    ("https://library.cdisc.org/api/mdr/cdashig/2-3/domains", NEVER),
+    (f"{API}/mdr/sdtm/2-0/classes", NEVER),
+    (f"{API}/mdr/adam/adamig-1-3/datastructures", NEVER),
+    (f"{API}/mdr/adam/adamig-1-3/datastructures/ADSL/variables/TRT01P", NEVER),
+    (f"{API}/mdr/adam/adam-adae-1-0", NEVER),
+    (f"{API}/mdr/adam/adam-occds-1-1/datastructures", NEVER),
+    # ADaM paths without a version
+    (f"{API}/mdr/adam/adamig", ALWAYS),
+    (f"{API}/mdr/adam", ALWAYS),
+    # Listings of the latest versions
+    ("https://library.cdisc.org/api/mdr/sdtmig", LATEST),
+    ("https://library.cdisc.org/api/mdr/sendig", LATEST),
+    (f"{API}/mdr/products", LATEST),
+    (f"{API}/mdr/products/DataTabulation", LATEST),
+    # Biomedical Concepts and Dataset Specializations
+    (f"{COSMOS}/mdr/bc/packages/2022-10-26/biomedicalconcepts", NEVER),
+    (f"{COSMOS}/mdr/bc/packages/2022-10-26/biomedicalconcepts/C49676", NEVER),
+    (f"{COSMOS}/mdr/bc/packages", LATEST),
+    (f"{COSMOS}/mdr/bc/biomedicalconcepts/C49676", LATEST),
+    (f"{COSMOS}/mdr/specializations/sdtm/packages/2022-10-26/datasetspecializations", NEVER),
+    (f"{COSMOS}/mdr/specializations/sdtm/packages", LATEST),
+    (f"{COSMOS}/mdr/specializations/sdtm/datasetspecializations?domain=VS", LATEST),
+    # Search results
+    ("https://library.cdisc.org/api/mdr/search?q=AGE", (LATEST_TTL, 0)),
+    # Anything else is revalidated on every request
+    (f"{API}/mdr/qrs/instruments", ALWAYS),
+])
+def test_default_rules(url, expected):
+    """Test the ttl and stale-while-revalidate window of the default rules"""
+    assert CachePolicy().rule(url) == expected
+
+
+@pytest.mark.parametrize("age, expected", [
+    (0, FRESH),
+    (99, FRESH),
+    (100, STALE),
+    (149, STALE),
+    (150, EXPIRED),
+    (10_000, EXPIRED),
+])
+def test_freshness_boundaries(age, expected):
+    """Test that a response is fresh within its ttl and stale within the following window"""
+    policy = CachePolicy([(r"/latest$", 100, 50)])
+    now = time.time()
+    assert policy.freshness("https://example.org/latest", now - age) == expected
+
+
+def test_freshness_of_versioned_and_unmatched_urls():
+    """Test that versioned resources never expire and unmatched urls always do"""
+    policy = CachePolicy([(r"/v\d+$", None, 0)])
+    assert policy.freshness("https://example.org/v1", 0) == FRESH
+    assert policy.freshness("https://example.org/latest", time.time()) == EXPIRED
+
+
+def test_first_matching_rule_wins():
+    """Test that rules are tried in order"""
+    policy = CachePolicy([(r"/a/b", None, 0), (r"/a/", 10, 20)])
+    assert policy.rule("https://example.org/a/b") == (None, 0)
+    assert policy.rule("https://example.org/a/c") == (10, 20)
+
+
+@pytest.mark.asyncio
+async def test_stale_entries_of_each_api_key_are_revalidated(monkeypatch):
+    """Test that a revalidation in flight for one api key does not skip another's"""
+    fetched = []
+
+    async def afetch(endpoint_url, request_headers, cached):
+        fetched.append(request_headers["api-key"])
+
+    monkeypatch.setattr(server, "_afetch", afetch)
+    entry = CacheEntry("https://library.cdisc.org/api/mdr/sdtmig", b"{}")
+    for api_key in ("key-a", "key-a", "key-b"):
+        server._revalidate_in_background(entry.url, {"api-key": api_key}, entry)
+    await asyncio.gather(*server._background_tasks)
+
+    assert sorted(fetched) == ["key-a", "key-b"]
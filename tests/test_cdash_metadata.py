@@ -220,3 +220,27 @@ async def test_cdashig_invalid_domain(mcp_client):
 
         assert isinstance(result, TextContent)
         assert "error" in result_dict or "warning" in result_dict
+
+
+@pytest.mark.asyncio
+async def test_get_cdashig_field_auto_detect_outside_common(mcp_client):
+    """Test automatic domain detection for a domain outside the most common ones"""
+    client = mcp_client.get("client")
+    headers = mcp_client.get("headers")
+
+    async with client:
+        response = await client.call_tool(
+            "get_cdashig_field_details",
+            arguments={
+                "field": "PRTRT",
+                "cdashig_version": "2-1",
+                "include_codelist": False,
+                "headers_": headers
+            }
+        )
+        result = response[0]
+        result_dict = json.loads(result.text)
+
+        assert isinstance(result, TextContent)
+        assert result_dict["field"] == "PRTRT"
+        assert result_dict["domain"] == "PR"
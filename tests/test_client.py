@@ -0,0 +1,44 @@
+import asyncio
+
+import httpx
+
+from shiranui.client import AsyncConnectionPool
+
+
+def handler(request):
+    return httpx.Response(200, json={"url": str(request.url)})
+
+
+def test_client_of_previous_loop_is_closed():
+    """Test that a new event loop does not leak the client of the previous one"""
+    pool = AsyncConnectionPool(transport=httpx.MockTransport(handler))
+
+    async def fetch():
+        await pool.get("https://api.library.cdisc.org/api/mdr/products")
+        return pool._clients["https://api.library.cdisc.org"][0]
+
+    first = asyncio.run(fetch())
+    second = asyncio.run(fetch())
+
+    assert first is not second
+    assert first.is_closed
+    assert not second.is_closed
+
+    asyncio.run(pool.close())
+    assert second.is_closed
+
+
+def test_configure_closes_replaced_clients():
+    """Test that the clients replaced by configure() are closed"""
+    pool = AsyncConnectionPool(transport=httpx.MockTransport(handler))
+
+    async def run():
+        await pool.get("https://api.library.cdisc.org/api/mdr/products")
+        first = pool._clients["https://api.library.cdisc.org"][0]
+        pool.configure(pool_size=2)
+        await pool.get("https://api.library.cdisc.org/api/mdr/products")
+        return first
+
+    first = asyncio.run(run())
+    assert first.is_closed
+    asyncio.run(pool.close())
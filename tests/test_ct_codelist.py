@@ -172,3 +172,100 @@ async def test_get_ct_package_codelists_adam(mcp_client):
         assert result_dict["standard"] == "ADAM"
         assert "codelists" in result_dict
         assert len(result_dict["codelists"]) > 0
+
+
+@pytest.mark.asyncio
+async def test_get_cdisc_codelists(mcp_client):
+    """Test retrieving several codelists across standards in one call"""
+    client = mcp_client.get("client")
+    headers = mcp_client.get("headers")
+
+    async with client:
+        response = await client.call_tool(
+            "get_cdisc_codelists",
+            arguments={
+                "codelist_values": ["AGEU", "SEX", "NOTREAL", "ADAM:DTYPE"],
+                "headers_": headers
+            }
+        )
+        result = response[0]
+        result_dict = json.loads(result.text)
+
+        assert isinstance(result, TextContent)
+        assert result_dict["codelist_count"] == 3
+        assert set(result_dict["versions"]) == {"SDTM", "ADAM"}
+        codelist_ids = [cl["codelist_info"]["id"] for cl in result_dict["codelists"]]
+        assert codelist_ids == ["AGEU", "SEX", "DTYPE"]
+        assert result_dict["not_found"] == ["NOTREAL"]
+
+
+@pytest.mark.asyncio
+async def test_get_cdisc_codelists_version_per_standard(mcp_client):
+    """Test that a CT version given for one standard is not applied to the others"""
+    client = mcp_client.get("client")
+    headers = mcp_client.get("headers")
+
+    async with client:
+        response = await client.call_tool(
+            "get_cdisc_codelists",
+            arguments={
+                "codelist_values": ["AGEU", "ADAM:DTYPE"],
+                "version": "SDTM:2024-09-27",
+                "headers_": headers
+            }
+        )
+        result = response[0]
+        result_dict = json.loads(result.text)
+
+        assert isinstance(result, TextContent)
+        assert result_dict["versions"]["SDTM"] == "2024-09-27"
+        assert result_dict["codelist_count"] == 2
+        assert result_dict["not_found"] == []
+
+        response = await client.call_tool(
+            "get_ct_latest_version",
+            arguments={"standard": "adam", "headers_": headers}
+        )
+        latest = json.loads(response[0].text)
+        assert result_dict["versions"]["ADAM"] == latest["latest_version"]
+
+
+@pytest.mark.asyncio
+async def test_get_ct_latest_version_all_standards(mcp_client):
+    """Test that versions of several standards are listed newest first"""
+    client = mcp_client.get("client")
+    headers = mcp_client.get("headers")
+
+    async with client:
+        for standard in ["sdtm", "adam", "send", "cdash"]:
+            response = await client.call_tool(
+                "get_ct_latest_version",
+                arguments={"standard": standard, "headers_": headers}
+            )
+            result_dict = json.loads(response[0].text)
+
+            assert result_dict["standard"] == standard.upper()
+            assert result_dict["all_versions"] == sorted(result_dict["all_versions"], reverse=True)
+            assert result_dict["latest_version"] == result_dict["all_versions"][0]
+
+
+@pytest.mark.asyncio
+async def test_get_cdisc_codelist_did_you_mean(mcp_client):
+    """Test that a misspelt codelist returns the closest codelists"""
+    client = mcp_client.get("client")
+    headers = mcp_client.get("headers")
+
+    async with client:
+        response = await client.call_tool(
+            "get_cdisc_codelist",
+            arguments={
+                "codelist_value": "AGEUNIT",
+                "headers_": headers
+            }
+        )
+        result = response[0]
+        result_dict = json.loads(result.text)
+
+        assert isinstance(result, TextContent)
+        assert "warning" in result_dict
+        assert "AGEU" in result_dict["did_you_mean"]
@@ -0,0 +1,280 @@
+import httpx
+import pytest
+
+from shiranui.client import AsyncConnectionPool
+from shiranui import server
+from shiranui.ct_store import CTPackage, CTStore, CTVersionRegistry
+from shiranui.server import format_codelist
+
+CT_URL = "https://api.library.cdisc.org/api/mdr/ct/packages"
+
+PACKAGE = {
+    "name": "SDTM CT 2024-09-27",
+    "codelists": [
+        {
+            "conceptId": "C66781",
+            "submissionValue": "AGEU",
+            "name": "Age Unit",
+            "extensible": "Yes",
+            "definition": "Those units of time that are routinely used to express the age of a subject.",
+            "terms": [
+                {"conceptId": "C25301", "submissionValue": "DAYS", "preferredTerm": "Day",
+                 "definition": "The time for Earth to make a complete rotation on its axis.", "synonyms": ["Days"]},
+                {"conceptId": "C29848", "submissionValue": "YEARS", "preferredTerm": "Year",
+                 "definition": "The period of time that it takes for Earth to make a complete revolution around the sun."}
+            ]
+        },
+        {
+            "conceptId": "C66742",
+            "submissionValue": "NY",
+            "name": "No Yes Response",
+            "extensible": "No",
+            "terms": [
+                {"conceptId": "C49487", "submissionValue": "N", "preferredTerm": "No"},
+                {"conceptId": "C49488", "submissionValue": "Y", "preferredTerm": "Yes"}
+            ]
+        },
+        {
+            "conceptId": "C71620",
+            "submissionValue": "UNIT",
+            "name": "Unit",
+            "extensible": "Yes",
+            "terms": [
+                {"conceptId": "C25301", "submissionValue": "DAYS", "preferredTerm": "Day"}
+            ]
+        }
+    ]
+}
+
+
+def ct_listing(*packages):
+    return {"_links": {"packages": [{"href": f"/mdr/ct/packages/{package}"} for package in packages]}}
+
+
+class Upstream:
+    """Mock CDISC Library answering from a dictionary of paths, counting the requests"""
+
+    def __init__(self, resources: dict, headers: dict = None):
+        self.resources = resources
+        self.headers = headers or {}
+        self.requests = []
+        self.pool = AsyncConnectionPool(transport=httpx.MockTransport(self.handle))
+
+    def handle(self, request):
+        self.requests.append((request.url.path, request.headers.get("api-key")))
+        path = request.url.path.removeprefix("/api")
+        if path not in self.resources:
+            return httpx.Response(404, json={"error": "not found"})
+        resource = self.resources[path]
+        if callable(resource):
+            resource = resource(request)
+        return httpx.Response(200, json=resource)
+
+    async def fetch_json(self, url, headers_=None):
+        # Like aapi_json, requests without headers use the default headers
+        response = await self.pool.get(url, headers=self.headers if headers_ is None else headers_)
+        response.raise_for_status()
+        return response.json()
+
+    def paths(self):
+        return [path for path, _ in self.requests]
+
+
+def test_package_indexes():
+    """Test the lookups by submission value, codelist code and term code"""
+    ct_package = CTPackage("SDTM", "2024-09-27", PACKAGE["codelists"])
+
+    assert ct_package.find("ageu").code == "C66781"
+    assert ct_package.find("c66742", "CodelistCode").submission_value == "NY"
+    assert ct_package.find("C66742") is None
+    assert [(codelist.submission_value, term.submission_value) for codelist, term in ct_package.find_term("c29848")] \
+        == [("AGEU", "YEARS")]
+    # A term shared by two codelists is found in both
+    assert [codelist.submission_value for codelist, _ in ct_package.find_term("C25301")] == ["AGEU", "UNIT"]
+    assert ct_package.find_term("C00000") == []
+
+
+@pytest.mark.asyncio
+async def test_version_registry_is_kept_per_api_key():
+    """Test that each api key resolves CT versions from the listing it downloaded"""
+    def listing(request):
+        if request.headers.get("api-key") == "key-a":
+            return ct_listing("sdtmct-2024-03-29", "sdtmct-2024-09-27", "adamct-2024-09-27")
+        return ct_listing("sdtmct-2023-12-15")
+
+    upstream = Upstream({"/mdr/ct/packages": listing}, headers={"api-key": "key-a"})
+    registry = CTVersionRegistry(upstream.fetch_json, headers=upstream.headers)
+
+    assert await registry.versions("sdtm") == ["2024-09-27", "2024-03-29"]
+    assert await registry.latest("SDTM", headers_={"api-key": "key-b"}) == "2023-12-15"
+    assert await registry.versions("ADAM", headers_={"api-key": "key-b"}) == []
+    assert await registry.latest("ADAM", headers_={"api-key": "key-a"}) == "2024-09-27"
+    assert registry.sample_hrefs(1) == ["/mdr/ct/packages/sdtmct-2024-03-29"]
+    assert registry.refreshes == 2
+    assert len(upstream.requests) == 2
+    await upstream.pool.close()
+
+
+@pytest.mark.asyncio
+async def test_version_registry_refetches_after_ttl():
+    """Test that the listing is fetched again once its ttl passed"""
+    upstream = Upstream({"/mdr/ct/packages": ct_listing("sdtmct-2024-09-27")})
+    registry = CTVersionRegistry(upstream.fetch_json, ttl=0)
+
+    await registry.latest("SDTM")
+    await registry.latest("SDTM")
+
+    assert registry.refreshes == 2
+    await upstream.pool.close()
+
+
+@pytest.mark.asyncio
+async def test_store_keeps_packages_per_api_key():
+    """Test that a package downloaded with one api key is not served to another"""
+    upstream = Upstream({"/mdr/ct/packages/sdtmct-2024-09-27": PACKAGE})
+    store = CTStore(upstream.fetch_json)
+
+    await store.package("SDTM", "2024-09-27", headers_={"api-key": "key-a"})
+    await store.package("sdtm", "2024-09-27", headers_={"api-key": "key-a"})
+    assert store.loaded("SDTM", "2024-09-27", headers_={"api-key": "key-b"}) is None
+    await store.package("SDTM", "2024-09-27", headers_={"api-key": "key-b"})
+
+    assert [api_key for _, api_key in upstream.requests] == ["key-a", "key-b"]
+    await upstream.pool.close()
+
+
+def dict_codelist_output(codelist: dict, standard: str, version: str) -> dict:
+    """get_cdisc_codelist output built from the raw JSON, as before the compact model"""
+    terms = [
+        {
+            "term": term.get("submissionValue", ""),
+            "term_code": term.get("conceptId", ""),
+            "decoded_value": term.get("preferredTerm", "")
+        }
+        for term in codelist.get("terms", [])
+    ]
+    return {
+        "codelist_info": {
+            "id": codelist.get("submissionValue", ""),
+            "codelist_code": codelist.get("conceptId", ""),
+            "name": codelist.get("name", ""),
+            "extensible": "Yes" if codelist.get("extensible") == "Yes" else "No",
+            "standard": standard,
+            "version": version
+        },
+        "terms": terms,
+        "term_count": len(terms)
+    }
+
+
+def test_compact_model_gives_the_dict_model_output():
+    """Test that the slotted codelists format exactly like the raw JSON codelists"""
+    ct_package = CTPackage("SDTM", "2024-09-27", PACKAGE["codelists"])
+    sparse = {"conceptId": "C99999", "submissionValue": "SPARSE"}
+
+    for codelist in [*PACKAGE["codelists"], sparse]:
+        compact = CTPackage("SDTM", "2024-09-27", [codelist]).codelists[0]
+        assert format_codelist(compact, "SDTM", "2024-09-27") == dict_codelist_output(codelist, "SDTM", "2024-09-27")
+    assert [codelist.submission_value for codelist in ct_package.codelists] == ["AGEU", "NY", "UNIT"]
+    assert not hasattr(ct_package.codelists[0].terms[0], "__dict__")
+
+
+def package_resources(version: str = "2024-09-27") -> dict:
+    resources = {f"/mdr/ct/packages/sdtmct-{version}": PACKAGE}
+    for codelist in PACKAGE["codelists"]:
+        resources[f"/mdr/ct/packages/sdtmct-{version}/codelists/{codelist['conceptId']}"] = codelist
+    return resources
+
+
+@pytest.mark.asyncio
+async def test_codelists_are_fetched_one_by_one_until_the_threshold():
+    """Test that N-1 codelists by code are fetched alone and the Nth loads the whole package"""
+    upstream = Upstream(package_resources())
+    store = CTStore(upstream.fetch_json, full_package_after=3)
+
+    ageu = await store.codelist("SDTM", "2024-09-27", "c66781", "CodelistCode")
+    ny = await store.codelist("SDTM", "2024-09-27", "C66742", "CodelistCode")
+    # Asked for again: served from memory
+    await store.codelist("SDTM", "2024-09-27", "C66781", "CodelistCode")
+
+    assert (ageu.submission_value, ny.submission_value) == ("AGEU", "NY")
+    assert upstream.paths() == [
+        "/api/mdr/ct/packages/sdtmct-2024-09-27/codelists/C66781",
+        "/api/mdr/ct/packages/sdtmct-2024-09-27/codelists/C66742"
+    ]
+    assert store.loaded("SDTM", "2024-09-27") is None
+    assert sorted(codelist.code for codelist in store.fetched("SDTM", "2024-09-27")) == ["C66742", "C66781"]
+
+    unit = await store.codelist("SDTM", "2024-09-27", "C71620", "CodelistCode")
+
+    assert unit.submission_value == "UNIT"
+    assert upstream.paths()[2:] == ["/api/mdr/ct/packages/sdtmct-2024-09-27"]
+    assert store.loaded("SDTM", "2024-09-27") is not None
+    assert store.fetched("SDTM", "2024-09-27") == []
+
+    await store.codelist("SDTM", "2024-09-27", "C66742", "CodelistCode")
+    assert len(upstream.requests) == 3
+    assert store.stats()["codelist_fetches"] == 2
+    assert store.stats()["package_fetches"] == 1
+    await upstream.pool.close()
+
+
+@pytest.mark.asyncio
+async def test_codelist_fetch_paths():
+    """Test that lookups by submission value and bulk lookups load the package, and a missing code is None"""
+    upstream = Upstream(package_resources())
+    store = CTStore(upstream.fetch_json, full_package_after=4)
+
+    # Fewer codes than the threshold: fetched one by one
+    found = await store.codelists("SDTM", "2024-09-27", ["C66781", "c66781", "C66742"])
+    assert sorted(found) == ["C66742", "C66781"]
+    assert sorted(upstream.paths()) == [
+        "/api/mdr/ct/packages/sdtmct-2024-09-27/codelists/C66742",
+        "/api/mdr/ct/packages/sdtmct-2024-09-27/codelists/C66781"
+    ]
+
+    # A missing codelist loads the package, which tells it does not contain the code
+    assert await store.codelist("SDTM", "2024-09-27", "C00000", "CodelistCode") is None
+    assert upstream.paths()[2:] == [
+        "/api/mdr/ct/packages/sdtmct-2024-09-27/codelists/C00000",
+        "/api/mdr/ct/packages/sdtmct-2024-09-27"
+    ]
+    assert store.loaded("SDTM", "2024-09-27") is not None
+
+    other = Upstream(package_resources())
+    store = CTStore(other.fetch_json, full_package_after=3)
+    assert (await store.codelist("SDTM", "2024-09-27", "ageu")).code == "C66781"
+    found = await store.codelists("SDTM", "2024-09-27", ["C66781", "C66742", "C71620", "C00000"])
+    assert sorted(found) == ["C66742", "C66781", "C71620"]
+    assert other.paths() == ["/api/mdr/ct/packages/sdtmct-2024-09-27"]
+    await upstream.pool.close()
+    await other.pool.close()
+
+
+@pytest.mark.asyncio
+async def test_codelist_of_a_missing_package_raises():
+    """Test that a codelist by code of a package that does not exist is the 404 error, not a missing codelist"""
+    upstream = Upstream(package_resources())
+    store = CTStore(upstream.fetch_json)
+
+    with pytest.raises(httpx.HTTPStatusError) as raised:
+        await store.codelist("SDTM", "2099-01-01", "C66731", "CodelistCode")
+
+    assert raised.value.response.status_code == 404
+    assert upstream.paths() == [
+        "/api/mdr/ct/packages/sdtmct-2099-01-01/codelists/C66731",
+        "/api/mdr/ct/packages/sdtmct-2099-01-01"
+    ]
+    await upstream.pool.close()
+
+
+@pytest.mark.asyncio
+async def test_get_cdisc_codelist_of_a_missing_package_by_code_and_id(library):
+    """Test that both lookup types report a missing package as an error"""
+    library.resources.update(package_resources())
+
+    by_code = await server.get_cdisc_codelist("C66731", codelist_type="CodelistCode", version="2099-01-01")
+    by_id = await server.get_cdisc_codelist("SEX", version="2099-01-01")
+
+    assert "404" in by_code["error"] and "warning" not in by_code
+    assert "404" in by_id["error"] and "warning" not in by_id
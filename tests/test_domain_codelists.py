@@ -0,0 +1,118 @@
+import pytest
+
+from shiranui import server
+
+CT_VERSION = "2024-09-27"
+
+CODELISTS = {
+    "C66731": "SEX",
+    "C66742": "NY",
+    "C66781": "AGEU",
+    "C74457": "RACE",
+    "C66790": "ETHNIC",
+    "C66734": "DOMAIN"
+}
+
+
+def ct_codelist(code: str) -> dict:
+    return {
+        "conceptId": code,
+        "submissionValue": CODELISTS[code],
+        "name": CODELISTS[code].title(),
+        "extensible": "No",
+        "terms": [{"conceptId": f"{code}1", "submissionValue": "X", "preferredTerm": "X"}]
+    }
+
+
+def codelist_link(code: str, root: bool = False) -> dict:
+    if root:
+        return {"codelist": [{"href": f"/mdr/root/ct/sdtmct/codelists/{code}"}]}
+    return {"codelist": [{"href": f"/mdr/ct/packages/sdtmct-2024-03-29/codelists/{code}"}]}
+
+
+def add_ct(library):
+    library.resources["/mdr/ct/packages"] = {
+        "_links": {"packages": [{"href": f"/mdr/ct/packages/sdtmct-{CT_VERSION}"},
+                                {"href": "/mdr/ct/packages/sdtmct-2024-03-29"}]}
+    }
+    library.resources[f"/mdr/ct/packages/sdtmct-{CT_VERSION}"] = {
+        "codelists": [ct_codelist(code) for code in CODELISTS]
+    }
+    for code in CODELISTS:
+        library.resources[f"/mdr/ct/packages/sdtmct-{CT_VERSION}/codelists/{code}"] = ct_codelist(code)
+
+
+def count_batches(monkeypatch) -> list:
+    """Record the (standard, version, codes) of every CTStore.codelists batch"""
+    batches = []
+    codelists = server.ct_store.codelists
+
+    async def recording(standard, version, codes, headers_=None):
+        batches.append((standard, version, sorted(set(codes))))
+        return await codelists(standard, version, codes, headers_=headers_)
+
+    monkeypatch.setattr(server.ct_store, "codelists", recording)
+    return batches
+
+
+@pytest.mark.asyncio
+async def test_sdtm_domain_codelists_are_resolved_in_one_batch(library, monkeypatch):
+    """Test that all codelists of an SDTM domain are loaded with one batch per CT version"""
+    add_ct(library)
+    library.resources["/mdr/sdtmig/3-4/datasets/DM"] = {
+        "name": "DM",
+        "datasetVariables": [
+            {"name": "DOMAIN", "ordinal": "2", "_links": codelist_link("C66734")},
+            {"name": "AGEU", "ordinal": "12", "_links": codelist_link("C66781", root=True)},
+            {"name": "SEX", "ordinal": "13", "_links": codelist_link("C66731")},
+            {"name": "RACE", "ordinal": "14", "_links": codelist_link("C74457")},
+            {"name": "ETHNIC", "ordinal": "15", "_links": codelist_link("C66790")},
+            {"name": "DTHFL", "ordinal": "17", "_links": codelist_link("C66742")},
+            {"name": "ACTARMUD", "ordinal": "21", "_links": codelist_link("C66742", root=True)},
+            {"name": "AGE", "ordinal": "11", "_links": {}}
+        ]
+    }
+    batches = count_batches(monkeypatch)
+
+    result = await server.get_sdtm_domain_structure("DM", "3-4", include_codelists=True)
+
+    assert batches == [("SDTM", CT_VERSION, sorted(CODELISTS))]
+    assert library.paths() == [
+        "/mdr/sdtmig/3-4/datasets/DM",
+        "/mdr/ct/packages",
+        f"/mdr/ct/packages/sdtmct-{CT_VERSION}"
+    ]
+    codelists = {variable["name"]: variable.get("codelist") for variable in result["variables"]}
+    assert codelists["AGEU"]["codelist_info"]["id"] == "AGEU"
+    assert codelists["DTHFL"]["codelist_info"]["version"] == CT_VERSION
+    assert codelists["ACTARMUD"]["codelist_info"]["id"] == "NY"
+    assert codelists["AGE"] is None
+
+
+@pytest.mark.asyncio
+async def test_cdash_domain_codelists_are_resolved_in_one_batch(library, monkeypatch):
+    """Test that the few codelists of a CDASH domain are fetched one by one in one batch"""
+    add_ct(library)
+    library.resources["/mdr/cdashig/2-3/domains/DM"] = {
+        "name": "DM",
+        "fields": [
+            {"name": "SEX", "ordinal": 5, "_links": codelist_link("C66731")},
+            {"name": "AGEU", "ordinal": 3, "_links": codelist_link("C66781")},
+            {"name": "BRTHDTC", "ordinal": 1, "_links": {}},
+            {"name": "SEXOTH", "ordinal": 6, "_links": codelist_link("C66731", root=True)}
+        ]
+    }
+    batches = count_batches(monkeypatch)
+
+    result = await server.get_cdashig_domain_structure("DM", "2-3", include_codelists=True)
+
+    assert batches == [("SDTM", CT_VERSION, ["C66731", "C66781"])]
+    assert library.paths()[:2] == ["/mdr/cdashig/2-3/domains/DM", "/mdr/ct/packages"]
+    assert sorted(library.paths()[2:]) == [
+        f"/mdr/ct/packages/sdtmct-{CT_VERSION}/codelists/C66731",
+        f"/mdr/ct/packages/sdtmct-{CT_VERSION}/codelists/C66781"
+    ]
+    codelists = {field["name"]: field.get("codelist") for field in result["fields"]}
+    assert codelists["SEX"]["codelist_info"]["id"] == "SEX"
+    assert codelists["SEXOTH"] == codelists["SEX"]
+    assert "codelist" not in result["fields"][0]
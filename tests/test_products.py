@@ -0,0 +1,109 @@
+import time
+
+import httpx
+import pytest
+
+from shiranui import server
+from shiranui.cache import ResponseCache, credential
+from shiranui.products import FALLBACK_VERSIONS, ProductRegistry
+
+
+def product_listing(*sdtmig_versions):
+    return {
+        "_links": {
+            "data-tabulation": {
+                "_links": {
+                    "sdtmig": [{"href": f"/mdr/sdtmig/{version}"} for version in sdtmig_versions],
+                    "sendig": [{"href": "/mdr/sendig/3-1-1"}]
+                }
+            },
+            "data-analysis": {"_links": {"adam": [{"href": "/mdr/adam/adamig-1-3"}, {"href": "/mdr/adam/adam-adae-1-0"}]}}
+        }
+    }
+
+
+@pytest.fixture
+def upstream(library):
+    """/mdr/products answering 500 to api key "bad" and while "down" is set"""
+    state = {"down": False}
+
+    def listing(request):
+        if state["down"] or request.headers.get("api-key") == "bad":
+            return httpx.Response(500)
+        return product_listing("3-4", "9-9", "3-3")
+
+    library.resources["/mdr/products"] = listing
+    state["library"] = library
+    return state
+
+
+def test_parse_product_listing():
+    """Test that every implementation guide version is collected, newest first"""
+    versions = ProductRegistry.parse(product_listing("3-3", "3-4", "3-1-1", "3-4"))
+
+    assert versions["SDTMIG"] == ["3-4", "3-3", "3-1-1"]
+    assert versions["SENDIG"] == ["3-1-1"]
+    assert versions["ADAMIG"] == ["1-3"]
+    assert versions["CDASHIG"] == []
+
+
+@pytest.mark.asyncio
+async def test_fallback_of_one_api_key_does_not_affect_another(upstream):
+    """Test that a failed listing for one api key leaves the versions of a valid key alone"""
+    bad = await server.get_sdtm_latest_version(headers_={"api-key": "bad"})
+    good = await server.get_sdtm_latest_version(headers_={"api-key": "good"})
+
+    assert bad["all_versions"] == sorted(FALLBACK_VERSIONS["SDTMIG"])
+    assert bad["note"] == "Using default versions due to API error"
+    assert good["all_versions"] == ["3-3", "3-4", "9-9"]
+    assert "note" not in good
+
+
+@pytest.mark.asyncio
+async def test_fallback_is_retried_after_the_retry_interval(upstream, monkeypatch):
+    """Test that an api key falling back to default versions recovers once the listing is back"""
+    registry = server.products
+    upstream["down"] = True
+
+    assert await registry.versions("SDTMIG") == FALLBACK_VERSIONS["SDTMIG"]
+    assert registry.source() == "fallback"
+
+    upstream["down"] = False
+    # Within the retry interval the fallback is kept without a request
+    requests = len(upstream["library"].requests)
+    assert await registry.versions("SDTMIG") == FALLBACK_VERSIONS["SDTMIG"]
+    assert len(upstream["library"].requests) == requests
+
+    monotonic = time.monotonic
+    monkeypatch.setattr(time, "monotonic", lambda: monotonic() + registry.retry_interval)
+
+    assert await registry.versions("SDTMIG") == ["9-9", "3-4", "3-3"]
+    assert registry.source() == "api"
+    assert (await server.get_sdtm_latest_version())["latest_version"] == "9-9"
+
+
+@pytest.mark.asyncio
+async def test_failure_keeps_the_versions_known_so_far(upstream):
+    """Test that a failed refresh keeps the downloaded versions of the api key"""
+    registry = server.products
+    registry.refresh_interval = 0
+    await registry.versions("SDTMIG")
+
+    upstream["down"] = True
+    assert await registry.versions("SDTMIG") == ["9-9", "3-4", "3-3"]
+    assert registry.source() == "api"
+
+
+@pytest.mark.asyncio
+async def test_cached_listing_of_the_same_api_key_is_used(upstream, tmp_path):
+    """Test that an unreachable listing is read from the cache entry of the same api key only"""
+    cache = ResponseCache(tmp_path / "cache")
+    cache.put(ProductRegistry.url, b'{"_links": {"sdtmig": [{"href": "/mdr/sdtmig/4-0"}]}}',
+              credential=credential({"api-key": "bad"}))
+    registry = ProductRegistry(server.aapi_json, cache, headers={"api-key": "good"})
+
+    assert await registry.versions("SDTMIG", headers_={"api-key": "bad"}) == ["4-0"]
+    assert registry.source(headers_={"api-key": "bad"}) == "cache"
+    upstream["down"] = True
+    assert await registry.versions("SDTMIG") == FALLBACK_VERSIONS["SDTMIG"]
+    cache.configure(enabled=False)
@@ -213,3 +213,77 @@ async def test_get_sdtm_variable_details_invalid(mcp_client):
 
         assert isinstance(result, TextContent)
         assert "error" in result_dict
+
+
+@pytest.mark.asyncio
+async def test_get_sdtm_variable_details_with_codelist(mcp_client):
+    """Test that the codelist of a variable is resolved"""
+    client = mcp_client.get("client")
+    headers = mcp_client.get("headers")
+
+    async with client:
+        response = await client.call_tool(
+            "get_sdtm_variable_details",
+            arguments={
+                "variable": "SEX",
+                "domain": "DM",
+                "sdtmig_version": "3-4",
+                "include_codelist": True,
+                "headers_": headers
+            }
+        )
+        result = response[0]
+        result_dict = json.loads(result.text)
+
+        assert isinstance(result, TextContent)
+        assert result_dict["variable"] == "SEX"
+        assert result_dict["codelist"]["codelist_info"]["codelist_code"] == "C66731"
+        assert result_dict["codelist"]["term_count"] > 0
+
+
+@pytest.mark.asyncio
+async def test_get_sdtm_variable_details_auto_domain_outside_common(mcp_client):
+    """Test automatic domain detection for a domain outside the most common ones"""
+    client = mcp_client.get("client")
+    headers = mcp_client.get("headers")
+
+    async with client:
+        response = await client.call_tool(
+            "get_sdtm_variable_details",
+            arguments={
+                "variable": "TULNKID",
+                "sdtmig_version": "3-4",
+                "include_codelist": False,
+                "headers_": headers
+            }
+        )
+        result = response[0]
+        result_dict = json.loads(result.text)
+
+        assert isinstance(result, TextContent)
+        assert result_dict["variable"] == "TULNKID"
+        assert result_dict["domain"] == "TU"
+
+
+@pytest.mark.asyncio
+async def test_get_sdtm_variable_details_did_you_mean(mcp_client):
+    """Test that a misspelt variable name returns the closest variable names"""
+    client = mcp_client.get("client")
+    headers = mcp_client.get("headers")
+
+    async with client:
+        response = await client.call_tool(
+            "get_sdtm_variable_details",
+            arguments={
+                "variable": "AESTDT",
+                "sdtmig_version": "3-4",
+                "include_codelist": False,
+                "headers_": headers
+            }
+        )
+        result = response[0]
+        result_dict = json.loads(result.text)
+
+        assert isinstance(result, TextContent)
+        assert "error" in result_dict
+        assert "AESTDTC" in result_dict["did_you_mean"]
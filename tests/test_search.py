@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 
@@ -171,3 +172,122 @@ async def test_search_empty_query(mcp_client):
         assert isinstance(result, TextContent)
         assert "query" in result_dict
         assert "hits" in result_dict
+
+
+@pytest.mark.asyncio
+async def test_search_remote_multi_word(mcp_client):
+    """Test a multi-word query sent to the CDISC Library search"""
+    client = mcp_client.get("client")
+    headers = mcp_client.get("headers")
+
+    async with client:
+        response = await client.call_tool(
+            "search_cdisc_library",
+            arguments={"query": "blood pressure", "limit": 10, "source": "remote", "headers_": headers}
+        )
+        result = response[0]
+        result_dict = json.loads(result.text)
+
+        assert isinstance(result, TextContent)
+        assert result_dict["source"] == "remote"
+        assert result_dict["totalHits"] > 0
+
+
+@pytest.mark.asyncio
+async def test_search_local_index(mcp_client):
+    """Test that variables read by a detail tool are searchable locally"""
+    client = mcp_client.get("client")
+    headers = mcp_client.get("headers")
+
+    async with client:
+        await client.call_tool(
+            "get_sdtm_domain_structure",
+            arguments={"domain": "DM", "sdtmig_version": "3-4", "headers_": headers}
+        )
+        # Responses are indexed in the background; wait until the domain is searchable
+        for _ in range(50):
+            response = await client.call_tool(
+                "search_cdisc_library",
+                arguments={"query": "USUBJID", "source": "local", "headers_": headers}
+            )
+            if json.loads(response[0].text)["totalHits"] > 0:
+                break
+            await asyncio.sleep(0.2)
+
+        response = await client.call_tool(
+            "search_cdisc_library",
+            arguments={"query": "Unique Subject Identifier", "limit": 10, "headers_": headers}
+        )
+        result = response[0]
+        result_dict = json.loads(result.text)
+
+        assert isinstance(result, TextContent)
+        assert result_dict["source"] == "local"
+        assert result_dict["totalHits"] > 0
+        hrefs = [hit["href"] for hit in result_dict["hits"]]
+        assert "/mdr/sdtmig/3-4/datasets/DM/variables/USUBJID" in hrefs
+
+
+@pytest.mark.asyncio
+async def test_search_cursor(mcp_client):
+    """Test that the cursor of a page returns the next page"""
+    client = mcp_client.get("client")
+    headers = mcp_client.get("headers")
+
+    async with client:
+        response = await client.call_tool(
+            "search_cdisc_library",
+            arguments={"query": "USUBJID", "limit": 5, "source": "remote", "headers_": headers}
+        )
+        first_page = json.loads(response[0].text)
+
+        assert first_page["returnedHits"] == 5
+        assert first_page["hasMore"] == True
+        assert "cursor" in first_page
+
+        response = await client.call_tool(
+            "search_cdisc_library",
+            arguments={"query": "USUBJID", "limit": 5, "cursor": first_page["cursor"], "headers_": headers}
+        )
+        second_page = json.loads(response[0].text)
+
+        assert second_page["offset"] == 5
+        assert second_page["returnedHits"] > 0
+        assert second_page["hits"] != first_page["hits"]
+
+
+@pytest.mark.asyncio
+async def test_find_similar_metadata(mcp_client):
+    """Test finding a variable by the meaning of its label"""
+    client = mcp_client.get("client")
+    headers = mcp_client.get("headers")
+
+    async with client:
+        await client.call_tool(
+            "get_sdtm_domain_structure",
+            arguments={"domain": "DM", "sdtmig_version": "3-4", "headers_": headers}
+        )
+        # Responses are indexed in the background; wait until the domain is searchable
+        for _ in range(50):
+            response = await client.call_tool(
+                "search_cdisc_library",
+                arguments={"query": "USUBJID", "source": "local", "headers_": headers}
+            )
+            if json.loads(response[0].text)["totalHits"] > 0:
+                break
+            await asyncio.sleep(0.2)
+
+        response = await client.call_tool(
+            "find_similar_metadata",
+            arguments={"query": "subject unique identifier", "item_type": "Variable", "standard": "sdtmig"}
+        )
+        result = response[0]
+        result_dict = json.loads(result.text)
+
+        assert isinstance(result, TextContent)
+        assert len(result_dict["items"]) > 0
+        for item in result_dict["items"]:
+            assert item["type"] == "Variable"
+            assert "/sdtmig" in item["href"]
+        top_hrefs = [item["href"] for item in result_dict["items"][:3]]
+        assert "/mdr/sdtmig/3-4/datasets/DM/variables/USUBJID" in top_hrefs
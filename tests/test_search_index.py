@@ -0,0 +1,141 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from shiranui import server
+from shiranui.cache import ResponseCache, cache_policy, credential
+from shiranui.search_index import SearchIndex
+
+DM_URL = "https://api.library.cdisc.org/api/mdr/sdtmig/3-4/datasets/DM"
+AE_URL = "https://api.library.cdisc.org/api/mdr/sdtmig/3-4/datasets/AE"
+KEY_A = credential({"api-key": "key-a"})
+KEY_B = credential({"api-key": "key-b"})
+
+DM = {
+    "name": "DM",
+    "label": "Demographics",
+    "datasetVariables": [{"name": "USUBJID", "label": "Unique Subject Identifier"}]
+}
+AE = {
+    "name": "AE",
+    "label": "Adverse Events",
+    "datasetVariables": [{"name": "AETERM", "label": "Reported Term for the Adverse Event"}]
+}
+
+
+def names(index, query, readers):
+    return sorted(hit["name"] for hit in index.search(query, readers=readers)[1])
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SearchIndex(ResponseCache(tmp_path, enabled=False), cache_policy)
+
+
+def test_hits_are_limited_to_the_readers_of_the_items(index):
+    """Test that an item read with one api key is not found with another or without one"""
+    index.add(DM_URL, DM, KEY_A)
+    index.add(AE_URL, AE, None)
+
+    assert names(index, "subject identifier", (KEY_A,)) == ["USUBJID"]
+    assert names(index, "subject identifier", (KEY_B,)) == []
+    assert names(index, "subject identifier", ("",)) == []
+    assert names(index, "adverse event", ("",)) == ["AETERM"]
+    assert index.search("subject identifier", readers=(KEY_B,))[0] == 0
+    assert names(index, "subject identifier", None) == ["USUBJID"]
+
+    # A second key reading the resource makes its items visible to that key too
+    assert index.needs(DM_URL, KEY_B)
+    index.add(DM_URL, DM, KEY_B)
+    assert not index.needs(DM_URL, KEY_B)
+    assert names(index, "subject identifier", (KEY_B,)) == ["USUBJID"]
+    assert index.stats()["resources"] == 2
+
+
+def test_backfill_indexes_each_response_for_its_api_key(tmp_path, index):
+    """Test that cached responses are indexed for the api key they were downloaded with"""
+    cache = ResponseCache(tmp_path / "cache")
+    cache.put(DM_URL, json.dumps(DM).encode(), credential=KEY_A)
+    cache.put(AE_URL, json.dumps(AE).encode())
+
+    index.backfill(cache)
+
+    assert names(index, "demographics", (KEY_A,)) == ["DM"]
+    assert names(index, "demographics", (KEY_B,)) == []
+    assert names(index, "adverse events", ("",)) == ["AE"]
+    cache.configure(enabled=False)
+
+
+@pytest.mark.asyncio
+async def test_local_search_answers_with_the_callers_items(library, index, monkeypatch):
+    """Test that search_cdisc_library and find_similar_metadata only return the caller's items"""
+    monkeypatch.setattr(server, "search_index", index)
+    monkeypatch.setattr(server, "similarity_index", server.SimilarityIndex(index))
+    index.backfilled = True
+    index.add(DM_URL, DM, KEY_A)
+
+    found = await server.search_cdisc_library("subject identifier", source="local", headers_={"api-key": "key-a"})
+    hidden = await server.search_cdisc_library("subject identifier", source="local", headers_={"api-key": "key-b"})
+    anonymous = await server.search_cdisc_library("subject identifier", source="local", headers_={})
+    similar = await server.find_similar_metadata("unique subject identifier", headers_={"api-key": "key-a"})
+    not_similar = await server.find_similar_metadata("unique subject identifier", headers_={})
+
+    assert [hit["name"] for hit in found["hits"]] == ["USUBJID"]
+    assert hidden["hits"] == [] and anonymous["hits"] == []
+    assert [item["name"] for item in similar["items"]] == ["USUBJID"]
+    assert not_similar["items"] == []
+
+
+class SlowSource:
+    """ResponseCache stand-in whose bodies() takes a while, counting the passes"""
+
+    def __init__(self):
+        self.passes = 0
+        self.lock = threading.Lock()
+
+    def bodies(self):
+        with self.lock:
+            self.passes += 1
+        time.sleep(0.05)
+        yield DM_URL, KEY_A, json.dumps(DM).encode()
+
+
+def test_concurrent_backfills_read_the_source_once(index):
+    """Test that threads backfilling at the same time wait for one pass"""
+    source = SlowSource()
+    threads = [threading.Thread(target=index.backfill, args=(source,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert source.passes == 1
+    assert index.backfilled
+    assert names(index, "demographics", (KEY_A,)) == ["DM"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_first_searches_share_one_backfill(library, index, monkeypatch):
+    """Test that concurrent first searches start a single backfill"""
+    source = SlowSource()
+    started = []
+    backfill = index.backfill
+
+    def recording(from_source):
+        started.append(threading.current_thread())
+        backfill(from_source)
+
+    monkeypatch.setattr(server, "search_index", index)
+    monkeypatch.setattr(server, "response_cache", source)
+    monkeypatch.setattr(index, "backfill", recording)
+
+    results = await asyncio.gather(*(
+        server.search_cdisc_library("demographics", source="local", headers_={"api-key": "key-a"})
+        for _ in range(5)
+    ))
+
+    assert len(started) == 1 and source.passes == 1
+    assert all([hit["name"] for hit in result["hits"]] == ["DM"] for result in results)
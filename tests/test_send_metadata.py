@@ -46,6 +46,26 @@ async def test_get_sendig_latest_version(mcp_client):
         assert result_dict["total_versions"] > 0
 
 
+@pytest.mark.asyncio
+async def test_get_sendig_all_versions(mcp_client):
+    """Test that every published SENDIG version is listed, newest first"""
+    client = mcp_client.get("client")
+    headers = mcp_client.get("headers")
+
+    async with client:
+        response = await client.call_tool(
+            "get_sendig_latest_version",
+            arguments={"headers_": headers}
+        )
+        result = response[0]
+        result_dict = json.loads(result.text)
+
+        assert isinstance(result, TextContent)
+        assert "3-0" in result_dict["all_versions"]
+        assert "3-1-1" in result_dict["all_versions"]
+        assert result_dict["latest_version"] == result_dict["all_versions"][0]
+
+
 @pytest.mark.asyncio
 async def test_get_sendig_classes(mcp_client):
     """Test SEND domain classes retrieval"""
@@ -0,0 +1,105 @@
+import asyncio
+
+import httpx
+import pytest
+
+from shiranui.send_store import SENDDatasetStore
+
+SEND_URL = "https://library.cdisc.org/api/mdr/sendig"
+
+
+class Datasets:
+    """fetch_json answering every SENDIG dataset, recording the requests and their api keys"""
+
+    def __init__(self, variables: dict = None, failing: tuple = ()):
+        self.variables = variables or {}
+        self.failing = failing
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def fetch_json(self, url, headers_=None):
+        domain = url.rsplit("/", 1)[-1]
+        self.requests.append((url.removeprefix(SEND_URL), (headers_ or {}).get("api-key")))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.001)
+        finally:
+            self.in_flight -= 1
+        if domain in self.failing:
+            raise httpx.HTTPStatusError("500", request=httpx.Request("GET", url), response=httpx.Response(500))
+        return {
+            "name": domain,
+            "datasetVariables": [{"name": name} for name in self.variables.get(domain, ["STUDYID", "USUBJID"])]
+        }
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_datasets_are_dropped():
+    """Test that at most 64 datasets are kept and the least recently used goes first"""
+    datasets = Datasets()
+    store = SENDDatasetStore(datasets.fetch_json)
+    assert store.max_datasets == 64
+
+    for n in range(64):
+        await store.dataset("3-1-1", f"D{n}")
+    await store.dataset("3-1-1", "D0")
+    await store.dataset("3-1-1", "D64")
+
+    assert store.stats() == {"datasets": 64, "max_datasets": 64, "fetches": 65}
+    await store.dataset("3-1-1", "D0")
+    assert store.stats()["fetches"] == 65
+    await store.dataset("3-1-1", "D1")
+    assert store.stats()["fetches"] == 66
+
+
+@pytest.mark.asyncio
+async def test_datasets_are_kept_per_api_key():
+    """Test that a dataset downloaded with one api key is not served to another"""
+    datasets = Datasets()
+    store = SENDDatasetStore(datasets.fetch_json, headers={"api-key": "key-a"})
+
+    await store.dataset("3-1-1", "DM")
+    await store.dataset("3-1-1", "DM", headers_={"api-key": "key-a"})
+    await store.dataset("3-1-1", "DM", headers_={"api-key": "key-b"})
+
+    assert [api_key for _, api_key in datasets.requests] == [None, "key-b"]
+    assert store.similar("USUBJD", "3-1-1", headers_={"api-key": "key-c"}) == []
+    assert store.similar("USUBJD", "3-1-1", headers_={"api-key": "key-b"}) == ["USUBJID"]
+
+
+@pytest.mark.asyncio
+async def test_find_variable_follows_the_domain_order():
+    """Test that the first listed domain containing the variable wins and failed domains are skipped"""
+    datasets = Datasets(
+        variables={"EX": ["EXTRT", "EXDOSE"], "LB": ["LBTESTCD", "VISITDY"], "PC": ["PCTESTCD", "VISITDY"]},
+        failing=("DM",)
+    )
+    store = SENDDatasetStore(datasets.fetch_json)
+    domains = ["DM", "EX", "LB", "MI", "OM", "PC", "PP", "CL", "MA", "BW", "FW"]
+
+    assert await store.find_variable("VISITDY", "3-1-1", domains, limit=3) == "LB"
+    assert datasets.max_in_flight == 3
+    # The domains after the third window are never fetched
+    assert len(datasets.requests) <= 5
+
+    # Found domains are kept; the failed one is asked for again
+    requests = len(datasets.requests)
+    assert await store.find_variable("EXDOSE", "3-1-1", domains, limit=3) == "EX"
+    assert [path for path, _ in datasets.requests[requests:]] == ["/3-1-1/datasets/DM"]
+
+
+@pytest.mark.asyncio
+async def test_find_variable_stops_at_the_first_domain():
+    """Test that a variable of the first domain is found with a single request"""
+    datasets = Datasets()
+    store = SENDDatasetStore(datasets.fetch_json)
+    domains = ["DM", "EX", "LB", "MI", "OM", "PC", "PP", "CL", "MA", "BW", "FW"]
+
+    assert await store.find_variable("USUBJID", "3-1-1", domains, limit=1) == "DM"
+    assert [path for path, _ in datasets.requests] == ["/3-1-1/datasets/DM"]
+
+    # Checking every domain for a missing variable still fetches each once
+    assert await store.find_variable("NOTAVAR", "3-1-1", domains, limit=4) is None
+    assert len(datasets.requests) == len(domains)
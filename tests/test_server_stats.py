@@ -0,0 +1,51 @@
+import json
+import os
+
+import pytest
+from fastmcp import Client
+from fastmcp.client.transports import StdioTransport
+from mcp.types import TextContent
+
+
+@pytest.fixture
+def mcp_client():
+    transport = StdioTransport(
+        command="python",
+        args=[".venv/bin/shiranui", "--no-cache"],
+        keep_alive=False
+    )
+    client = Client(transport)
+
+    headers = {
+        "api-key": os.getenv('CDISC_LIBRARY_API_KEY'),
+        "accept": "application/json"
+    }
+
+    return {"client": client, "headers": headers}
+
+
+@pytest.mark.asyncio
+async def test_server_stats_connection_pool(mcp_client):
+    """Test that tool calls are sent through the async connection pool"""
+    client = mcp_client.get("client")
+    headers = mcp_client.get("headers")
+
+    async with client:
+        await client.call_tool(
+            "get_sdtm_domain_structure",
+            arguments={"domain": "DM", "sdtmig_version": "3-4", "headers_": headers}
+        )
+        response = await client.call_tool("get_server_stats", arguments={})
+        result = response[0]
+        result_dict = json.loads(result.text)
+
+        assert isinstance(result, TextContent)
+        for key in ("async_http", "cache", "snapshot", "singleflight", "ct_store", "products", "search_index"):
+            assert key in result_dict
+        pools = result_dict["async_http"]
+        assert sum(pool["requests"] for pool in pools.values()) >= 1
+        assert all(pool["pool_size"] > 0 for pool in pools.values())
+        assert all(
+            pool["connections_opened"] + pool["connections_reused"] >= pool["requests"]
+            for pool in pools.values()
+        )
@@ -0,0 +1,60 @@
+import pytest
+
+from shiranui.similarity import SimilarityIndex
+
+
+class Items:
+    """The part of SearchIndex read by SimilarityIndex"""
+
+    generation = 1
+
+    def items(self):
+        return [
+            ("/mdr/ct/packages/sdtmct-2024-09-27/codelists/C66742", "Codelist",
+             "NY", "No Yes Response", "A term that is used to indicate a question with permissible values of yes or no",
+             frozenset({"key-a"})),
+            ("/mdr/ct/packages/sdtmct-2024-09-27/codelists/C66742/terms/C49488", "Codelist Term",
+             "Y", "Yes", "The affirmative response to a question", frozenset({"key-a", "key-b"})),
+            ("/mdr/sdtmig/3-4/datasets/AE/variables/AESER", "Variable",
+             "AESER", "Serious Event", "Is the adverse event serious? Yes or no response", frozenset({""}))
+        ]
+
+
+@pytest.fixture
+def index():
+    similarity_index = SimilarityIndex(Items())
+    similarity_index.refresh()
+    return similarity_index
+
+
+def test_similar_names_types_like_the_library_search(index):
+    types = {item["name"]: item["type"] for item in index.similar("yes response")}
+    assert types == {"NY": "Code List", "Y": "Code List Value", "AESER": "Variable"}
+
+
+@pytest.mark.parametrize("item_type, names", [
+    ("Code List", ["NY"]),
+    ("Codelist", ["NY"]),
+    ("code list value", ["Y"]),
+    ("Codelist Term", ["Y"]),
+    ("Variable", ["AESER"]),
+    ("Dataset", [])
+])
+def test_item_type_accepts_both_spellings(index, item_type, names):
+    assert [item["name"] for item in index.similar("yes response", item_type=item_type)] == names
+
+
+def test_item_type_of_a_hit_filters_to_that_hit(index):
+    hit = index.similar("affirmative response", top_k=1)[0]
+    assert [item["href"] for item in index.similar("affirmative response", item_type=hit["type"])] == [hit["href"]]
+
+
+def test_readers_only_see_the_items_read_with_their_credentials(index):
+    def names(readers):
+        return sorted(item["name"] for item in index.similar("yes response", readers=readers))
+
+    assert names(("key-a",)) == ["NY", "Y"]
+    assert names(("key-b",)) == ["Y"]
+    assert names(("",)) == ["AESER"]
+    assert names((None, "key-b")) == ["AESER", "Y"]
+    assert names(("key-c",)) == []
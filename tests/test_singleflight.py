@@ -0,0 +1,99 @@
+import asyncio
+
+import httpx
+import pytest
+
+from shiranui.client import AsyncConnectionPool
+from shiranui.singleflight import SingleFlight
+
+URL = "https://library.cdisc.org/api/mdr/sdtmig/3-4/datasets/DM"
+
+
+@pytest.fixture
+def upstream():
+    """Mock upstream counting its requests and answering once released"""
+    state = {"requests": 0, "release": asyncio.Event()}
+
+    async def handler(request):
+        state["requests"] += 1
+        await state["release"].wait()
+        return httpx.Response(200, json={"name": "DM"})
+
+    state["pool"] = AsyncConnectionPool(transport=httpx.MockTransport(handler))
+    return state
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_share_one_request(upstream):
+    """Test that concurrent calls for the same key send one upstream request"""
+    flights = SingleFlight()
+    pool = upstream["pool"]
+
+    callers = [
+        asyncio.create_task(flights.ado(URL, lambda: pool.get(URL)))
+        for _ in range(5)
+    ]
+    await asyncio.sleep(0)
+    upstream["release"].set()
+    responses = await asyncio.gather(*callers)
+
+    assert upstream["requests"] == 1
+    assert all(response.json() == {"name": "DM"} for response in responses)
+    assert flights.stats() == {"executed": 1, "coalesced": 4, "in_flight": 0}
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_different_keys_are_not_coalesced(upstream):
+    """Test that calls for different keys each send their own request"""
+    flights = SingleFlight()
+    pool = upstream["pool"]
+    upstream["release"].set()
+
+    await asyncio.gather(
+        flights.ado((URL, "key-a"), lambda: pool.get(URL)),
+        flights.ado((URL, "key-b"), lambda: pool.get(URL))
+    )
+
+    assert upstream["requests"] == 2
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_the_shared_call(upstream):
+    """Test that the other callers still get the result when one caller is cancelled"""
+    flights = SingleFlight()
+    pool = upstream["pool"]
+
+    cancelled = asyncio.create_task(flights.ado(URL, lambda: pool.get(URL)))
+    waiting = asyncio.create_task(flights.ado(URL, lambda: pool.get(URL)))
+    await asyncio.sleep(0.01)
+    cancelled.cancel()
+    await asyncio.sleep(0)
+    upstream["release"].set()
+
+    response = await waiting
+    assert response.json() == {"name": "DM"}
+    assert cancelled.cancelled()
+    assert upstream["requests"] == 1
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_failure_is_shared_and_not_kept(upstream):
+    """Test that every waiting caller gets the exception and the next call executes again"""
+    flights = SingleFlight()
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise httpx.ConnectError("unreachable")
+
+    results = await asyncio.gather(flights.ado(URL, fail), flights.ado(URL, fail), return_exceptions=True)
+    assert all(isinstance(result, httpx.ConnectError) for result in results)
+    assert len(calls) == 1
+
+    with pytest.raises(httpx.ConnectError):
+        await flights.ado(URL, fail)
+    assert len(calls) == 2
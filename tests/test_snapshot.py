@@ -0,0 +1,197 @@
+import httpx
+import pytest
+
+from shiranui.snapshot import Mirror, Snapshot, snapshot_key
+
+BC = "/cosmos/v2/mdr/bc"
+SPEC = "/cosmos/v2/mdr/specializations"
+
+
+def href_list(name: str, hrefs: list) -> dict:
+    return {"_links": {name: [{"href": href} for href in hrefs]}}
+
+
+def add_library(library, ct_versions=("2024-09-27",), bc_packages=("2024-06-01",)):
+    """The resources mirrored for one version of everything"""
+    resources = library.resources
+    resources.clear()
+    resources["/mdr/ct/packages"] = href_list(
+        "packages", [f"/mdr/ct/packages/sdtmct-{version}" for version in ct_versions]
+    )
+    for version in ct_versions:
+        resources[f"/mdr/ct/packages/sdtmct-{version}"] = {"codelists": [{"conceptId": "C66742"}], "v": version}
+
+    resources["/mdr/products"] = {"_links": {
+        "sdtmig": [{"href": "/mdr/sdtmig/3-4"}],
+        "sendig": [{"href": "/mdr/sendig/3-1-1"}],
+        "cdashig": [{"href": "/mdr/cdashig/2-3"}],
+        "adam": [{"href": "/mdr/adam/adamig-1-3"}]
+    }}
+    resources["/mdr/sendig/3-1-1"] = {"name": "SENDIG 3.1.1"}
+    resources["/mdr/sdtmig/3-4/classes"] = {"name": "classes"}
+    for ig, version, collection in (("sdtmig", "3-4", "datasets"), ("sendig", "3-1-1", "datasets"),
+                                    ("cdashig", "2-3", "domains")):
+        resources[f"/mdr/{ig}/{version}/{collection}"] = href_list(
+            collection, [f"/mdr/{ig}/{version}/{collection}/DM"]
+        )
+        resources[f"/mdr/{ig}/{version}/{collection}/DM"] = {"name": "DM", "ig": ig}
+    adam = "/mdr/adam/adamig-1-3/datastructures"
+    resources[adam] = href_list("dataStructures", [f"{adam}/ADSL"])
+    resources[f"{adam}/ADSL"] = {"analysisVariableSets": [{"analysisVariables": [{"name": "TRT01P"}]}]}
+    resources[f"{adam}/ADSL/variables/TRT01P"] = {"name": "TRT01P"}
+
+    concepts = ["C49676", "C25298"]
+    resources[f"{BC}/biomedicalconcepts"] = href_list(
+        "biomedicalConcepts", [f"/mdr/bc/biomedicalconcepts/{concept}" for concept in concepts]
+    )
+    resources[f"{BC}/categories"] = {"categories": []}
+    resources[f"{BC}/packages"] = href_list(
+        "packages", [f"/mdr/bc/packages/{package}/biomedicalconcepts" for package in bc_packages]
+    )
+    for package in bc_packages:
+        resources[f"{BC}/packages/{package}/biomedicalconcepts"] = href_list(
+            "biomedicalConcepts", [f"/mdr/bc/packages/{package}/biomedicalconcepts/{concept}" for concept in concepts]
+        )
+        for concept in concepts:
+            resources[f"{BC}/packages/{package}/biomedicalconcepts/{concept}"] = {"conceptId": concept}
+    for concept in concepts:
+        resources[f"{BC}/biomedicalconcepts/{concept}"] = {"conceptId": concept, "package": bc_packages[0]}
+        resources[f"{SPEC}/datasetspecializations?biomedicalconcept={concept}"] = href_list(
+            "datasetSpecializations", ["/mdr/specializations/sdtm/datasetspecializations/SYSBP"]
+        )
+
+    resources[f"{SPEC}/sdtm/domains"] = href_list(
+        "datasetSpecializations", ["/mdr/specializations/sdtm/datasetspecializations?domain=VS"]
+    )
+    resources[f"{SPEC}/sdtm/packages"] = href_list(
+        "packages", [f"/mdr/specializations/sdtm/packages/{package}/datasetspecializations" for package in bc_packages]
+    )
+    for package in bc_packages:
+        resources[f"{SPEC}/sdtm/packages/{package}/datasetspecializations"] = href_list(
+            "datasetSpecializations",
+            [f"/mdr/specializations/sdtm/packages/{package}/datasetspecializations/SYSBP"]
+        )
+        resources[f"{SPEC}/sdtm/packages/{package}/datasetspecializations/SYSBP"] = {"datasetSpecializationId": "SYSBP"}
+    resources[f"{SPEC}/sdtm/datasetspecializations?domain=VS"] = href_list(
+        "datasetSpecializations", ["/mdr/specializations/sdtm/datasetspecializations/SYSBP"]
+    )
+    resources[f"{SPEC}/sdtm/datasetspecializations/SYSBP"] = {"datasetSpecializationId": "SYSBP"}
+
+
+def item_requests(library) -> list:
+    """Requests for the latest Biomedical Concepts and Dataset Specializations"""
+    return [
+        path for path in library.paths()
+        if path.startswith((f"{BC}/biomedicalconcepts/", f"{SPEC}/datasetspecializations",
+                            f"{SPEC}/sdtm/datasetspecializations"))
+    ]
+
+
+async def mirror(library, path, incremental: bool = False) -> tuple:
+    library.requests.clear()
+    target = Snapshot(path, readonly=False)
+    try:
+        result = await Mirror(target, library.pool, {"api-key": "key"}, incremental=incremental).run()
+    finally:
+        target.close()
+    return result
+
+
+def test_snapshot_store(tmp_path):
+    """Test storing, reading, pruning and the 404 of resources missing from a snapshot"""
+    target = Snapshot(tmp_path / "snapshot.sqlite3", readonly=False)
+    target.put("https://library.cdisc.org/api/mdr/sdtmig/3-4/datasets", b'{"a": 1}', {"ETag": '"1"'})
+    target.put("https://api.library.cdisc.org/api/mdr/ct/packages", b"{}")
+    target.set_meta("versions", "1")
+
+    # Both hosts reach the same resource
+    assert target.get("https://api.library.cdisc.org/api/mdr/sdtmig/3-4/datasets").etag == '"1"'
+    assert target.contains("https://library.cdisc.org/api/mdr/ct/packages")
+    assert target.prune({snapshot_key("https://x/api/mdr/ct/packages")}) == 1
+    assert not target.contains("https://library.cdisc.org/api/mdr/sdtmig/3-4/datasets")
+    target.close()
+
+    reader = Snapshot(tmp_path / "snapshot.sqlite3")
+    assert reader.get_meta("versions") == "1"
+    assert reader.httpx_response("https://library.cdisc.org/api/mdr/sdtmig/3-3").status_code == 404
+    assert reader.httpx_response("https://library.cdisc.org/api/mdr/ct/packages").json() == {}
+    assert reader.stats()["resources"] == 1
+    assert (reader.hits, reader.misses) == (1, 1)
+    with pytest.raises(Exception):
+        reader.put("https://library.cdisc.org/api/mdr/products", b"{}")
+    reader.close()
+
+
+@pytest.mark.asyncio
+async def test_mirror_and_unchanged_sync(library, tmp_path):
+    """Test that a sync with nothing new only revalidates the listings"""
+    add_library(library)
+    path = tmp_path / "snapshot.sqlite3"
+
+    taken = await mirror(library, path)
+    assert taken["failed"] == 0
+    assert taken["downloaded"] == len(library.resources)
+    assert "/mdr/products/DataTabulation" not in library.paths()
+
+    synced = await mirror(library, path, incremental=True)
+    assert synced["downloaded"] == 0
+    assert synced["added"] == []
+    assert synced["removed"] == 0
+    assert item_requests(library) == []
+    # Only "latest" listings and resources are revalidated
+    assert synced["revalidated"] == len(library.requests)
+    assert synced["revalidated"] + synced["kept"] == len(library.resources)
+    assert all(f"{BC}/packages/" not in path_ for path_ in library.paths())
+
+    reader = Snapshot(path)
+    assert reader.get_meta("synced_at") is not None
+    assert reader.stats()["resources"] == len(library.resources)
+    reader.close()
+
+
+@pytest.mark.asyncio
+async def test_sync_after_a_new_package(library, tmp_path):
+    """Test that new packages are downloaded, the latest items revalidated and superseded packages pruned"""
+    add_library(library)
+    path = tmp_path / "snapshot.sqlite3"
+    await mirror(library, path)
+
+    add_library(library, ct_versions=("2024-12-20", "2024-09-27"), bc_packages=("2024-12-01", "2024-06-01"))
+    synced = await mirror(library, path, incremental=True)
+
+    assert synced["failed"] == 0
+    assert synced["added"] == ["/api/mdr/ct/packages/sdtmct-2024-12-20"]
+    assert f"{BC}/biomedicalconcepts/C49676" in item_requests(library)
+    assert f"{SPEC}/sdtm/datasetspecializations/SYSBP" in item_requests(library)
+
+    reader = Snapshot(path)
+    concept = reader.get(f"https://api.library.cdisc.org/api{BC}/biomedicalconcepts/C49676")
+    assert b'"2024-12-01"' in concept.body
+    assert reader.contains("https://api.library.cdisc.org/api/mdr/ct/packages/sdtmct-2024-12-20")
+    assert not reader.contains("https://api.library.cdisc.org/api/mdr/ct/packages/sdtmct-2024-09-27")
+    assert not reader.contains(f"https://api.library.cdisc.org/api{BC}/packages/2024-06-01/biomedicalconcepts")
+    assert synced["removed"] > 0
+    reader.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_sync_keeps_everything(library, tmp_path):
+    """Test that a run with a failed download prunes nothing and keeps the last copy"""
+    add_library(library)
+    path = tmp_path / "snapshot.sqlite3"
+    await mirror(library, path)
+
+    add_library(library, ct_versions=("2024-12-20",))
+    library.resources["/mdr/sendig/3-1-1"] = httpx.Response(500)
+    synced = await mirror(library, path, incremental=True)
+
+    assert synced["failed_urls"] == []  # immutable IG version, kept without a request
+    library.resources["/mdr/products"] = httpx.Response(503)
+    synced = await mirror(library, path, incremental=True)
+
+    assert synced["failed_urls"] == ["https://library.cdisc.org/api/mdr/products"]
+    assert synced["removed"] == 0
+    reader = Snapshot(path)
+    assert reader.contains("https://library.cdisc.org/api/mdr/sdtmig/3-4/datasets/DM")
+    assert reader.get("https://library.cdisc.org/api/mdr/products") is not None
+    reader.close()
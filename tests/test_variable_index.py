@@ -0,0 +1,176 @@
+import asyncio
+import threading
+
+import pytest
+
+from shiranui.cache import ResponseCache
+from shiranui.variable_index import PartialIndex, VariableIndex, first_result, gather_limited, succeeded
+
+
+class Probe:
+    """Coroutines recording how many of them run at the same time"""
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.started = []
+
+    async def call(self, name, delay: float = 0.01, result=None, error: Exception = None):
+        self.started.append(name)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(delay)
+            if error is not None:
+                raise error
+            return result
+        finally:
+            self.running -= 1
+
+
+@pytest.mark.asyncio
+async def test_gather_limited_limits_concurrency_and_keeps_order():
+    """Test that at most limit coroutines run at once and results keep the input order"""
+    probe = Probe()
+    delays = [0.03, 0.01, 0.02, 0.0, 0.01, 0.02, 0.0]
+
+    results = await gather_limited(3, [probe.call(n, delay, result=n) for n, delay in enumerate(delays)])
+
+    assert results == list(range(7))
+    assert probe.max_running == 3
+
+
+@pytest.mark.asyncio
+async def test_gather_limited_partial_failure():
+    """Test that failures are returned in place and succeeded() leaves them out"""
+    probe = Probe()
+    names = ["ADSL", "ADAE", "ADTTE"]
+    results = await gather_limited(2, [
+        probe.call("ADSL", result={"ADSL": ["USUBJID"]}),
+        probe.call("ADAE", error=ConnectionError("ADAE")),
+        probe.call("ADTTE", result={"ADTTE": ["AVAL"]})
+    ], return_exceptions=True)
+
+    assert isinstance(results[1], ConnectionError)
+    assert succeeded(names, results) == [("ADSL", {"ADSL": ["USUBJID"]}), ("ADTTE", {"ADTTE": ["AVAL"]})]
+
+    with pytest.raises(ConnectionError):
+        await gather_limited(2, [probe.call("ADAE", error=ConnectionError("ADAE"))])
+
+
+def test_succeeded_raises_when_everything_failed():
+    """Test that the first failure is raised when no result succeeded"""
+    first, second = TimeoutError("first"), ConnectionError("second")
+    with pytest.raises(TimeoutError):
+        succeeded(["ADSL", "ADAE"], [first, second])
+    assert succeeded([], []) == []
+
+
+@pytest.mark.asyncio
+async def test_first_result_follows_the_listing_order():
+    """Test that the first match in listing order wins over a match finishing earlier"""
+    probe = Probe()
+    structures = [("ADSL", 0.03, None), ("ADAE", 0.04, "ADAE"), ("ADTTE", 0.0, "ADTTE"), ("ADLB", 0.0, None)]
+
+    result = await first_result(4, [
+        lambda name=name, delay=delay, found=found: probe.call(name, delay, result=found)
+        for name, delay, found in structures
+    ])
+
+    assert result == "ADAE"
+
+
+@pytest.mark.asyncio
+async def test_first_result_stops_starting_calls_after_a_match():
+    """Test that calls waiting for their turn never start once a result is known"""
+    probe = Probe()
+    names = ["ADSL", "ADAE", "ADTTE", "ADLB", "ADVS", "ADEG"]
+
+    result = await first_result(2, [
+        lambda name=name: probe.call(name, result=name if name == "ADAE" else None)
+        for name in names
+    ])
+    await asyncio.sleep(0.05)
+
+    assert result == "ADAE"
+    assert probe.max_running == 2
+    assert "ADEG" not in probe.started
+    assert probe.running == 0
+
+
+@pytest.mark.asyncio
+async def test_first_result_one_at_a_time_stops_at_the_match():
+    """Test that sequential calls stop at the first match, the next call never starting"""
+    probe = Probe()
+    names = ["ADSL", "ADAE", "ADTTE", "ADLB"]
+
+    result = await first_result(1, [
+        lambda name=name: probe.call(name, delay=0, result=name if name == "ADSL" else None)
+        for name in names
+    ])
+    await asyncio.sleep(0.01)
+
+    assert result == "ADSL"
+    assert probe.started == ["ADSL"]
+
+
+@pytest.mark.asyncio
+async def test_first_result_without_match():
+    """Test that None is returned when no call returns a result"""
+    probe = Probe()
+    assert await first_result(3, [lambda name=name: probe.call(name) for name in ("ADSL", "ADAE")]) is None
+
+
+@pytest.mark.asyncio
+async def test_partial_index_is_built_again(tmp_path):
+    """Test that a PartialIndex answers the call that built it and is rebuilt on next use"""
+    builds = []
+
+    async def build(version, headers_=None):
+        builds.append(version)
+        if len(builds) == 1:
+            return PartialIndex({"USUBJID": ["ADSL"]})
+        return {"USUBJID": ["ADSL", "ADAE"], "AEDECOD": ["ADAE"]}
+
+    cache = ResponseCache(tmp_path)
+    index = VariableIndex("adamig", build, cache)
+
+    assert await index.lookup("1-3", "usubjid") == ["ADSL"]
+    assert await index.peek("1-3") is None
+    assert await index.lookup("1-3", "AEDECOD") == ["ADAE"]
+    assert await index.lookup("1-3", "AEDECOD") == ["ADAE"]
+    assert builds == ["1-3", "1-3"]
+    assert index.stats()["partial_builds"] == 1
+
+    # A complete index is written next to the cache and loaded by a new process
+    reloaded = VariableIndex("adamig", build, cache)
+    assert await reloaded.similar("1-3", "AEDECD") == ["AEDECOD"]
+    assert reloaded.stats()["loads"] == 1
+    assert builds == ["1-3", "1-3"]
+
+
+@pytest.mark.asyncio
+async def test_index_files_are_read_and_written_off_the_event_loop(tmp_path, monkeypatch):
+    """Test that loading and storing an index run in worker threads"""
+    threads = []
+    index = VariableIndex("adamig", lambda version, headers_=None: asyncio.sleep(0, {"USUBJID": ["ADSL"]}),
+                          ResponseCache(tmp_path))
+    load, store = index._load, index._store
+
+    def recording(method):
+        def call(*args):
+            threads.append(threading.current_thread())
+            return method(*args)
+        return call
+
+    monkeypatch.setattr(index, "_load", recording(load))
+    monkeypatch.setattr(index, "_store", recording(store))
+
+    assert await index.peek("1-3") is None
+    assert await index.lookup("1-3", "USUBJID") == ["ADSL"]
+    reloaded = VariableIndex("adamig", None, ResponseCache(tmp_path))
+    monkeypatch.setattr(reloaded, "_load", recording(reloaded._load))
+    assert await reloaded.similar("1-3", "USUBJD") == ["USUBJID"]
+
+    assert len(threads) == 4
+    assert threading.main_thread() not in threads